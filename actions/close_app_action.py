@@ -2,51 +2,133 @@
 # -*- coding: utf-8 -*-
 
 import psutil # Для работы с процессами
-import os     # Для os.name и os.kill (на Linux/macOS)
-import signal # Для signal.SIGKILL (на Linux/macOS)
+import os     # Для os.getpid и переменных окружения
 
 # Импортируем функцию поиска PID из соседнего модуля manage_app_action
-from .manage_app_action import find_running_process_pid
+# (она ищет по общему индексу процессов actions/process_index.py)
+from .manage_app_action import find_running_process_pids
+from .process_index import get_process_index
 
-def close_application_by_name(app_name_or_path):
+# Сколько ждать штатного завершения всей группы после SIGTERM и добивания после SIGKILL (сек)
+CLOSE_TERM_TIMEOUT = float(os.environ.get('FAMILIAR_CLOSE_TERM_TIMEOUT', 3))
+CLOSE_KILL_TIMEOUT = float(os.environ.get('FAMILIAR_CLOSE_KILL_TIMEOUT', 1))
+
+# Исходы для отдельных процессов
+OUTCOME_TERMINATED = "terminated"     # Завершился после SIGTERM
+OUTCOME_KILLED = "killed"             # Завершился только после SIGKILL
+OUTCOME_ALREADY_GONE = "already_gone" # Исчез до того, как мы его тронули
+OUTCOME_ACCESS_DENIED = "access_denied"
+OUTCOME_SURVIVED = "survived"         # Жив даже после SIGKILL
+
+
+def _collect_process_tree(root_pids: list[int]) -> list[psutil.Process]:
+    """Найденные процессы и все их потомки (без повторов, без самого Фамильяра и его предков)."""
+    protected_pids = {os.getpid()}
+    try:
+        protected_pids.update(parent.pid for parent in psutil.Process().parents())
+    except psutil.Error:
+        pass
+
+    processes = {}
+    for pid in root_pids:
+        try:
+            root = psutil.Process(pid)
+            tree = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            continue
+        except psutil.AccessDenied:
+            tree = [root]
+        for proc in tree:
+            if proc.pid not in protected_pids:
+                processes.setdefault(proc.pid, proc)
+    return list(processes.values())
+
+
+def _is_finished(proc: psutil.Process) -> bool:
+    """Процесс завершился (зомби, которого еще не забрал родитель, тоже считаем завершенным)."""
+    try:
+        return proc.status() == psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return True
+    except psutil.AccessDenied:
+        return False
+
+
+def _signal_all(processes: list[psutil.Process], send, outcomes: dict) -> list[psutil.Process]:
+    """Отправляет сигнал всем процессам сразу; возвращает те, кому он доставлен."""
+    signalled = []
+    for proc in processes:
+        try:
+            send(proc)
+            signalled.append(proc)
+        except psutil.NoSuchProcess:
+            outcomes[proc.pid]["outcome"] = OUTCOME_ALREADY_GONE
+        except psutil.AccessDenied:
+            outcomes[proc.pid]["outcome"] = OUTCOME_ACCESS_DENIED
+    return signalled
+
+
+def close_application_by_name(app_name_or_path) -> tuple[bool, list[dict]]:
     """
-    Пытается найти и завершить процесс приложения по имени/пути.
-    Возвращает True, если процесс был найден и команда на завершение отправлена/успешна,
-    False если процесс не найден или произошла ошибка.
+    Завершает все процессы приложения вместе с потомками.
+    Сначала SIGTERM всей группе сразу, затем общее ожидание (psutil.wait_procs),
+    и SIGKILL только тем, кто не завершился за CLOSE_TERM_TIMEOUT.
+
+    Returns:
+        tuple[bool, list[dict]]: (успех, [{"pid", "name", "outcome"}, ...]).
+            Успех - если не осталось живых процессов и не было отказа в доступе.
+            Если процесс не найден, возвращается (True, []): закрывать нечего.
     """
     print(f"[ACTION_CLOSE][INFO] Попытка закрыть приложение: '{app_name_or_path}'")
-    pid_to_close = find_running_process_pid(app_name_or_path) # Используем нашу функцию поиска PID
+    root_pids = find_running_process_pids(app_name_or_path) # Используем нашу функцию поиска PID
+    if not root_pids:
+        print(f"[ACTION_CLOSE][INFO] Процесс для '{app_name_or_path}' не найден, закрывать нечего.")
+        return True, [] # Считаем успехом, так как процесса и так нет
 
-    if pid_to_close:
+    processes = _collect_process_tree(root_pids)
+    outcomes = {}
+    for proc in processes:
         try:
-            process = psutil.Process(pid_to_close)
-            process_name = process.name()
-            print(f"[ACTION_CLOSE][INFO] Найден процесс '{process_name}' (PID: {pid_to_close}). Пытаемся завершить...")
-            process.terminate() # Пробуем мягко
-            try:
-                process.wait(timeout=3)
-                print(f"[ACTION_CLOSE][SUCCESS] Процесс '{process_name}' (PID: {pid_to_close}) успешно завершен (terminate).")
-                return True
-            except psutil.TimeoutExpired:
-                print(f"[ACTION_CLOSE][WARN] Процесс '{process_name}' не завершился штатно за 3 сек. Попытка kill...")
-                if os.name == 'nt': process.kill()
-                else: os.kill(pid_to_close, signal.SIGKILL) # Пробуем жестко
-                try:
-                    process.wait(timeout=1)
-                    print(f"[ACTION_CLOSE][SUCCESS] Процесс '{process_name}' (PID: {pid_to_close}) завершен после kill.")
-                except psutil.TimeoutExpired:
-                    print(f"[ACTION_CLOSE][ERROR] Процесс '{process_name}' (PID: {pid_to_close}) не завершился даже после kill!")
-                    return False
-                return True
-        except psutil.NoSuchProcess:
-            print(f"[ACTION_CLOSE][WARN] Процесс с PID {pid_to_close} уже не существует.")
-            return True
-        except psutil.AccessDenied:
-            print(f"[ACTION_CLOSE][ERROR] Нет прав для завершения процесса '{process_name}' (PID: {pid_to_close}).")
-            return False
-        except Exception as e:
-            print(f"[ACTION_CLOSE][ERROR] Неизвестная ошибка при попытке завершить процесс PID {pid_to_close}: {e}")
-            return False
+            name = proc.name()
+        except psutil.Error:
+            name = ""
+        outcomes[proc.pid] = {"pid": proc.pid, "name": name, "outcome": OUTCOME_SURVIVED}
+    print(f"[ACTION_CLOSE][INFO] Найдено процессов для '{app_name_or_path}': {len(processes)} (корневые PID: {root_pids}). Отправляем SIGTERM...")
+
+    # 1. SIGTERM всем сразу и общее ожидание
+    terminated = _signal_all(processes, psutil.Process.terminate, outcomes)
+    gone, alive = psutil.wait_procs(terminated, timeout=CLOSE_TERM_TIMEOUT)
+    for proc in gone:
+        outcomes[proc.pid]["outcome"] = OUTCOME_TERMINATED
+    stragglers = []
+    for proc in alive:
+        if _is_finished(proc):
+            outcomes[proc.pid]["outcome"] = OUTCOME_TERMINATED
+        else:
+            stragglers.append(proc)
+
+    # 2. SIGKILL только тем, кто не завершился
+    if stragglers:
+        print(f"[ACTION_CLOSE][WARN] Не завершились за {CLOSE_TERM_TIMEOUT} сек: {[proc.pid for proc in stragglers]}. Попытка kill...")
+        killed = _signal_all(stragglers, psutil.Process.kill, outcomes)
+        gone, alive = psutil.wait_procs(killed, timeout=CLOSE_KILL_TIMEOUT)
+        for proc in gone:
+            outcomes[proc.pid]["outcome"] = OUTCOME_KILLED
+        for proc in alive:
+            if _is_finished(proc):
+                outcomes[proc.pid]["outcome"] = OUTCOME_KILLED
+            else:
+                print(f"[ACTION_CLOSE][ERROR] Процесс PID {proc.pid} не завершился даже после kill!")
+
+    process_index = get_process_index()
+    for pid, result in outcomes.items():
+        if result["outcome"] in (OUTCOME_TERMINATED, OUTCOME_KILLED, OUTCOME_ALREADY_GONE):
+            process_index.forget(pid)
+
+    results = sorted(outcomes.values(), key=lambda result: result["pid"])
+    success = all(result["outcome"] not in (OUTCOME_SURVIVED, OUTCOME_ACCESS_DENIED) for result in results)
+    if success:
+        print(f"[ACTION_CLOSE][SUCCESS] Приложение '{app_name_or_path}' закрыто ({len(results)} процессов).")
     else:
-        print(f"[ACTION_CLOSE][INFO] Процесс для '{app_name_or_path}' не найден, закрывать нечего.")
-        return True # Считаем успехом, так как процесса и так нет
\ No newline at end of file
+        print(f"[ACTION_CLOSE][ERROR] Приложение '{app_name_or_path}' закрыто не полностью: {results}")
+    return success, results
@@ -3,26 +3,37 @@
 
 import os
 import subprocess
-import shutil
+import executable_index
 import psutil
 # import shlex # Пока не нужен
+from . import process_index
+from . import proc_scanner
+from . import x11_windows
 
-def run_application(app_path_or_name: str) -> bool:
-    """Запускает приложение в отдельном процессе."""
+# Использовать инкрементальный индекс процессов вместо полного обхода на каждую команду
+PROCESS_INDEX_ENABLED = os.environ.get('FAMILIAR_PROCESS_INDEX', '1').lower() not in ('0', 'false', 'no')
+
+def run_application(app_path_or_name: str | list[str]) -> bool:
+    """
+    Запускает приложение в отдельном процессе.
+    Принимает имя/путь команды или готовый argv (например, Exec из .desktop-файла).
+    """
+    argv = list(app_path_or_name) if isinstance(app_path_or_name, (list, tuple)) else [app_path_or_name]
+    app_path_or_name = " ".join(argv)
     print(f"[ACTION_RUN][INFO] Запуск приложения: '{app_path_or_name}'")
     try:
         if os.name == 'nt': # Для Windows (пока не используется активно)
             DETACHED_PROCESS = 0x00000008
             CREATE_NEW_PROCESS_GROUP = 0x00000200
-            subprocess.Popen([app_path_or_name],
+            subprocess.Popen(argv,
                              creationflags=DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP,
                              close_fds=True)
         else: # Для Linux/macOS
             # Проверяем, существует ли команда перед запуском
-            if not shutil.which(app_path_or_name):
-                 print(f"[ACTION_RUN][ERROR] Команда '{app_path_or_name}' не найдена в PATH.")
+            if not executable_index.which(argv[0]):
+                 print(f"[ACTION_RUN][ERROR] Команда '{argv[0]}' не найдена в PATH.")
                  return False
-            subprocess.Popen([app_path_or_name], start_new_session=True)
+            subprocess.Popen(argv, start_new_session=True)
         print(f"[ACTION_RUN][SUCCESS] Команда запуска для '{app_path_or_name}' отправлена.")
         return True
     except FileNotFoundError:
@@ -32,20 +43,9 @@ def run_application(app_path_or_name: str) -> bool:
         print(f"[ACTION_RUN][ERROR] Неизвестная ошибка при запуске '{app_path_or_name}': {e}")
         return False
 
-# --- ИСПРАВЛЕННАЯ ФУНКЦИЯ ПОИСКА PID (v4 - более гибкий поиск) ---
-def find_running_process_pid(app_name_or_path: str) -> int | None:
-    """
-    Ищет запущенный процесс по имени или части пути.
-    Более гибкая проверка имен (например, 'google-chrome' и 'chrome').
-    Возвращает PID первого найденного процесса или None.
-    """
-    if not app_name_or_path:
-        return None
-    search_term_lower = app_name_or_path.lower()
-    base_name_search = os.path.basename(search_term_lower)
-    current_pid = os.getpid()
-
-    # --- ИЗМЕНЕНИЕ: Создаем набор возможных имен ---
+def _possible_process_names(app_name_or_path: str) -> set[str]:
+    """Набор имен, под которыми может работать процесс ('google-chrome' -> {'google-chrome', 'chrome'})."""
+    base_name_search = os.path.basename(app_name_or_path.lower())
     possible_names = {base_name_search}
     # Добавляем общие варианты, если ищем специфичные браузеры или приложения
     if base_name_search == "google-chrome" or base_name_search == "google-chrome-stable":
@@ -53,10 +53,50 @@ def find_running_process_pid(app_name_or_path: str) -> int | None:
     elif base_name_search == "firefox" or base_name_search == "firefox-esr":
          possible_names.add("firefox-bin") # Иногда бинарник называется так
     # Добавить другие специфичные варианты по мере необходимости
-    # --- КОНЕЦ ИЗМЕНЕНИЯ ---
+    return possible_names
+
+# --- ПОИСК PID (v6 - индекс процессов или поэтапный обход /proc) ---
+def find_running_process_pids(app_name_or_path: str) -> list[int]:
+    """
+    Ищет все запущенные процессы по имени или части пути.
+    Более гибкая проверка имен (например, 'google-chrome' и 'chrome').
+    Использует общий ProcessIndex (actions/process_index.py), а если он отключен -
+    поэтапный обход /proc (actions/proc_scanner.py), который читает exe и cmdline
+    только для процессов, не совпавших по имени.
+    Возвращает список PID, отсортированный по качеству совпадения (имя > exe > argv[0]).
+    """
+    if not app_name_or_path:
+        return []
+    search_term_lower = app_name_or_path.lower()
+    current_pid = os.getpid()
+    possible_names = _possible_process_names(app_name_or_path)
+    # Исключаем python скрипты (в том числе самого Фамильяра)
+    search_names = {name for name in possible_names if not name.startswith('python')}
 
     print(f"[ACTION_FIND][DEBUG] Поиск запущенного процесса для: '{search_term_lower}' (возможные имена: {possible_names}), исключая PID: {current_pid}")
 
+    if PROCESS_INDEX_ENABLED:
+        pids = [pid for pid, quality, info in process_index.get_process_index().find_pids(search_names)
+                if pid != current_pid]
+    elif proc_scanner.is_available():
+        pids = [pid for pid, quality, matched_name in proc_scanner.scan_matching_pids(search_names, exclude_pids=(current_pid,))]
+    else:
+        pid = _scan_all_processes_for_pid(app_name_or_path, possible_names, current_pid)
+        pids = [pid] if pid is not None else []
+
+    if pids:
+        print(f"[ACTION_FIND][DEBUG] Найдены процессы для '{app_name_or_path}': {pids}")
+    else:
+        print(f"[ACTION_FIND][DEBUG] Запущенный процесс для '{app_name_or_path}' (с учетом {possible_names}) не найден.")
+    return pids
+
+def find_running_process_pid(app_name_or_path: str) -> int | None:
+    """Возвращает PID лучшего найденного процесса (см. find_running_process_pids) или None."""
+    pids = find_running_process_pids(app_name_or_path)
+    return pids[0] if pids else None
+
+def _scan_all_processes_for_pid(app_name_or_path: str, possible_names: set[str], current_pid: int) -> int | None:
+    """Полный обход psutil.process_iter (запасной путь для систем без /proc)."""
     for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'exe']):
         try:
             proc_info = proc.info
@@ -67,34 +107,28 @@ def find_running_process_pid(app_name_or_path: str) -> int | None:
 
             # --- 1. Проверка по имени процесса (proc.name()) ---
             proc_name_lower = proc_info.get('name', '').lower()
-            # --- ИЗМЕНЕНИЕ: Проверяем вхождение в набор имен ---
             if proc_name_lower in possible_names:
                  if not proc_name_lower.startswith('python'): # Исключаем python скрипты
                      print(f"[ACTION_FIND][DEBUG] Найден по имени процесса: PID={pid}, Name={proc_info.get('name')}")
                      return pid
-            # --- КОНЕЦ ИЗМЕНЕНИЯ ---
 
             # --- 2. Проверка по базовому имени исполняемого файла (proc.exe()) ---
             exe_path = proc_info.get('exe')
             if exe_path:
                 exe_base_name_lower = os.path.basename(exe_path).lower()
-                # --- ИЗМЕНЕНИЕ: Проверяем вхождение в набор имен ---
                 if exe_base_name_lower in possible_names:
                      if not exe_base_name_lower.startswith('python'):
                         print(f"[ACTION_FIND][DEBUG] Найден по базовому имени exe: PID={pid}, Exe={exe_path}")
                         return pid
-                # --- КОНЕЦ ИЗМЕНЕНИЯ ---
 
             # --- 3. Проверка по первому аргументу командной строки (proc.cmdline()) ---
             cmdline_list = proc_info.get('cmdline')
             if cmdline_list:
                  first_arg_base_lower = os.path.basename(cmdline_list[0]).lower() if cmdline_list else ''
-                 # --- ИЗМЕНЕНИЕ: Проверяем вхождение в набор имен ---
                  if first_arg_base_lower in possible_names:
                       if not first_arg_base_lower.startswith('python'):
                           print(f"[ACTION_FIND][DEBUG] Найден по первому аргументу cmdline: PID={pid}, Cmdline={' '.join(cmdline_list)}")
                           return pid
-                 # --- КОНЕЦ ИЗМЕНЕНИЯ ---
 
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             continue
@@ -104,13 +138,12 @@ def find_running_process_pid(app_name_or_path: str) -> int | None:
 
     print(f"[ACTION_FIND][DEBUG] Запущенный процесс для '{app_name_or_path}' (с учетом {possible_names}) не найден.")
     return None
-# --- КОНЕЦ ИСПРАВЛЕННОЙ ФУНКЦИИ ---
 
 
 def _run_tool_command(command_list: list[str]) -> tuple[bool, str]:
     """Вспомогательная функция для запуска утилит вроде wmctrl или xdotool."""
     tool_name = command_list[0]
-    if not shutil.which(tool_name):
+    if not executable_index.which(tool_name):
         print(f"[ACTION_ACTIVATE][ERROR] Утилита '{tool_name}' не найдена. Установите ее.")
         return False, f"Утилита '{tool_name}' не найдена."
     try:
@@ -129,7 +162,8 @@ def _run_tool_command(command_list: list[str]) -> tuple[bool, str]:
 def activate_window_by_class_or_pid(window_class_or_name: str, pid: int | None = None) -> tuple[bool, str]:
     """
     Пытается активировать окно приложения.
-    Сначала по WM_CLASS или имени с помощью wmctrl.
+    Сначала через постоянное соединение с X (actions/x11_windows.py), если доступен python-xlib.
+    Затем по WM_CLASS или имени с помощью wmctrl.
     Если не удалось и передан PID, пытается найти окно по PID с помощью xdotool и активировать/развернуть его.
 
     Args:
@@ -144,6 +178,19 @@ def activate_window_by_class_or_pid(window_class_or_name: str, pid: int | None =
         print(f"[ACTION_ACTIVATE][WARN] {msg}")
         return False, "UNSUPPORTED_OS"
 
+    # 0. Нативный путь: постоянное соединение с X и кэш окон (без запуска процессов)
+    x11_index = x11_windows.get_x11_window_index()
+    if x11_index is not None:
+        try:
+            window_id = x11_index.find_window(window_class_or_name, pid)
+            if window_id is not None and x11_index.activate_window(window_id):
+                print(f"[ACTION_ACTIVATE][SUCCESS] Окно {window_id:#x} для '{window_class_or_name}' активировано через X11.")
+                return True, "X11_ACTIVATED"
+            print(f"[ACTION_ACTIVATE][INFO] В таблице окон X11 нет окна для '{window_class_or_name}' (PID {pid}), пробуем wmctrl/xdotool.")
+        except Exception as e: # Например, обрыв соединения с X-сервером
+            print(f"[ACTION_ACTIVATE][WARN] Ошибка нативной активации X11: {e}. Переподключимся при следующем вызове.")
+            x11_windows.reset_x11_window_index()
+
     # 1. Попытка через wmctrl по имени класса/окна
     print(f"[ACTION_ACTIVATE][INFO] Попытка активации через wmctrl для '{window_class_or_name}'...")
     wmctrl_success, wmctrl_msg = _run_tool_command(['wmctrl', '-xa', window_class_or_name])
@@ -156,7 +203,7 @@ def activate_window_by_class_or_pid(window_class_or_name: str, pid: int | None =
     # 2. Если есть PID и wmctrl не справился, пытаемся через xdotool
     if pid:
         print(f"[ACTION_ACTIVATE][INFO] Попытка активации через xdotool для PID {pid} (приложение: '{window_class_or_name}')...")
-        if not shutil.which('xdotool'):
+        if not executable_index.which('xdotool'):
             msg = "Утилита 'xdotool' не найдена. Для расширенной активации окон, пожалуйста, установите ее (sudo apt install xdotool)."
             print(f"[ACTION_ACTIVATE][ERROR] {msg}")
             return False, "XDOTOL_NOT_FOUND"
@@ -2,8 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import subprocess
-import shutil
-import os # Добавим os для установки переменных окружения для apt
+import executable_index
 
 # --- ВАЖНО: ПРЕДУПРЕЖДЕНИЕ О НЕОБХОДИМОСТИ НАСТРОЙКИ SUDOERS ---
 # Хотя пользователь имеет беспарольный sudo на все, оставляем это как напоминание,
@@ -20,7 +19,7 @@ def _run_command(command_list, capture=True):
     try:
         # Проверка наличия команды
         cmd_to_check = command_list[1] if command_list[0] == 'sudo' else command_list[0]
-        if not shutil.which(cmd_to_check):
+        if not executable_index.which(cmd_to_check):
             error_msg = f"Команда '{cmd_to_check}' не найдена."
             print(f"[ACTION_SYS][ERROR] {error_msg}")
             return False, error_msg
@@ -66,41 +65,54 @@ def system_reboot():
     # Добавляем флаг -f для форсированной перезагрузки
     return _run_command(['sudo', '/sbin/reboot', '-f'], capture=False) # Не захватываем вывод
 
+# Шаги обновления системы. apt-get (а не apt) - стабильный интерфейс для скриптов;
+# Status-Fd=1 дает машиночитаемые строки прогресса (dlstatus/pmstatus) в stdout.
+# stdin задания - /dev/null, поэтому любой вопрос завершит шаг ошибкой (EOF):
+# - DEBIAN_FRONTEND=noninteractive отключает вопросы debconf (передается через env:
+#   sudo сбрасывает окружение вызывающего процесса);
+# - вопрос dpkg об измененном конфигурационном файле debconf не касается: --force-confdef
+#   берет вариант по умолчанию, а где его нет, --force-confold оставляет локальную версию файла.
+_APT_GET = ["sudo", "env", "DEBIAN_FRONTEND=noninteractive", "apt-get", "-o", "APT::Status-Fd=1",
+            "-o", "Dpkg::Options::=--force-confdef", "-o", "Dpkg::Options::=--force-confold"]
+SYSTEM_UPDATE_STEPS = [
+    {"name": "update", "title": "обновление списка пакетов",
+     "argv": [*_APT_GET, "update"]},
+    {"name": "upgrade", "title": "установка обновлений",
+     "argv": [*_APT_GET, "upgrade", "-y"]},
+    {"name": "dist-upgrade", "title": "обновление дистрибутива",
+     "argv": [*_APT_GET, "dist-upgrade", "-y"]},
+]
+SYSTEM_UPDATE_JOB_KIND = "system_update"
+
 def system_update():
-    """Запускает полное обновление системы (update, upgrade, dist-upgrade)."""
-    # Используем apt и объединяем команды, флаг -y для автоподтверждения
-    # Устанавливаем переменную окружения для неинтерактивного режима
-    update_env = os.environ.copy()
-    update_env["DEBIAN_FRONTEND"] = "noninteractive"
+    """
+    Запускает полное обновление системы (update, upgrade, dist-upgrade) фоновой задачей
+    и сразу возвращается, не дожидаясь apt (см. job_manager).
 
-    command_str = "sudo apt update && sudo apt upgrade -y && sudo apt dist-upgrade -y"
-    print(f"[ACTION_SYS][INFO] Executing complex update: {command_str}")
-    try:
-        # Используем shell=True с осторожностью, т.к. команда сложная с &&
-        # Проверяем наличие apt перед запуском
-        if not shutil.which('apt'):
-             error_msg = "Команда 'apt' не найдена."
-             print(f"[ACTION_SYS][ERROR] {error_msg}")
-             return False, error_msg
+    Returns:
+        tuple[bool, dict | str]: (True, запись задачи) или (False, сообщение об ошибке).
+                                 Если обновление уже идет, возвращается его задача
+                                 с полем "already_running": True.
+    """
+    import job_manager # Нужен только для долгих действий
+    if not executable_index.which('apt-get'):
+        error_msg = "Команда 'apt-get' не найдена."
+        print(f"[ACTION_SYS][ERROR] {error_msg}")
+        return False, error_msg
 
-        result = subprocess.run(
-            command_str,
-            shell=True, # Нужно для обработки &&
-            capture_output=False, # Не захватываем вывод
-            check=False, # Обработаем код возврата сами
-            env=update_env # Передаем окружение для noninteractive
-        )
-        if result.returncode == 0:
-            print(f"[ACTION_SYS][SUCCESS] System update process completed successfully.")
-            return True, "Процесс обновления системы успешно завершен."
-        else:
-            error_msg = f"Ошибка в процессе обновления системы. Код возврата: {result.returncode}. Проверьте системные логи apt."
-            print(f"[ACTION_SYS][ERROR] {error_msg}")
-            return False, error_msg
-    except Exception as e:
-        error_msg = f"Неизвестная ошибка при запуске обновления системы: {e}"
+    active_job = job_manager.find_active_job(SYSTEM_UPDATE_JOB_KIND)
+    if active_job is not None:
+        print(f"[ACTION_SYS][INFO] System update is already running as job {active_job['job_id']}.")
+        return True, dict(active_job, already_running=True)
+
+    print(f"[ACTION_SYS][INFO] Starting system update job: {len(SYSTEM_UPDATE_STEPS)} apt-get steps.")
+    try:
+        job = job_manager.start_job(SYSTEM_UPDATE_JOB_KIND, "обновление системы", SYSTEM_UPDATE_STEPS)
+    except OSError as e:
+        error_msg = f"Не удалось запустить задачу обновления системы: {e}"
         print(f"[ACTION_SYS][ERROR] {error_msg}")
         return False, error_msg
+    return True, job
 
 
 def get_uptime():
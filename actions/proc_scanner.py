@@ -0,0 +1,119 @@
+# File: actions/proc_scanner.py
+# -*- coding: utf-8 -*-
+
+import os
+
+# Поэтапный поиск процессов прямо по /proc (без psutil.process_iter).
+# psutil с attrs=['name', 'exe', 'cmdline'] читает все три поля у каждого процесса заранее,
+# хотя дорогие readlink(exe) и чтение всего argv нужны только тогда, когда дешевая проверка
+# по имени не сработала. Здесь каждый следующий этап выполняется лениво:
+#   1. /proc/<pid>/comm        - имя процесса (одно короткое чтение);
+#   2. readlink /proc/<pid>/exe - базовое имя исполняемого файла;
+#   3. /proc/<pid>/cmdline     - базовое имя argv[0].
+
+PROC_ROOT = "/proc"
+
+# Качество совпадения (меньше - лучше), те же значения, что и в process_index
+MATCH_BY_NAME = 0
+MATCH_BY_EXE = 1
+MATCH_BY_ARGV0 = 2
+
+# Ядро обрезает comm до 15 символов (TASK_COMM_LEN - 1)
+COMM_MAX_LEN = 15
+
+
+def _read_comm(proc_dir: str) -> str | None:
+    try:
+        with open(os.path.join(proc_dir, "comm"), "rb") as f:
+            return f.read().decode("utf-8", "replace").rstrip("\n").lower()
+    except OSError:
+        return None
+
+
+def _read_exe_basename(proc_dir: str) -> str | None:
+    try:
+        exe_path = os.readlink(os.path.join(proc_dir, "exe"))
+    except OSError: # Нет прав (чужой процесс), поток ядра или процесс уже завершился
+        return None
+    # У удаленного бинарника ядро дописывает " (deleted)"
+    if exe_path.endswith(" (deleted)"):
+        exe_path = exe_path[:-len(" (deleted)")]
+    return os.path.basename(exe_path).lower()
+
+
+def _read_argv0_basename(proc_dir: str) -> str | None:
+    try:
+        with open(os.path.join(proc_dir, "cmdline"), "rb") as f:
+            argv0 = f.read().split(b"\0", 1)[0]
+    except OSError:
+        return None
+    if not argv0:
+        return None
+    return os.path.basename(argv0.decode("utf-8", "replace")).lower()
+
+
+def match_process(proc_dir: str, names: set[str]) -> tuple[int, str] | None:
+    """
+    Проверяет один процесс по этапам и возвращает (качество, совпавшее_имя) или None.
+    Следующий этап читается только если предыдущий не дал совпадения.
+    """
+    comm = _read_comm(proc_dir)
+    if comm is None:
+        return None
+    if comm in names:
+        return MATCH_BY_NAME, comm
+
+    exe_name = _read_exe_basename(proc_dir)
+    if exe_name and exe_name in names:
+        return MATCH_BY_EXE, exe_name
+    # Если comm обрезан ядром, а совпадение по exe не удалось (нет прав на readlink),
+    # сравниваем обрезанное имя с префиксами искомых имен
+    if exe_name is None and len(comm) == COMM_MAX_LEN:
+        for name in names:
+            if len(name) > COMM_MAX_LEN and name.startswith(comm):
+                return MATCH_BY_NAME, name
+
+    argv0_name = _read_argv0_basename(proc_dir)
+    if argv0_name and argv0_name in names:
+        return MATCH_BY_ARGV0, argv0_name
+    return None
+
+
+def scan_matching_pids(names, proc_root: str = PROC_ROOT, exclude_pids=()) -> list[tuple[int, int, str]]:
+    """
+    Ищет все процессы, у которых comm, exe или argv[0] совпадает с одним из names.
+
+    Args:
+        names: Имена для поиска (сравниваются в нижнем регистре).
+        proc_root (str): Корень procfs (для тестов и бенчмарков можно подставить свой каталог).
+        exclude_pids: PID, которые нужно пропустить (например, собственный).
+
+    Returns:
+        list[tuple[int, int, str]]: [(pid, качество, совпавшее_имя)], сначала лучшие совпадения.
+    """
+    names = {name.lower() for name in names if name}
+    if not names:
+        return []
+    excluded = set(exclude_pids)
+    matches = []
+    try:
+        entries = os.listdir(proc_root)
+    except OSError as e:
+        print(f"[PROC_SCANNER][ERROR] Не удалось прочитать {proc_root}: {e}")
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        if pid in excluded:
+            continue
+        result = match_process(os.path.join(proc_root, entry), names)
+        if result is not None:
+            matches.append((pid, result[0], result[1]))
+    matches.sort(key=lambda match: (match[1], match[0]))
+    return matches
+
+
+def is_available(proc_root: str = PROC_ROOT) -> bool:
+    """Есть ли procfs (на не-Linux системах используется psutil)."""
+    return os.path.isdir(os.path.join(proc_root, "self"))
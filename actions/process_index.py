@@ -0,0 +1,180 @@
+# File: actions/process_index.py
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+import psutil
+
+# Индекс запущенных процессов: имя -> PID.
+# Вместо полного обхода psutil.process_iter на каждую команду индекс обновляется
+# инкрементально: сравниваем множество PID с прошлым, читаем только новые и удаляем исчезнувшие.
+# Процесс, сделавший exec (PID тот же, программа другая), находим по смене /proc/<pid>/comm:
+# одно чтение маленького файла на известный PID при обновлении и на кандидата при поиске.
+
+# Индекс считается актуальным это количество секунд после последнего обновления
+PROCESS_INDEX_MAX_STALENESS = float(os.environ.get('FAMILIAR_PROCESS_INDEX_STALENESS', 1.0))
+
+# Качество совпадения (меньше - лучше): по имени процесса, по exe, по argv[0]
+MATCH_BY_NAME = 0
+MATCH_BY_EXE = 1
+MATCH_BY_ARGV0 = 2
+
+
+class ProcessIndex:
+    """
+    Отображение "имя в нижнем регистре" -> {pid: качество совпадения}.
+    Ключи процесса: proc.name(), basename(exe) и basename(argv[0]).
+    """
+
+    def __init__(self, max_staleness: float = PROCESS_INDEX_MAX_STALENESS):
+        self.max_staleness = max_staleness
+        self._by_name = {} # name -> {pid: quality}
+        self._by_pid = {}  # pid -> {"create_time": float, "comm": str|None, "keys": {name: quality}, "name": str, "exe": str|None, "cmdline": list}
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"refreshes": 0, "pids_added": 0, "pids_removed": 0, "pids_reexeced": 0, "last_refresh_ms": 0.0}
+
+    # --- Обновление ---
+    def refresh(self, force: bool = False):
+        """Инкрементально обновляет индекс, если он старше max_staleness (или force=True)."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.max_staleness:
+                return
+            started = time.perf_counter()
+            current_pids = set(psutil.pids())
+            known_pids = set(self._by_pid)
+            for pid in known_pids - current_pids:
+                self._remove_locked(pid)
+            for pid in current_pids - known_pids:
+                self._add_locked(pid)
+            for pid in known_pids & current_pids:
+                self._recheck_comm_locked(pid)
+            self._last_refresh = now
+            self.stats["refreshes"] += 1
+            self.stats["last_refresh_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    @staticmethod
+    def _read_comm(pid: int) -> str | None:
+        """Имя программы из /proc/<pid>/comm (меняется при exec); None - процесса нет или /proc недоступен."""
+        try:
+            with open(f"/proc/{pid}/comm", 'r', encoding='utf-8', errors='replace') as f:
+                return f.read().rstrip("\n")
+        except OSError:
+            return None
+
+    def _recheck_comm_locked(self, pid: int) -> bool:
+        """Перечитывает процесс, если он сменил программу (exec). True - запись изменилась."""
+        comm = self._read_comm(pid)
+        entry = self._by_pid.get(pid)
+        if entry is None or comm is None or comm == entry["comm"]:
+            return False
+        self._remove_locked(pid)
+        self._add_locked(pid)
+        self.stats["pids_reexeced"] += 1
+        return True
+
+    def _add_locked(self, pid: int):
+        comm = self._read_comm(pid) # До чтения через psutil: exec между ними заметим при следующей проверке
+        try:
+            proc = psutil.Process(pid)
+            with proc.oneshot():
+                name = proc.name() or ""
+                create_time = proc.create_time()
+                try:
+                    exe = proc.exe() or None
+                except (psutil.AccessDenied, psutil.ZombieProcess):
+                    exe = None
+                try:
+                    cmdline = proc.cmdline()
+                except (psutil.AccessDenied, psutil.ZombieProcess):
+                    cmdline = []
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return
+
+        keys = {}
+        for key, quality in ((name.lower(), MATCH_BY_NAME),
+                             (os.path.basename(exe).lower() if exe else "", MATCH_BY_EXE),
+                             (os.path.basename(cmdline[0]).lower() if cmdline else "", MATCH_BY_ARGV0)):
+            if key and (key not in keys or quality < keys[key]):
+                keys[key] = quality
+        self._by_pid[pid] = {"create_time": create_time, "comm": comm, "keys": keys, "name": name, "exe": exe, "cmdline": cmdline}
+        for key, quality in keys.items():
+            self._by_name.setdefault(key, {})[pid] = quality
+        self.stats["pids_added"] += 1
+
+    def _remove_locked(self, pid: int):
+        entry = self._by_pid.pop(pid, None)
+        if entry is None:
+            return
+        for key in entry["keys"]:
+            pids = self._by_name.get(key)
+            if pids is not None:
+                pids.pop(pid, None)
+                if not pids:
+                    del self._by_name[key]
+        self.stats["pids_removed"] += 1
+
+    def forget(self, pid: int):
+        """Удаляет PID из индекса (например, после завершения процесса)."""
+        with self._lock:
+            self._remove_locked(pid)
+
+    # --- Поиск ---
+    def find_pids(self, names) -> list[tuple[int, int, dict]]:
+        """
+        Возвращает [(pid, качество, сведения)] для процессов, у которых имя, exe или argv[0]
+        совпадает с одним из names, отсортированные по качеству совпадения.
+        Каждый кандидат проверяется по create_time, чтобы не вернуть переиспользованный PID,
+        и по comm, чтобы не вернуть процесс, который с момента индексации сделал exec.
+        """
+        self.refresh()
+        with self._lock:
+            names = [name.lower() for name in names]
+            candidates = {}
+            for name in names:
+                for pid, quality in self._by_name.get(name, {}).items():
+                    if pid not in candidates or quality < candidates[pid]:
+                        candidates[pid] = quality
+
+            matches = []
+            for pid, quality in candidates.items():
+                entry = self._by_pid[pid]
+                try:
+                    alive = psutil.Process(pid).create_time() == entry["create_time"]
+                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    alive = False
+                if not alive:
+                    self._remove_locked(pid) # умер или PID переиспользован - перечитаем при следующем обновлении
+                    continue
+                if self._recheck_comm_locked(pid):
+                    # exec: совпадение проверяем по новой программе
+                    entry = self._by_pid.get(pid)
+                    qualities = [entry["keys"][name] for name in names if entry and name in entry["keys"]]
+                    if not qualities:
+                        continue
+                    quality = min(qualities)
+                matches.append((pid, quality, {"name": entry["name"], "exe": entry["exe"], "cmdline": entry["cmdline"]}))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["indexed_pids"] = len(self._by_pid)
+            stats["indexed_names"] = len(self._by_name)
+        return stats
+
+
+_process_index = None
+_process_index_lock = threading.Lock()
+
+def get_process_index() -> ProcessIndex:
+    """Возвращает общий (ленивый) индекс процессов."""
+    global _process_index
+    if _process_index is None:
+        with _process_index_lock:
+            if _process_index is None:
+                _process_index = ProcessIndex()
+    return _process_index
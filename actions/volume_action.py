@@ -0,0 +1,347 @@
+# File: actions/volume_action.py
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import subprocess
+import threading
+import time
+import executable_index
+
+# Управление громкостью (интент manage_sound) через PulseAudio / PipeWire (pipewire-pulse).
+# Держим одно соединение с звуковым сервером (pulsectl) вместо запуска pactl на каждый шаг.
+# Зависимость необязательная: без pulsectl (pip install pulsectl) или без сервера
+# используется pactl; FAMILIAR_VOLUME_BACKEND=fake - бэкенд в памяти для проверок без звука.
+#
+# Серия "громче"/"тише" в пределах окна FAMILIAR_VOLUME_COALESCE_MS сворачивается: первая команда
+# записывает уровень сразу (ошибка - в ответ на нее же) и открывает окно, следующие только сдвигают
+# целевой уровень, который записывается одной установкой в конце окна. Если эта отложенная запись
+# не удалась, об ошибке сообщает следующая команда управления звуком (take_deferred_failure).
+#
+# Уровень - громкость самого громкого канала; изменение масштабирует все каналы, сохраняя баланс.
+
+try:
+    import pulsectl
+except ImportError:
+    pulsectl = None
+
+# Бэкенд: auto (pulsectl, затем pactl) | pulse | pactl | fake
+VOLUME_BACKEND = os.environ.get('FAMILIAR_VOLUME_BACKEND', 'auto').lower()
+# Устройство вывода: имя sink'а (например, familiar_null из config/pulse_null_sink.pa) или устройство по умолчанию
+PULSE_SINK = os.environ.get('FAMILIAR_PULSE_SINK', '@DEFAULT_SINK@')
+VOLUME_STEP_PERCENT = int(os.environ.get('FAMILIAR_VOLUME_STEP', 10)) # "громче" без уточнения
+VOLUME_SOFT_STEP_PERCENT = 5 # "немного громче"
+VOLUME_LARGE_STEP_PERCENT = 25 # "намного громче"
+VOLUME_MAX_PERCENT = int(os.environ.get('FAMILIAR_VOLUME_MAX', 100)) # PulseAudio позволяет и больше 100%
+COALESCE_WINDOW_S = int(os.environ.get('FAMILIAR_VOLUME_COALESCE_MS', 150)) / 1000
+
+_SOFT_AMOUNTS = {"немного", "немножко", "чуть", "чуть-чуть", "слегка", "капельку"}
+_LARGE_AMOUNTS = {"намного", "сильно", "много", "значительно"}
+_PERCENT_AMOUNT_RE = re.compile(r"^(?:на )?(\d{1,3}) ?(?:%|процент(?:а|ов)?)?$")
+_PACTL_PERCENT_RE = re.compile(r"(\d+)%")
+_PACTL_CHANNEL_RE = re.compile(r"([\w-]+): \d+ / +(\d+)%") # "front-left: 32768 /  50% / -18.06 dB"
+
+
+def normalize_amount(amount) -> int | None:
+    """
+    Шаг громкости в процентах из параметра "amount": "20%", "20", "на 20 процентов",
+    "немного", "намного"; пусто - шаг по умолчанию. None - не удалось понять.
+    """
+    if amount is None or str(amount).strip() == "":
+        return VOLUME_STEP_PERCENT
+    if isinstance(amount, (int, float)):
+        return int(amount) if 0 < amount <= VOLUME_MAX_PERCENT else None
+    text = " ".join(str(amount).lower().replace("ё", "е").split())
+    if text in _SOFT_AMOUNTS:
+        return VOLUME_SOFT_STEP_PERCENT
+    if text in _LARGE_AMOUNTS:
+        return VOLUME_LARGE_STEP_PERCENT
+    match = _PERCENT_AMOUNT_RE.match(text)
+    if match and 0 < int(match.group(1)) <= VOLUME_MAX_PERCENT:
+        return int(match.group(1))
+    return None
+
+
+def _scale_channels(levels: list, target):
+    """Уровни каналов, масштабированные так, чтобы самый громкий стал target (баланс сохраняется)."""
+    loudest = max(levels)
+    if loudest <= 0:
+        return [target] * len(levels) # Из тишины баланс не восстановить
+    return [level * target / loudest for level in levels]
+
+
+# --- Бэкенды: уровень (самый громкий канал) в целых процентах, mute - bool ---
+class PulseBackend:
+    """Постоянное соединение с PulseAudio / pipewire-pulse через pulsectl."""
+
+    name = "pulse"
+
+    def __init__(self, sink_name: str = PULSE_SINK):
+        self.sink_name = sink_name
+        self._pulse = pulsectl.Pulse("familiar")
+
+    def _sink(self):
+        # Устройство по умолчанию может смениться (наушники), поэтому ищем его на каждый вызов:
+        # по готовому соединению это один запрос, без запуска процессов
+        name = self._pulse.server_info().default_sink_name if self.sink_name == "@DEFAULT_SINK@" else self.sink_name
+        return self._pulse.get_sink_by_name(name)
+
+    def get_volume(self) -> int:
+        return round(max(self._sink().volume.values) * 100)
+
+    def set_volume(self, percent: int):
+        sink = self._sink()
+        volume = sink.volume
+        volume.values = _scale_channels(volume.values, percent / 100)
+        self._pulse.volume_set(sink, volume)
+
+    def get_mute(self) -> bool:
+        return bool(self._sink().mute)
+
+    def set_mute(self, mute: bool):
+        self._pulse.mute(self._sink(), mute)
+
+    def close(self):
+        self._pulse.close()
+
+
+class PactlBackend:
+    """Запасной вариант: процесс pactl на каждую операцию."""
+
+    name = "pactl"
+
+    def __init__(self, sink_name: str = PULSE_SINK):
+        if not executable_index.which("pactl"):
+            raise RuntimeError("Команда 'pactl' не найдена (пакет pulseaudio-utils)")
+        self.sink_name = sink_name
+
+    def _pactl(self, *args) -> str:
+        result = subprocess.run(["pactl", *args], capture_output=True, text=True, check=False, timeout=5)
+        if result.returncode != 0:
+            raise RuntimeError(f"pactl {' '.join(args)}: {result.stderr.strip() or result.returncode}")
+        return result.stdout
+
+    def _channel_percents(self) -> list[int]:
+        output = self._pactl("get-sink-volume", self.sink_name)
+        # Первая строка - "Volume: <канал>: ... / N% / ..., <канал>: ...", строка "balance" не нужна
+        channels = [int(percent) for _, percent in _PACTL_CHANNEL_RE.findall(output.split("\n", 1)[0])]
+        if not channels:
+            channels = [int(percent) for percent in _PACTL_PERCENT_RE.findall(output)[:1]]
+        if not channels:
+            raise RuntimeError("pactl get-sink-volume: не удалось разобрать вывод")
+        return channels
+
+    def get_volume(self) -> int:
+        return max(self._channel_percents())
+
+    def set_volume(self, percent: int):
+        # pactl принимает уровень на каждый канал по порядку: "50% 60%"
+        channels = _scale_channels(self._channel_percents(), percent)
+        self._pactl("set-sink-volume", self.sink_name, *(f"{round(level)}%" for level in channels))
+
+    def get_mute(self) -> bool:
+        return "yes" in self._pactl("get-sink-mute", self.sink_name).lower()
+
+    def set_mute(self, mute: bool):
+        self._pactl("set-sink-mute", self.sink_name, "1" if mute else "0")
+
+    def close(self):
+        pass
+
+
+class FakeBackend:
+    """Громкость в памяти: проверка обработчика и свертки команд без звукового сервера."""
+
+    name = "fake"
+
+    def __init__(self, volume: int = 50, mute: bool = False):
+        self.volume = volume
+        self.mute = mute
+        self.calls = [] # ("set_volume", 60), ("set_mute", True) ...
+
+    def get_volume(self) -> int:
+        return self.volume
+
+    def set_volume(self, percent: int):
+        self.calls.append(("set_volume", percent))
+        self.volume = percent
+
+    def get_mute(self) -> bool:
+        return self.mute
+
+    def set_mute(self, mute: bool):
+        self.calls.append(("set_mute", mute))
+        self.mute = mute
+
+    def close(self):
+        pass
+
+
+def _create_backend():
+    """Бэкенд по FAMILIAR_VOLUME_BACKEND; в режиме auto - pulsectl, при неудаче - pactl."""
+    if VOLUME_BACKEND == "fake":
+        return FakeBackend()
+    if VOLUME_BACKEND in ("auto", "pulse") and pulsectl is not None:
+        try:
+            return PulseBackend()
+        except Exception as e: # pulsectl.PulseError: сервер не запущен и т.п.
+            if VOLUME_BACKEND == "pulse":
+                raise
+            print(f"[VOLUME][WARN] Не удалось подключиться к звуковому серверу через pulsectl ({e}), используем pactl.")
+    return PactlBackend()
+
+
+class VolumeController:
+    """Бэкенд + свертка серий изменений громкости в одну установку уровня."""
+
+    def __init__(self, backend, coalesce_window_s: float = COALESCE_WINDOW_S):
+        self.backend = backend
+        self.coalesce_window_s = coalesce_window_s
+        self._lock = threading.Lock()
+        self._level = None # Уровень, записанный (или отложенный) в открытом окне; None - окна нет
+        self._pending = None # Целевой уровень, который еще не записан
+        self._flush_timer = None
+        self.stats = {"requests": 0, "set_calls": 0, "coalesced": 0}
+
+    def change_volume(self, delta_percent: int) -> tuple[int, int]:
+        """Сдвигает уровень на delta_percent. Возвращает (было, станет) в процентах."""
+        with self._lock:
+            self.stats["requests"] += 1
+            in_window = self._level is not None
+            current = self._level if in_window else self.backend.get_volume()
+            if delta_percent > 0:
+                # Уровень выше FAMILIAR_VOLUME_MAX (PulseAudio позволяет >100%) "громче" не понижает
+                target = max(current, min(VOLUME_MAX_PERCENT, current + delta_percent))
+            else:
+                target = max(0, current + delta_percent)
+            if target == current:
+                return current, target # Уже на пределе - записывать нечего
+            if in_window:
+                # Серия: запишем одним вызовом в конце окна
+                self.stats["coalesced"] += 1
+                self._pending = self._level = target
+                return current, target
+            self._apply_locked(target) # Ошибка - исключением, в ответ на эту же команду
+            if self.coalesce_window_s > 0:
+                self._level = target
+                # Не daemon: разовая команда из консоли не завершится, не записав уровень
+                self._flush_timer = threading.Timer(self.coalesce_window_s, self.flush)
+                self._flush_timer.start()
+            return current, target
+
+    def _apply_locked(self, target: int):
+        self.stats["set_calls"] += 1
+        self.backend.set_volume(target)
+
+    def flush(self):
+        """Записывает отложенный уровень и закрывает окно (по таймеру окна или перед mute/чтением)."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            target, self._pending, self._level = self._pending, None, None
+            if target is None:
+                return
+            started = time.monotonic()
+            try:
+                self._apply_locked(target)
+                print(f"[VOLUME][INFO] Громкость {target}% ({self.backend.name}, {(time.monotonic() - started) * 1000:.1f} мс)")
+            except Exception as e:
+                print(f"[VOLUME][ERROR] Не удалось установить громкость {target}%: {e}")
+                _record_deferred_failure(target, e)
+                _reset_controller_later(self)
+
+    def set_mute(self, mute: bool):
+        self.flush()
+        with self._lock:
+            self.backend.set_mute(mute)
+
+    def get_state(self) -> dict:
+        with self._lock:
+            volume = self._level if self._level is not None else self.backend.get_volume()
+            return {"volume": volume, "mute": self.backend.get_mute()}
+
+    def close(self):
+        self.flush()
+        self.backend.close()
+
+
+_controller = None
+_controller_lock = threading.Lock()
+_deferred_failure = None # {"volume": N, "error": "..."} - отложенная запись не удалась, ответ уже ушел
+
+def get_volume_controller() -> VolumeController:
+    """Общий (ленивый) контроллер громкости. RuntimeError / pulsectl.PulseError, если звука нет."""
+    global _controller
+    if _controller is not None:
+        return _controller
+    with _controller_lock:
+        if _controller is None:
+            backend = _create_backend()
+            print(f"[VOLUME][INFO] Бэкенд громкости: {backend.name}, устройство: {PULSE_SINK}")
+            _controller = VolumeController(backend)
+    return _controller
+
+def reset_volume_controller():
+    """Сбрасывает соединение (например, после перезапуска pipewire), следующий вызов подключится заново."""
+    global _controller
+    with _controller_lock:
+        controller, _controller = _controller, None
+    if controller is not None:
+        try:
+            controller.close()
+        except Exception:
+            pass
+
+def _record_deferred_failure(target: int, error: Exception):
+    global _deferred_failure
+    with _controller_lock:
+        _deferred_failure = {"volume": target, "error": str(error)}
+
+def take_deferred_failure() -> dict | None:
+    """
+    Ошибка отложенной записи уровня (конец серии "громче"/"тише"), о которой пользователь еще
+    не знает: {"volume": N, "error": "..."} или None. Сбрасывается при чтении.
+    """
+    global _deferred_failure
+    with _controller_lock:
+        failure, _deferred_failure = _deferred_failure, None
+    return failure
+
+def _reset_controller_later(controller: VolumeController):
+    # Вызывается под блокировкой контроллера - закрываем соединение из другого потока
+    def reset():
+        global _controller
+        with _controller_lock:
+            if _controller is controller:
+                _controller = None
+        try:
+            controller.backend.close()
+        except Exception:
+            pass
+    threading.Thread(target=reset, daemon=True).start()
+
+
+# --- Действия для обработчика ---
+def change_volume(direction: str, step: int) -> tuple[bool, dict | str]:
+    """
+    "up"/"down" на step процентов (см. normalize_amount). Возвращает
+    (True, {"volume_before", "volume", "step"}) или (False, сообщение об ошибке).
+    """
+    try:
+        before, after = get_volume_controller().change_volume(step if direction == "up" else -step)
+    except Exception as e:
+        print(f"[VOLUME][ERROR] Не удалось изменить громкость: {e}")
+        reset_volume_controller()
+        return False, str(e)
+    return True, {"volume_before": before, "volume": after, "step": step}
+
+def set_mute(mute: bool) -> tuple[bool, str]:
+    """Выключает/включает звук."""
+    try:
+        get_volume_controller().set_mute(mute)
+    except Exception as e:
+        print(f"[VOLUME][ERROR] Не удалось {'выключить' if mute else 'включить'} звук: {e}")
+        reset_volume_controller()
+        return False, str(e)
+    return True, "Звук выключен" if mute else "Звук включен"
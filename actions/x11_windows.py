@@ -0,0 +1,194 @@
+# File: actions/x11_windows.py
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+
+# Нативная работа с окнами X11 без запуска wmctrl/xdotool.
+# Держим одно соединение с X-сервером и таблицу окон (WM_CLASS, заголовок, _NET_WM_PID),
+# которая обновляется по событиям PropertyNotify: на корневом окне - изменения
+# _NET_CLIENT_LIST (окна появились/закрылись), на самих окнах - смена заголовка.
+# Активация - клиентское сообщение _NET_ACTIVE_WINDOW оконному менеджеру.
+# Зависимость необязательная: без python-xlib (pip install python-xlib) или без DISPLAY
+# get_x11_window_index() возвращает None, и используются wmctrl/xdotool.
+
+try:
+    from Xlib import X, Xatom, display as xdisplay, error as xerror
+    from Xlib.protocol import event as xevent
+except ImportError:
+    X = None
+
+# Отключить нативный путь: FAMILIAR_X11_NATIVE=0
+X11_NATIVE_ENABLED = os.environ.get('FAMILIAR_X11_NATIVE', '1').lower() not in ('0', 'false', 'no')
+
+# Источник запроса в _NET_ACTIVE_WINDOW: 2 = pager (запрос от пользователя, WM не должен его игнорировать)
+_ACTIVE_WINDOW_SOURCE_PAGER = 2
+
+
+class X11WindowIndex:
+    """Постоянное соединение с X и кэш окон из _NET_CLIENT_LIST."""
+
+    def __init__(self, display_name: str | None = None):
+        self._display = xdisplay.Display(display_name)
+        self._root = self._display.screen().root
+        self._atoms = {name: self._display.intern_atom(name) for name in (
+            "_NET_CLIENT_LIST", "_NET_ACTIVE_WINDOW", "_NET_WM_PID", "_NET_WM_NAME",
+            "_NET_WM_DESKTOP", "_NET_CURRENT_DESKTOP", "UTF8_STRING")}
+        self._windows = {} # window_id -> {"wm_class": "instance.class", "title": str, "pid": int | None}
+        self._lock = threading.Lock()
+        self.stats = {"refreshes": 0, "events": 0, "activations": 0}
+        # Подписываемся на изменения свойств корневого окна (_NET_CLIENT_LIST, _NET_ACTIVE_WINDOW)
+        self._root.change_attributes(event_mask=X.PropertyChangeMask)
+        with self._lock:
+            self._refresh_client_list_locked()
+
+    # --- Таблица окон ---
+    def _refresh_client_list_locked(self):
+        prop = self._root.get_full_property(self._atoms["_NET_CLIENT_LIST"], X.AnyPropertyType)
+        current_ids = set(prop.value) if prop else set()
+        for window_id in set(self._windows) - current_ids:
+            del self._windows[window_id]
+        for window_id in current_ids - set(self._windows):
+            window = self._display.create_resource_object("window", window_id)
+            try:
+                # Следим за сменой заголовка самого окна
+                window.change_attributes(event_mask=X.PropertyChangeMask)
+                self._windows[window_id] = self._read_window_info(window)
+            except xerror.XError: # Окно успело закрыться
+                continue
+        self.stats["refreshes"] += 1
+
+    def _read_window_info(self, window) -> dict:
+        wm_class = window.get_wm_class() or ()
+        pid_prop = window.get_full_property(self._atoms["_NET_WM_PID"], Xatom.CARDINAL)
+        return {
+            "wm_class": ".".join(wm_class).lower(),
+            "title": self._read_title(window),
+            "pid": int(pid_prop.value[0]) if pid_prop and len(pid_prop.value) else None,
+        }
+
+    def _read_title(self, window) -> str:
+        prop = window.get_full_property(self._atoms["_NET_WM_NAME"], self._atoms["UTF8_STRING"])
+        if prop and prop.value:
+            value = prop.value
+            return value.decode("utf-8", "replace") if isinstance(value, bytes) else str(value)
+        return window.get_wm_name() or ""
+
+    def _process_pending_events_locked(self):
+        """Разбирает накопившиеся события PropertyNotify (без блокировки)."""
+        client_list_changed = False
+        while self._display.pending_events():
+            event = self._display.next_event()
+            if event.type != X.PropertyNotify:
+                continue
+            self.stats["events"] += 1
+            if event.window.id == self._root.id:
+                if event.atom == self._atoms["_NET_CLIENT_LIST"]:
+                    client_list_changed = True
+            elif event.atom in (self._atoms["_NET_WM_NAME"], Xatom.WM_NAME):
+                info = self._windows.get(event.window.id)
+                if info is not None:
+                    try:
+                        info["title"] = self._read_title(event.window)
+                    except xerror.XError:
+                        pass
+        if client_list_changed:
+            self._refresh_client_list_locked()
+
+    def list_windows(self) -> dict:
+        """Копия таблицы окон (после разбора накопившихся событий)."""
+        with self._lock:
+            self._process_pending_events_locked()
+            return {window_id: dict(info) for window_id, info in self._windows.items()}
+
+    # --- Поиск и активация ---
+    def find_window(self, window_class_or_name: str, pid: int | None = None) -> int | None:
+        """
+        Ищет окно как 'wmctrl -xa' (подстрока WM_CLASS без учета регистра),
+        а если не нашлось и передан PID - по _NET_WM_PID. Заголовок не проверяется:
+        "telegram" не должен попасть на вкладку браузера "Telegram Web".
+        """
+        needle = (window_class_or_name or "").lower()
+        with self._lock:
+            self._process_pending_events_locked()
+            if needle:
+                for window_id, info in self._windows.items():
+                    if needle in info["wm_class"]:
+                        return window_id
+            if pid:
+                for window_id, info in self._windows.items():
+                    if info["pid"] == pid:
+                        return window_id
+        return None
+
+    def activate_window(self, window_id: int) -> bool:
+        """Переключает рабочий стол при необходимости и отправляет WM запрос _NET_ACTIVE_WINDOW."""
+        with self._lock:
+            window = self._display.create_resource_object("window", window_id)
+            try:
+                desktop_prop = window.get_full_property(self._atoms["_NET_WM_DESKTOP"], Xatom.CARDINAL)
+                if desktop_prop and len(desktop_prop.value) and desktop_prop.value[0] != 0xFFFFFFFF:
+                    self._send_root_message(self._root, self._atoms["_NET_CURRENT_DESKTOP"],
+                                            [int(desktop_prop.value[0]), X.CurrentTime, 0, 0, 0])
+                window.map() # Аналог 'xdotool windowmap' для свернутых в трей окон
+                self._send_root_message(window, self._atoms["_NET_ACTIVE_WINDOW"],
+                                        [_ACTIVE_WINDOW_SOURCE_PAGER, X.CurrentTime, 0, 0, 0])
+                self._display.flush()
+            except xerror.XError as e:
+                print(f"[X11][WARN] Не удалось активировать окно {window_id:#x}: {e}")
+                self._windows.pop(window_id, None)
+                return False
+            self.stats["activations"] += 1
+        return True
+
+    def _send_root_message(self, window, message_type, data: list[int]):
+        message = xevent.ClientMessage(window=window, client_type=message_type, data=(32, data))
+        self._root.send_event(message, event_mask=X.SubstructureRedirectMask | X.SubstructureNotifyMask)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["windows"] = len(self._windows)
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._display.close()
+
+
+_x11_index = None
+_x11_index_failed = False
+_x11_index_lock = threading.Lock()
+
+def get_x11_window_index() -> X11WindowIndex | None:
+    """
+    Возвращает общее (ленивое) соединение с X или None, если python-xlib не установлен,
+    нет DISPLAY или подключиться не удалось (тогда используются wmctrl/xdotool).
+    """
+    global _x11_index, _x11_index_failed
+    if _x11_index is not None or _x11_index_failed:
+        return _x11_index
+    with _x11_index_lock:
+        if _x11_index is None and not _x11_index_failed:
+            if X is None or not X11_NATIVE_ENABLED or not os.environ.get("DISPLAY"):
+                _x11_index_failed = True
+                return None
+            try:
+                _x11_index = X11WindowIndex()
+                print(f"[X11][INFO] Подключен к X-серверу, окон в таблице: {len(_x11_index._windows)}")
+            except Exception as e: # Xlib.error.DisplayError, ConnectionClosedError и т.п.
+                print(f"[X11][WARN] Не удалось подключиться к X-серверу ({e}), используем wmctrl/xdotool.")
+                _x11_index_failed = True
+    return _x11_index
+
+def reset_x11_window_index():
+    """Сбрасывает соединение (например, после обрыва), следующий вызов подключится заново."""
+    global _x11_index, _x11_index_failed
+    with _x11_index_lock:
+        if _x11_index is not None:
+            try:
+                _x11_index.close()
+            except Exception:
+                pass
+        _x11_index = None
+        _x11_index_failed = False
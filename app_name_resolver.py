@@ -0,0 +1,210 @@
+# File: app_name_resolver.py
+# -*- coding: utf-8 -*-
+
+# Нечеткое сопоставление имени приложения ("Телеграмм", "google chrome", "Fire fox").
+# Кандидаты - ключи и значения APP_ALIASES и исполняемые файлы из PATH - лежат
+# в инвертированном индексе по символьным триграммам. Похожесть - коэффициент Дайса
+# по общим триграммам; поиск ограничен по времени, поэтому и тысячи команд в PATH
+# не задерживают ответ. Индекс обновляется инкрементально: при изменении алиасов или
+# списка команд добавляются/удаляются только изменившиеся кандидаты.
+
+import os
+import re
+import threading
+import time
+
+import executable_index
+
+# Минимальная похожесть (0..1), при которой кандидат считается найденным
+RESOLVER_MIN_SCORE = float(os.environ.get('FAMILIAR_RESOLVER_MIN_SCORE', 0.55))
+# Бюджет времени на один поиск (мс)
+RESOLVER_TIME_BUDGET_MS = float(os.environ.get('FAMILIAR_RESOLVER_BUDGET_MS', 20))
+
+SOURCE_ALIAS = "alias"             # ключ APP_ALIASES
+SOURCE_ALIAS_TARGET = "alias_target" # значение APP_ALIASES
+SOURCE_EXECUTABLE = "executable"   # команда из PATH
+
+# При равной похожести алиасы важнее случайных команд из PATH
+_SOURCE_PRIORITY = {SOURCE_ALIAS: 0, SOURCE_ALIAS_TARGET: 1, SOURCE_EXECUTABLE: 2}
+
+# Пробелы, дефисы, точки и подчеркивания не различаем: "fire fox" == "firefox", "google chrome" == "google-chrome"
+_SEPARATORS_RE = re.compile(r"[\s\-_.]+")
+
+
+def normalize_app_name(name: str) -> str:
+    return _SEPARATORS_RE.sub("", (name or "").lower().replace("ё", "е"))
+
+
+def _trigrams(normalized: str) -> set[str]:
+    padded = f"${normalized}$"
+    if len(padded) < 3:
+        return {padded}
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AppNameResolver:
+    """Триграммный индекс имен приложений."""
+
+    def __init__(self):
+        self._candidates = {}   # (source, name) -> {"name", "command", "source", "key", "trigrams"}
+        self._by_key = {}       # нормализованное имя -> {(source, name), ...}
+        self._postings = {}     # триграмма -> {(source, name), ...}
+        self._alias_snapshot = {}
+        self._executables_generation = None
+        self._executables = frozenset()
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "exact_hits": 0, "fuzzy_hits": 0, "misses": 0, "budget_exceeded": 0}
+
+    # --- Инкрементальное обновление ---
+    def _add_locked(self, source: str, name: str, command: str):
+        candidate_id = (source, name)
+        if candidate_id in self._candidates:
+            self._remove_locked(candidate_id)
+        key = normalize_app_name(name)
+        if not key:
+            return
+        trigrams = _trigrams(key)
+        self._candidates[candidate_id] = {"name": name, "command": command, "source": source,
+                                          "key": key, "trigrams": len(trigrams)}
+        self._by_key.setdefault(key, set()).add(candidate_id)
+        for trigram in trigrams:
+            self._postings.setdefault(trigram, set()).add(candidate_id)
+
+    def _remove_locked(self, candidate_id):
+        candidate = self._candidates.pop(candidate_id, None)
+        if candidate is None:
+            return
+        key = candidate["key"]
+        self._by_key[key].discard(candidate_id)
+        if not self._by_key[key]:
+            del self._by_key[key]
+        for trigram in _trigrams(key):
+            ids = self._postings.get(trigram)
+            if ids is not None:
+                ids.discard(candidate_id)
+                if not ids:
+                    del self._postings[trigram]
+
+    def sync_aliases(self, aliases: dict):
+        """Добавляет/удаляет кандидатов только для изменившихся алиасов."""
+        with self._lock:
+            self._sync_aliases_locked(aliases or {})
+
+    def _sync_aliases_locked(self, aliases: dict):
+        if aliases == self._alias_snapshot:
+            return
+        old = self._alias_snapshot
+        for alias, command in old.items():
+            if aliases.get(alias) != command:
+                self._remove_locked((SOURCE_ALIAS, alias))
+        old_targets = set(old.values())
+        new_targets = set(aliases.values())
+        for target in old_targets - new_targets:
+            self._remove_locked((SOURCE_ALIAS_TARGET, target))
+        for alias, command in aliases.items():
+            if old.get(alias) != command:
+                self._add_locked(SOURCE_ALIAS, alias, command)
+        for target in new_targets - old_targets:
+            self._add_locked(SOURCE_ALIAS_TARGET, target, target)
+        self._alias_snapshot = dict(aliases)
+
+    def _sync_executables_locked(self):
+        generation, names = executable_index.get_executable_index().snapshot()
+        if generation == self._executables_generation:
+            return
+        for name in self._executables - names:
+            self._remove_locked((SOURCE_EXECUTABLE, name))
+        for name in names - self._executables:
+            self._add_locked(SOURCE_EXECUTABLE, name, name)
+        self._executables = names
+        self._executables_generation = generation
+
+    def add_alias(self, alias: str, command: str):
+        """Явно добавляет новый алиас (например, сразу после add_alias), не дожидаясь sync_aliases."""
+        alias, command = alias.lower(), command.lower()
+        with self._lock:
+            self._add_locked(SOURCE_ALIAS, alias, command)
+            self._add_locked(SOURCE_ALIAS_TARGET, command, command)
+            self._alias_snapshot[alias] = command
+
+    # --- Поиск ---
+    def resolve(self, raw_name: str, aliases: dict | None = None, sources=None,
+                min_score: float = RESOLVER_MIN_SCORE, time_budget_ms: float = RESOLVER_TIME_BUDGET_MS) -> dict | None:
+        """
+        Ищет наиболее похожее имя приложения.
+
+        Args:
+            raw_name (str): Имя от пользователя/NLU.
+            aliases (dict | None): Текущие APP_ALIASES (индекс подтянет изменения).
+            sources: Допустимые источники кандидатов (по умолчанию все).
+            min_score (float): Порог похожести.
+            time_budget_ms (float): Ограничение времени на подсчет совпадений.
+
+        Returns:
+            dict | None: {"name": найденное_имя, "command": команда_для_запуска, "source": ..., "score": 0..1}
+        """
+        key = normalize_app_name(raw_name)
+        if not key:
+            return None
+        with self._lock:
+            if aliases is not None:
+                self._sync_aliases_locked(aliases)
+            self._sync_executables_locked()
+            self.stats["lookups"] += 1
+            started = time.perf_counter() # Бюджет - только на поиск, без первичной загрузки индекса
+
+            # 1. Точное совпадение после нормализации ("Google Chrome" -> "google-chrome")
+            exact = [self._candidates[cid] for cid in self._by_key.get(key, ())
+                     if sources is None or cid[0] in sources]
+            if exact:
+                best = min(exact, key=lambda c: _SOURCE_PRIORITY[c["source"]])
+                self.stats["exact_hits"] += 1
+                return {"name": best["name"], "command": best["command"], "source": best["source"], "score": 1.0}
+
+            # 2. Подсчет общих триграмм; редкие триграммы первыми - они сильнее отсекают кандидатов
+            query_trigrams = _trigrams(key)
+            deadline = started + time_budget_ms / 1000
+            shared = {}
+            for trigram in sorted(query_trigrams, key=lambda t: len(self._postings.get(t, ()))):
+                for candidate_id in self._postings.get(trigram, ()):
+                    shared[candidate_id] = shared.get(candidate_id, 0) + 1
+                if time.perf_counter() > deadline:
+                    self.stats["budget_exceeded"] += 1
+                    break
+
+            best, best_rank = None, None
+            for candidate_id, common in shared.items():
+                if sources is not None and candidate_id[0] not in sources:
+                    continue
+                candidate = self._candidates[candidate_id]
+                score = 2 * common / (len(query_trigrams) + candidate["trigrams"])
+                rank = (-score, _SOURCE_PRIORITY[candidate["source"]], candidate["name"])
+                if best_rank is None or rank < best_rank:
+                    best, best_rank = candidate, rank
+
+            if best is None or -best_rank[0] < min_score:
+                self.stats["misses"] += 1
+                return None
+            self.stats["fuzzy_hits"] += 1
+            return {"name": best["name"], "command": best["command"], "source": best["source"],
+                    "score": round(-best_rank[0], 3)}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["candidates"] = len(self._candidates)
+            stats["trigrams"] = len(self._postings)
+        return stats
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+def get_app_name_resolver() -> AppNameResolver:
+    """Возвращает общий (ленивый) резолвер имен приложений."""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = AppNameResolver()
+    return _resolver
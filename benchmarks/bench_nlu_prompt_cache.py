@@ -0,0 +1,77 @@
+# File: benchmarks/bench_nlu_prompt_cache.py
+# -*- coding: utf-8 -*-
+
+# Сравнение prompt_eval до и после выноса статической NLU-инструкции в system-prompt.
+# Требует запущенную Ollama (OLLAMA_API_URL) с загруженной моделью.
+# Ollama сама переиспользует KV-кэш совпадающего начала промпта, поэтому в режиме 'before'
+# каждый запрос начинается с уникальной строки: иначе и "до" считался бы префикс из кэша.
+# Запуск из корня проекта:
+#     python benchmarks/bench_nlu_prompt_cache.py [--runs 3]
+
+import argparse
+import os
+import statistics
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nlu_processor
+
+BENCH_COMMANDS = [
+    "открой телегу",
+    "закрой хром",
+    "сколько система работает?",
+    "напомни позвонить маме завтра в 10",
+    "найди рецепт борща",
+]
+
+
+def run_mode(use_prompt_cache: bool, runs: int) -> dict:
+    """Гоняет BENCH_COMMANDS в одном режиме и собирает метрики Ollama."""
+    eval_counts, eval_ms, total_ms = [], [], []
+    for _ in range(runs):
+        for command in BENCH_COMMANDS:
+            prompt, system_prompt = nlu_processor.build_nlu_prompt(command, use_prompt_cache=use_prompt_cache)
+            if not use_prompt_cache:
+                prompt = f"[{uuid.uuid4().hex}]\n{prompt}" # Отличается с первого токена - префикс не из кэша
+            keep_alive = nlu_processor.DEFAULT_KEEP_ALIVE if use_prompt_cache else None
+            payload = nlu_processor._build_payload(prompt, nlu_processor.DEFAULT_MODEL_NAME, system_prompt, keep_alive)
+            data = nlu_processor._post_to_ollama(payload, nlu_processor.DEFAULT_API_URL)
+            if data is None:
+                continue
+            eval_counts.append(data.get("prompt_eval_count", 0))
+            eval_ms.append(data.get("prompt_eval_duration", 0) / 1e6)
+            total_ms.append(data.get("total_duration", 0) / 1e6)
+    if not eval_counts:
+        return {}
+    return {
+        "requests": len(eval_counts),
+        "prompt_eval_count_mean": round(statistics.mean(eval_counts), 1),
+        "prompt_eval_ms_mean": round(statistics.mean(eval_ms), 1),
+        "prompt_eval_ms_median": round(statistics.median(eval_ms), 1),
+        "total_ms_mean": round(statistics.mean(total_ms), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NLU prompt prefix cache benchmark")
+    parser.add_argument("--runs", type=int, default=3, help="Сколько раз прогонять набор команд в каждом режиме")
+    args = parser.parse_args()
+
+    print("Режим 'before': весь NLU_INSTRUCTION_TEMPLATE в prompt, без повторного использования префикса")
+    before = run_mode(use_prompt_cache=False, runs=args.runs)
+    print(before)
+
+    print("Режим 'after': статический префикс в system + keep_alive")
+    nlu_processor.warm_up_nlu_prefix()
+    after = run_mode(use_prompt_cache=True, runs=args.runs)
+    print(after)
+
+    if before and after and after["prompt_eval_ms_mean"]:
+        speedup = before["prompt_eval_ms_mean"] / after["prompt_eval_ms_mean"]
+        print(f"prompt_eval: {before['prompt_eval_ms_mean']} ms -> {after['prompt_eval_ms_mean']} ms (x{speedup:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# File: benchmarks/bench_proc_matcher.py
+# -*- coding: utf-8 -*-
+
+# Сравнение поэтапного поиска процессов (actions/proc_scanner.py) с прежней реализацией
+# (psutil.process_iter(['name', 'exe', 'cmdline']) читает все поля каждого процесса заранее).
+# Для воспроизводимости строится синтетическое дерево /proc во временном каталоге,
+# на которое psutil перенаправляется через psutil.PROCFS_PATH.
+# Запуск из корня проекта:
+#     python benchmarks/bench_proc_matcher.py [--processes 500] [--runs 20] [--live]
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from actions import proc_scanner
+from actions import manage_app_action
+
+# (comm, exe, argv0): фоновые процессы, которые ни с чем не совпадают (их большинство)
+BACKGROUND_PROCESSES = [
+    ("bash", "/usr/bin/bash", "-bash"),
+    ("systemd", "/usr/lib/systemd/systemd", "/sbin/init"),
+    ("Xorg", "/usr/lib/xorg/Xorg", "/usr/lib/xorg/Xorg"),
+    ("pulseaudio", "/usr/bin/pulseaudio", "/usr/bin/pulseaudio"),
+    ("code", "/usr/share/code/code", "/usr/share/code/code"),
+    ("kworker/0:1", None, None), # поток ядра: нет exe и пустой cmdline
+]
+# Приложения пользователя (запущены последними, поэтому у них старшие PID):
+# совпадение по comm, по exe и по argv[0]
+APP_PROCESSES = [
+    ("chrome", "/opt/google/chrome/chrome", "/opt/google/chrome/chrome"),
+    ("GeckoMain", "/usr/lib/firefox/firefox", "/usr/lib/firefox/firefox"),
+    ("Web Content", "/usr/lib/firefox/firefox", "/usr/lib/firefox/firefox"),
+    ("telegram-deskto", "/opt/telegram/Telegram", "telegram-desktop"),
+]
+SEARCH_CASES = [
+    {"firefox", "firefox-bin"},
+    {"telegram-desktop"},
+    {"google-chrome", "chrome"},
+    {"nonexistent-app"},
+]
+
+
+def build_fake_proc(root: str, processes: int):
+    """Создает root/<pid>/{comm, stat, exe -> ..., cmdline} для заданного числа процессов."""
+    with open(os.path.join(root, "stat"), "w", encoding="utf-8") as f:
+        f.write("cpu  1 2 3 4\nbtime 1700000000\n") # psutil берет отсюда время загрузки
+    background_count = max(processes - len(APP_PROCESSES), 0)
+    synthetic = [BACKGROUND_PROCESSES[i % len(BACKGROUND_PROCESSES)] for i in range(background_count)] + APP_PROCESSES
+    for index, (comm, exe, argv0) in enumerate(synthetic):
+        proc_dir = os.path.join(root, str(1000 + index))
+        os.makedirs(proc_dir)
+        with open(os.path.join(proc_dir, "comm"), "w", encoding="utf-8") as f:
+            f.write(comm + "\n")
+        with open(os.path.join(proc_dir, "stat"), "w", encoding="utf-8") as f:
+            pid = 1000 + index
+            f.write(f"{pid} ({comm}) S 1 {pid} {pid} 0 -1 4194560" + " 0" * 12 + " 1 0 100" + " 0" * 20 + "\n")
+        if exe:
+            os.symlink(exe, os.path.join(proc_dir, "exe"))
+        with open(os.path.join(proc_dir, "cmdline"), "wb") as f:
+            if argv0:
+                f.write(argv0.encode() + b"\0--some-flag\0" + b"x" * 200 + b"\0")
+
+
+def time_it(func, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for names in SEARCH_CASES:
+            func(names)
+        samples.append((time.perf_counter() - started) * 1000 / len(SEARCH_CASES))
+    return {"mean_ms": round(statistics.mean(samples), 3), "median_ms": round(statistics.median(samples), 3)}
+
+
+def count_reads(proc_root: str) -> dict:
+    """Сколько раз поэтапный поиск дошел до readlink(exe) и чтения cmdline."""
+    counters = {"exe": 0, "cmdline": 0}
+    original_exe, original_argv0 = proc_scanner._read_exe_basename, proc_scanner._read_argv0_basename
+
+    def counting_exe(proc_dir):
+        counters["exe"] += 1
+        return original_exe(proc_dir)
+
+    def counting_argv0(proc_dir):
+        counters["cmdline"] += 1
+        return original_argv0(proc_dir)
+
+    proc_scanner._read_exe_basename, proc_scanner._read_argv0_basename = counting_exe, counting_argv0
+    try:
+        for names in SEARCH_CASES:
+            proc_scanner.scan_matching_pids(names, proc_root=proc_root)
+    finally:
+        proc_scanner._read_exe_basename, proc_scanner._read_argv0_basename = original_exe, original_argv0
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Staged /proc matcher benchmark")
+    parser.add_argument("--processes", type=int, default=500, help="Размер синтетического списка процессов")
+    parser.add_argument("--runs", type=int, default=20, help="Сколько раз прогонять набор поисков")
+    parser.add_argument("--live", action="store_true", help="Дополнительно сравнить с psutil на настоящем /proc")
+    args = parser.parse_args()
+
+    fake_root = tempfile.mkdtemp(prefix="familiar_fake_proc_")
+    try:
+        build_fake_proc(fake_root, args.processes)
+        print(f"Синтетический /proc: {args.processes} процессов, {len(SEARCH_CASES)} поисков за прогон")
+        current_pid = os.getpid()
+        psutil.PROCFS_PATH = fake_root
+        try:
+            print("psutil:", time_it(lambda names: manage_app_action._scan_all_processes_for_pid(
+                "bench", names, current_pid), args.runs))
+        finally:
+            psutil.PROCFS_PATH = "/proc"
+        print("staged:", time_it(lambda names: proc_scanner.scan_matching_pids(names, proc_root=fake_root), args.runs))
+        reads = count_reads(fake_root)
+        total = args.processes * len(SEARCH_CASES)
+        print(f"staged: readlink(exe) {reads['exe']}/{total}, cmdline {reads['cmdline']}/{total} (psutil: {total}/{total})")
+    finally:
+        shutil.rmtree(fake_root, ignore_errors=True)
+
+    if args.live and proc_scanner.is_available():
+        current_pid = os.getpid()
+        print("Настоящий /proc:")
+        print("psutil:", time_it(lambda names: manage_app_action._scan_all_processes_for_pid(
+            "bench", names, current_pid), args.runs))
+        print("staged:", time_it(lambda names: proc_scanner.scan_matching_pids(
+            names, exclude_pids=(current_pid,)), args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# File: benchmarks/bench_startup.py
+# -*- coding: utf-8 -*-
+
+# Время запуска консольного Фамильяра: от старта интерпретатора до приглашения ">>> Вы: "
+# (time-to-first-prompt) и разбор импортов по `python -X importtime`.
+# Каждый прогон - отдельный процесс, поэтому учитывается и импорт всех модулей.
+# Запуск из корня проекта:
+#     python benchmarks/bench_startup.py [--runs 10] [--top 15] [--warm-up] [--script familiar_client.py]
+# Без запущенного демона (familiar_daemon.py) клиент работает в своем процессе, поэтому
+# замер familiar_client.py показывает его собственные импорты, а ответы - отдельная тема.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = ">>> Вы: ".encode("utf-8")
+
+
+def measure_first_prompt(env: dict, script: str = "familiar.py") -> float:
+    """Запускает script и возвращает время (мс) до появления приглашения ввода."""
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, script], cwd=PROJECT_ROOT, env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = b""
+    try:
+        while PROMPT not in output:
+            chunk = proc.stdout.read1(4096)
+            if not chunk:
+                raise RuntimeError(f"{script} завершился до приглашения: {output.decode('utf-8', 'replace')[-500:]}")
+            output += chunk
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        proc.communicate("выход\n".encode("utf-8"), timeout=10)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    return elapsed_ms
+
+
+def import_profile(env: dict, module: str) -> list[tuple[str, int, int]]:
+    """[(модуль, self_us, cumulative_us)] по выводу `python -X importtime -c 'import module'`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup benchmark for familiar.py")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15, help="Сколько самых дорогих импортов показать")
+    parser.add_argument("--script", default="familiar.py", help="Скрипт с интерактивным режимом")
+    parser.add_argument("--module", default="familiar", help="Модуль для разбора -X importtime")
+    parser.add_argument("--warm-up", action="store_true",
+                        help="Не отключать фоновый прогрев KV-кэша NLU (FAMILIAR_NLU_PROMPT_CACHE)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if not args.warm_up:
+        env["FAMILIAR_NLU_PROMPT_CACHE"] = "0" # Прогрев идет в фоне и только добавляет шум
+
+    measure_first_prompt(env, args.script) # Прогрев файлового кэша ОС и __pycache__
+    timings = [measure_first_prompt(env, args.script) for _ in range(args.runs)]
+    print(f"Time to first prompt ({args.runs} runs): median {statistics.median(timings):.1f} ms, "
+          f"min {min(timings):.1f} ms, max {max(timings):.1f} ms")
+
+    rows = import_profile(env, args.module)
+    total = next((cumulative for name, _self, cumulative in rows if name == args.module), None)
+    if total is not None:
+        print(f"import {args.module}: {total / 1000:.1f} ms (cumulative, -X importtime)")
+    print(f"\nTop {args.top} imports by cumulative time:")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {name}")
+    print("\nHeavy modules at startup:")
+    loaded = {name for name, _self, _cumulative in rows}
+    for heavy in ("requests", "httpx", "asyncio", "psutil", "Xlib", "intent_handlers.handle_manage_app"):
+        print(f"  {heavy:<36} {'imported' if heavy in loaded else 'not imported'}")
+
+
+if __name__ == "__main__":
+    main()
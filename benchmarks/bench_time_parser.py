@@ -0,0 +1,66 @@
+# File: benchmarks/bench_time_parser.py
+# -*- coding: utf-8 -*-
+
+# Скорость локального разбора time_spec (time_parser) в микросекундах на выражение.
+# Корпус: примеры time_spec из NLU_INSTRUCTION_TEMPLATE и README плюс типичные фразы.
+# Запуск из корня проекта:
+#     python benchmarks/bench_time_parser.py [--rounds 2000]
+
+import argparse
+import datetime
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nlu_processor
+import time_parser
+
+README_EXAMPLES = ["через час", "завтра в 10", "7 утра", "06:30"]
+EXTRA_EXAMPLES = [
+    "через 10 минут", "через полчаса", "через полтора часа", "через 2 часа 15 минут", "через пять минут",
+    "через двадцать пять минут", "в 18:30", "в 7", "в 3", "сегодня в 9 вечера", "завтра утром",
+    "послезавтра в 8:15", "в пятницу", "в следующую среду в 10", "в десять тридцать", "в час дня",
+    "в полдень", "в 12", "12:00", "в 12:30", "завтра в 12", "в 12 ночи", "в полночь", "ночью", "в 2 ночи", "через неделю", "через 3 дня в 9 утра", "к 19 часам",
+]
+_TIME_SPEC_RE = re.compile(r'"time_spec": "([^"]+)"')
+
+
+def build_corpus() -> list[str]:
+    """time_spec из примеров NLU-инструкции + README + дополнительные фразы (без повторов)."""
+    corpus = _TIME_SPEC_RE.findall(nlu_processor.NLU_INSTRUCTION_TEMPLATE) + README_EXAMPLES + EXTRA_EXAMPLES
+    return list(dict.fromkeys(corpus))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="time_spec parser benchmark")
+    parser.add_argument("--rounds", type=int, default=2000, help="Сколько раз разбирать каждое выражение")
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    now = datetime.datetime.now()
+    print(f"Корпус: {len(corpus)} выражений, now = {now:%Y-%m-%d %H:%M}")
+    for time_spec in corpus:
+        parsed = time_parser.parse_time_spec(time_spec, now)
+        if parsed is None:
+            print(f"  {time_spec!r:32} -> НЕ РАСПОЗНАНО")
+            continue
+        alternatives = ", ".join(f"{moment:%d.%m %H:%M}" for moment in parsed["alternatives"])
+        note = f"  (неоднозначно, еще: {alternatives})" if parsed["ambiguous"] else ""
+        print(f"  {time_spec!r:32} -> {parsed['datetime']:%d.%m %H:%M}{note}")
+
+    per_parse_us = []
+    for time_spec in corpus:
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            time_parser.parse_time_spec(time_spec, now)
+        per_parse_us.append((time.perf_counter() - started) / args.rounds * 1e6)
+    print(f"\nРазбор: медиана {statistics.median(per_parse_us):.1f} мкс, "
+          f"среднее {statistics.mean(per_parse_us):.1f} мкс, максимум {max(per_parse_us):.1f} мкс на выражение")
+
+
+if __name__ == "__main__":
+    main()
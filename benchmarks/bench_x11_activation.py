@@ -0,0 +1,123 @@
+# File: benchmarks/bench_x11_activation.py
+# -*- coding: utf-8 -*-
+
+# Задержка активации окна: нативный путь (actions/x11_windows.py) против wmctrl/xdotool.
+# Нужен X-сервер; удобнее всего Xvfb, в котором скрипт сам играет роль оконного менеджера
+# (ведет _NET_CLIENT_LIST и принимает запросы _NET_ACTIVE_WINDOW). Требует python-xlib,
+# для сравнения - wmctrl и xdotool. Запуск из корня проекта:
+#     xvfb-run -a python benchmarks/bench_x11_activation.py [--windows 30] [--runs 20]
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Xlib import X, Xatom, display as xdisplay
+
+from actions import manage_app_action
+from actions import x11_windows
+
+
+class FakeWindowManager:
+    """Создает тестовые окна, публикует их в _NET_CLIENT_LIST и считает запросы активации."""
+
+    def __init__(self):
+        self.display = xdisplay.Display()
+        self.root = self.display.screen().root
+        self.client_list_atom = self.display.intern_atom("_NET_CLIENT_LIST")
+        self.active_window_atom = self.display.intern_atom("_NET_ACTIVE_WINDOW")
+        self.pid_atom = self.display.intern_atom("_NET_WM_PID")
+        self.windows = []
+        self.activations = 0
+        # Как настоящий WM: перехватываем клиентские сообщения корневому окну
+        self.root.change_attributes(event_mask=X.SubstructureRedirectMask | X.SubstructureNotifyMask)
+        # xdotool windowactivate проверяет, что WM заявил поддержку _NET_ACTIVE_WINDOW
+        self.root.change_property(self.display.intern_atom("_NET_SUPPORTED"), Xatom.ATOM, 32,
+                                  [self.client_list_atom, self.active_window_atom])
+
+    def create_window(self, wm_class: str, pid: int) -> int:
+        window = self.root.create_window(0, 0, 100, 100, 0, self.display.screen().root_depth)
+        window.set_wm_class(wm_class, wm_class.capitalize())
+        window.set_wm_name(f"{wm_class} window")
+        window.change_property(self.pid_atom, Xatom.CARDINAL, 32, [pid])
+        self.windows.append(window.id)
+        self.root.change_property(self.client_list_atom, Xatom.WINDOW, 32, self.windows)
+        self.display.sync()
+        return window.id
+
+    def drain(self):
+        """Обрабатывает запросы _NET_ACTIVE_WINDOW и MapRequest, как сделал бы WM."""
+        self.display.sync()
+        while self.display.pending_events():
+            event = self.display.next_event()
+            if event.type == X.ClientMessage and event.client_type == self.active_window_atom:
+                self.activations += 1
+                self.root.change_property(self.active_window_atom, Xatom.WINDOW, 32, [event.window.id])
+            elif event.type == X.MapRequest:
+                event.window.map()
+        self.display.sync()
+
+
+def time_activation(activate, runs: int, wm: FakeWindowManager) -> dict:
+    samples = []
+    activations_before = wm.activations
+    for _ in range(runs):
+        started = time.perf_counter()
+        ok, code = activate()
+        samples.append((time.perf_counter() - started) * 1000)
+        wm.drain()
+    return {
+        "code": code,
+        "mean_ms": round(statistics.mean(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "wm_saw_activations": wm.activations - activations_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="X11 window activation latency benchmark")
+    parser.add_argument("--windows", type=int, default=30, help="Сколько посторонних окон создать")
+    parser.add_argument("--runs", type=int, default=20, help="Сколько активаций замерять в каждом режиме")
+    args = parser.parse_args()
+    if not os.environ.get("DISPLAY"):
+        sys.exit("Нет DISPLAY. Запустите через xvfb-run -a.")
+
+    wm = FakeWindowManager()
+    for index in range(args.windows):
+        wm.create_window(f"background{index}", 10000 + index)
+    target_pid = 424242
+    target_window = wm.create_window("benchapp", target_pid)
+
+    x11_index = x11_windows.get_x11_window_index()
+    if x11_index is None:
+        sys.exit("Нативный бэкенд недоступен (нет python-xlib или FAMILIAR_X11_NATIVE=0).")
+    print(f"Окон в таблице: {x11_index.get_stats()['windows']}, цель: {target_window:#x}")
+
+    # Таблица обновляется по PropertyNotify: новое окно видно без полного перечитывания
+    started = time.perf_counter()
+    late_window = wm.create_window("lateapp", 777)
+    found = x11_index.find_window("lateapp")
+    print(f"Новое окно найдено по событию: {found == late_window} за {(time.perf_counter() - started) * 1000:.3f} мс")
+
+    print("native  :", time_activation(
+        lambda: manage_app_action.activate_window_by_class_or_pid("benchapp", target_pid), args.runs, wm))
+
+    # Прежний путь: отключаем нативный бэкенд, остаются wmctrl/xdotool
+    native_getter = x11_windows.get_x11_window_index
+    x11_windows.get_x11_window_index = lambda: None
+    try:
+        print("wmctrl  :", time_activation(
+            lambda: manage_app_action.activate_window_by_class_or_pid("benchapp", target_pid), args.runs, wm))
+        # Класс, которого нет: wmctrl промахивается, активирует xdotool по PID
+        print("xdotool :", time_activation(
+            lambda: manage_app_action.activate_window_by_class_or_pid("no-such-class", target_pid), args.runs, wm))
+    finally:
+        x11_windows.get_x11_window_index = native_getter
+    print("Статистика X11:", x11_index.get_stats())
+
+
+if __name__ == "__main__":
+    main()
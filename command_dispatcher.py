@@ -1,46 +1,312 @@
 # File: command_dispatcher.py (Working + Debug + add_alias)
 # -*- coding: utf-8 -*-
 
+import importlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import utils
-# Import handlers from the intent_handlers directory
-from intent_handlers import handle_manage_app
-from intent_handlers import handle_add_alias
-from intent_handlers import handle_manage_system
-# TODO: Import handlers for other intents when ready
 
-# Global variable for aliases (loaded on initialization)
+# Global variable for aliases (loaded lazily by get_aliases() on first use)
 APP_ALIASES = {}
+_aliases_loaded = False
+_registry_lock = threading.RLock()
 
-# Routing dictionary: maps intent strings to handler functions
+# Routing dictionary: maps intent strings to handler modules.
+# Modules are imported on first use (see get_handler): a one-shot CLI command
+# should not pay for psutil, Xlib and every other handler's dependencies.
+# Each module exposes handle(parameters, aliases) and PARAMETERS_SCHEMA.
 INTENT_HANDLERS = {
-    "manage_app": handle_manage_app.handle,
-    "add_alias": handle_add_alias.handle,
-    "manage_system": handle_manage_system.handle,
-    # TODO: Add other intents and their handlers
-    # "manage_system": handle_manage_system.handle,
-    # ... etc.
+    "manage_app": "intent_handlers.handle_manage_app",
+    "add_alias": "intent_handlers.handle_add_alias",
+    "manage_system": "intent_handlers.handle_manage_system",
+    "manage_job": "intent_handlers.handle_manage_job",
+    "set_reminder": "intent_handlers.handle_set_reminder",
+    "set_alarm": "intent_handlers.handle_set_alarm",
+    "manage_sound": "intent_handlers.handle_control_volume",
+    # TODO: Add other intents and their handler modules
 }
 
+_loaded_handler_modules = {} # intent -> imported module
+
+# --- Составные команды ("открой хром и телеграм, и сделай потише") ---
+# NLU возвращает {"intents": [{"intent": ..., "parameters": ...}, ...]}.
+MAX_INTENTS_PER_COMMAND = int(os.environ.get('FAMILIAR_MAX_INTENTS', 4))
+# Потоки для параллельного выполнения независимых действий одной составной команды
+PLAN_WORKERS = int(os.environ.get('FAMILIAR_PLAN_WORKERS', 4))
+# Интенты, меняющие общее состояние (алиасы, питание системы): выполняются отдельным этапом -
+# после всех предыдущих действий и до всех следующих
+BARRIER_INTENTS = {"add_alias", "manage_system"}
+MULTI_COMMAND_CODE = "MULTI_COMMAND_RESULT"
+
+_plan_executor = None
+
+# Интенты, которые NLU уже распознает, но для которых еще нет обработчиков.
+# Их схемы параметров живут здесь, пока не появится модуль в intent_handlers/
+# (тогда схема переезжает в PARAMETERS_SCHEMA этого модуля).
+PENDING_INTENT_SCHEMAS = {
+    "ask_time": {"type": "object", "properties": {}, "additionalProperties": False},
+    "web_search": {
+        "type": "object",
+        "properties": {"query": {"type": "string", "minLength": 1, "maxLength": 80}},
+        "required": ["query"],
+        "additionalProperties": False,
+    },
+    "unknown": {"type": "object", "properties": {}, "additionalProperties": False},
+}
+
+def get_handler_module(intent: str):
+    """Imports (once) and returns the handler module for an intent, or None if there is none."""
+    module = _loaded_handler_modules.get(intent)
+    if module is not None:
+        return module
+    module_path = INTENT_HANDLERS.get(intent)
+    if module_path is None:
+        return None
+    with _registry_lock:
+        module = _loaded_handler_modules.get(intent)
+        if module is None:
+            module = importlib.import_module(module_path)
+            _loaded_handler_modules[intent] = module
+    return module
+
+def get_handler(intent: str):
+    """Returns the handle() function for an intent (importing its module on first use), or None."""
+    module = get_handler_module(intent)
+    return module.handle if module is not None else None
+
+def get_aliases() -> dict:
+    """Returns APP_ALIASES, loading them from disk on first call."""
+    if not _aliases_loaded:
+        with _registry_lock:
+            if not _aliases_loaded:
+                initialize_dispatcher()
+    return APP_ALIASES
+
+def get_intent_parameter_schemas() -> dict:
+    """
+    Собирает схемы параметров всех интентов: из PARAMETERS_SCHEMA модулей-обработчиков
+    в INTENT_HANDLERS и из PENDING_INTENT_SCHEMAS для еще не реализованных интентов.
+    Импортирует модули обработчиков, поэтому вызывается только перед первым запросом к LLM.
+    """
+    schemas = {}
+    for intent in INTENT_HANDLERS:
+        handler_module = get_handler_module(intent)
+        schema = getattr(handler_module, "PARAMETERS_SCHEMA", None)
+        if schema is None:
+            print(f"[DISPATCHER][WARN] Handler for '{intent}' does not declare PARAMETERS_SCHEMA.")
+            schema = {"type": "object"}
+        schemas[intent] = schema
+    for intent, schema in PENDING_INTENT_SCHEMAS.items():
+        schemas.setdefault(intent, schema)
+    return schemas
+
+def build_nlu_output_schema() -> dict:
+    """
+    Строит JSON Schema ответа NLU ({"intent": ..., "parameters": {...}}) для поля
+    "format" Ollama: по одному варианту на интент с его разрешенными параметрами.
+    """
+    variants = []
+    for intent, parameters_schema in get_intent_parameter_schemas().items():
+        variants.append({
+            "type": "object",
+            "properties": {
+                "intent": {"type": "string", "enum": [intent]},
+                "parameters": parameters_schema,
+            },
+            "required": ["intent", "parameters"],
+            "additionalProperties": False,
+        })
+    # Составная команда: {"intents": [вариант, вариант, ...]}
+    compound_variant = {
+        "type": "object",
+        "properties": {
+            "intents": {"type": "array", "items": {"anyOf": variants},
+                        "minItems": 2, "maxItems": MAX_INTENTS_PER_COMMAND},
+        },
+        "required": ["intents"],
+        "additionalProperties": False,
+    }
+    return {"anyOf": variants + [compound_variant]}
+
 def initialize_dispatcher():
-    """Loads aliases at startup."""
-    global APP_ALIASES
+    """Loads (or reloads) aliases. Called lazily by get_aliases(); can still be called explicitly."""
+    global APP_ALIASES, _aliases_loaded
     APP_ALIASES = utils.load_aliases()
+    _aliases_loaded = True
     if APP_ALIASES:
         print(f"[DISPATCHER][INFO] Aliases loaded successfully ({len(APP_ALIASES)} found).")
     else:
         print("[DISPATCHER][WARN] Aliases not loaded or file is empty.")
 
-def dispatch_command(parsed_nlu, debug_mode=False):
+def _run_intent(intent, parameters, origin=None):
+    """Вызывает обработчик интента. Возвращает его структурированный результат или строку с ошибкой."""
+    print(f"[DISPATCHER][INFO] Routing intent: '{intent}'")
+    if origin is not None:
+        # Откуда пришла команда (фронтенд, чат) - для отложенных ответов, например напоминаний.
+        # Копия: parameters может быть общим с кэшем NLU
+        parameters = dict(parameters, _origin=origin)
+    try:
+        handler_function = get_handler(intent)
+    except ImportError as e:
+        print(f"[DISPATCHER][ERROR] Failed to import handler for intent '{intent}': {e}")
+        return f"Произошла ошибка при выполнении команды '{intent}'."
+
+    if handler_function:
+        try:
+            # Call the found handler, passing parameters and the current aliases
+            # The handler itself will parse the specific parameters it needs (like 'action')
+            # We pass the whole aliases dict so handlers can potentially modify it (like add_alias)
+            # Note: handle_add_alias now journals the new alias itself (utils.save_alias_entry).
+            return handler_function(parameters, get_aliases())
+
+        except Exception as e:
+            print(f"[DISPATCHER][ERROR] Error executing handler for intent '{intent}': {e}")
+            import traceback
+            traceback.print_exc() # Print full traceback for debugging
+            return f"Произошла ошибка при выполнении команды '{intent}'." # An error occurred while executing the command
+    else:
+        # Handler not found
+        print(f"[DISPATCHER][WARN] Handler for intent '{intent}' not found.")
+        # TODO: Optionally handle 'unknown' intent here
+        return "Извините, я пока не умею обрабатывать такую команду." # Sorry, I don't know how to handle this command yet.
+
+# --- План выполнения составной команды ---
+def _intent_resource(intent_data: dict):
+    """Ресурс, который затрагивает действие (None - барьер: действие выполняется отдельным этапом)."""
+    intent = intent_data.get("intent")
+    parameters = intent_data.get("parameters") or {}
+    if intent in BARRIER_INTENTS:
+        return None
+    if intent == "manage_app":
+        app_name = str(parameters.get("app_name") or "").lower()
+        return ("manage_app", get_aliases().get(app_name, app_name))
+    return (intent,) # Прочие действия одного типа (например, громкость) - строго по порядку
+
+def build_execution_plan(intents: list[dict]) -> list[list[int]]:
+    """
+    Разбивает интенты составной команды на этапы (списки индексов). Действия одного этапа
+    независимы и выполняются параллельно, этапы - строго по порядку. Новый этап начинается,
+    если действие затрагивает тот же ресурс, что и уже стоящее в этапе (открыть и закрыть
+    одно приложение), или если это барьер (BARRIER_INTENTS).
+    """
+    plan, stage, stage_resources = [], [], set()
+    for index, intent_data in enumerate(intents):
+        resource = _intent_resource(intent_data)
+        if resource is None or resource in stage_resources:
+            if stage:
+                plan.append(stage)
+            stage, stage_resources = [], set()
+        if resource is None:
+            plan.append([index])
+            continue
+        stage.append(index)
+        stage_resources.add(resource)
+    if stage:
+        plan.append(stage)
+    return plan
+
+def _get_plan_executor() -> ThreadPoolExecutor:
+    global _plan_executor
+    if _plan_executor is None:
+        with _registry_lock:
+            if _plan_executor is None:
+                _plan_executor = ThreadPoolExecutor(max_workers=PLAN_WORKERS, thread_name_prefix="familiar-plan")
+    return _plan_executor
+
+def _as_structured_result(intent, result) -> dict:
+    """Строковый ответ (обработчика нет или он упал) превращает в структурированную ошибку."""
+    if isinstance(result, dict):
+        return result
+    supported = intent in INTENT_HANDLERS
+    return {
+        "status": "error",
+        "intent": intent,
+        "action_performed": None,
+        "message_code": "ERROR_INTENT_FAILED" if supported else "ERROR_INTENT_NOT_SUPPORTED",
+        "user_message_hint": str(result),
+        "data": {"intent_name": intent},
+        "error_details": {},
+    }
+
+def merge_structured_results(results: list[dict]) -> dict:
+    """Объединяет результаты составной команды в один (MULTI_COMMAND_RESULT) для одного ответа."""
+    succeeded = sum(1 for result in results if result.get("status") == "success")
+    return {
+        "status": "success" if succeeded == len(results) else "error",
+        "intent": "multi",
+        "action_performed": "multi",
+        "message_code": MULTI_COMMAND_CODE,
+        "user_message_hint": f"Выполнено команд: {succeeded} из {len(results)}",
+        "data": {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded},
+        "error_details": {},
+    }
+
+def _dispatch_multi(intents: list[dict], origin=None) -> dict:
+    """Выполняет составную команду по плану и объединяет результаты (в исходном порядке)."""
+    plan = build_execution_plan(intents)
+    print(f"[DISPATCHER][INFO] Multi-intent command: {[item.get('intent') for item in intents]}, plan: {plan}")
+    results = [None] * len(intents)
+    for stage in plan:
+        if len(stage) == 1:
+            index = stage[0]
+            results[index] = _run_intent(intents[index].get("intent"), intents[index].get("parameters", {}), origin)
+            continue
+        executor = _get_plan_executor()
+        futures = [(index, executor.submit(_run_intent, intents[index].get("intent"),
+                                           intents[index].get("parameters", {}), origin))
+                   for index in stage]
+        for index, future in futures:
+            results[index] = future.result() # _run_intent сам перехватывает ошибки обработчиков
+    return merge_structured_results([_as_structured_result(intents[index].get("intent"), result)
+                                     for index, result in enumerate(results)])
+
+def _debug_describe(intent, parameters):
+    print(f"[DISPATCHER_DEBUG] Recognized Intent: {intent}")
+    print(f"[DISPATCHER_DEBUG] Recognized Parameters: {parameters}")
+    # Show normalization for relevant intents for reference
+    if intent == "manage_app" and "app_name" in parameters:
+         app_name_raw = parameters.get("app_name")
+         canonical_name = get_aliases().get(app_name_raw.lower(), app_name_raw.lower())
+         print(f"[DISPATCHER_DEBUG] Normalized app_name (for reference): '{canonical_name}'")
+    elif intent == "add_alias":
+         alias_name = parameters.get("alias_name")
+         app_name = parameters.get("app_name")
+         if alias_name:
+             print(f"[DISPATCHER_DEBUG] Alias name (for reference): '{alias_name.lower()}'")
+         if app_name:
+             print(f"[DISPATCHER_DEBUG] Target app name (for reference): '{app_name.lower()}'")
+
+def dispatch_command(parsed_nlu, debug_mode=False, origin=None):
     """
     Routes the command to the appropriate handler OR prints NLU results in debug mode.
 
     Args:
-        parsed_nlu (dict): The parsed NLU output (intent and parameters).
+        parsed_nlu (dict): The parsed NLU output: {"intent", "parameters"} or,
+                           for compound commands, {"intents": [{"intent", "parameters"}, ...]}.
         debug_mode (bool): Flag to enable debug output instead of execution.
+        origin (dict | None): Where the command came from, e.g. {"frontend": "telegram", "chat_id": 42};
+                              handlers get it as parameters["_origin"].
 
     Returns:
-        str: The result message from the handler or a debug/error message.
+        dict | str: The structured result from the handler (MULTI_COMMAND_RESULT for
+                    compound commands) or a debug/error message.
     """
+    intents = parsed_nlu.get("intents") if isinstance(parsed_nlu, dict) else None
+    if isinstance(intents, list):
+        intents = [item for item in intents if isinstance(item, dict) and item.get("intent")][:MAX_INTENTS_PER_COMMAND]
+        if len(intents) == 1:
+            parsed_nlu = intents[0] # Один интент - обычная команда
+        elif intents:
+            if debug_mode:
+                print("="*20 + " DEBUG MODE " + "="*20)
+                print(f"[DISPATCHER_DEBUG] Compound command, execution plan: {build_execution_plan(intents)}")
+                for item in intents:
+                    _debug_describe(item.get("intent"), item.get("parameters", {}))
+                print("="*52)
+                return f"ДЕБАГ: Распознано: интенты={intents}"
+            return _dispatch_multi(intents, origin)
+
     if not parsed_nlu or "intent" not in parsed_nlu:
         log_prefix = "[DISPATCHER_DEBUG]" if debug_mode else "[DISPATCHER][ERROR]"
         print(f"{log_prefix} Received invalid NLU data.")
@@ -54,47 +320,10 @@ def dispatch_command(parsed_nlu, debug_mode=False):
     # --- DEBUG MODE ---
     if debug_mode:
         print("="*20 + " DEBUG MODE " + "="*20)
-        print(f"[DISPATCHER_DEBUG] Recognized Intent: {intent}")
-        print(f"[DISPATCHER_DEBUG] Recognized Parameters: {parameters}")
-        # Show normalization for relevant intents for reference
-        if intent == "manage_app" and "app_name" in parameters:
-             app_name_raw = parameters.get("app_name")
-             canonical_name = APP_ALIASES.get(app_name_raw.lower(), app_name_raw.lower())
-             print(f"[DISPATCHER_DEBUG] Normalized app_name (for reference): '{canonical_name}'")
-        elif intent == "add_alias":
-             alias_name = parameters.get("alias_name")
-             app_name = parameters.get("app_name")
-             if alias_name:
-                 print(f"[DISPATCHER_DEBUG] Alias name (for reference): '{alias_name.lower()}'")
-             if app_name:
-                 print(f"[DISPATCHER_DEBUG] Target app name (for reference): '{app_name.lower()}'")
+        _debug_describe(intent, parameters)
         print("="*52)
         return f"ДЕБАГ: Распознано: интент='{intent}', параметры={parameters}" # DEBUG: Recognized: ...
     # --- END DEBUG MODE ---
 
     # --- NORMAL EXECUTION MODE ---
-    else:
-        print(f"[DISPATCHER][INFO] Routing intent: '{intent}'")
-        handler_function = INTENT_HANDLERS.get(intent)
-
-        if handler_function:
-            try:
-                # Call the found handler, passing parameters and the current aliases
-                # The handler itself will parse the specific parameters it needs (like 'action')
-                # We pass the whole aliases dict so handlers can potentially modify it (like add_alias)
-                # Note: handle_add_alias now calls save_aliases itself.
-                return handler_function(parameters, APP_ALIASES)
-
-            except Exception as e:
-                print(f"[DISPATCHER][ERROR] Error executing handler for intent '{intent}': {e}")
-                import traceback
-                traceback.print_exc() # Print full traceback for debugging
-                return f"Произошла ошибка при выполнении команды '{intent}'." # An error occurred while executing the command
-        else:
-            # Handler not found
-            print(f"[DISPATCHER][WARN] Handler for intent '{intent}' not found.")
-            # TODO: Optionally handle 'unknown' intent here
-            return "Извините, я пока не умею обрабатывать такую команду." # Sorry, I don't know how to handle this command yet.
-
-# --- Initialize dispatcher when the module is imported ---
-initialize_dispatcher()
+    return _run_intent(intent, parameters, origin)
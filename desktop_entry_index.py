@@ -0,0 +1,276 @@
+# File: desktop_entry_index.py
+# -*- coding: utf-8 -*-
+
+# Индекс установленных приложений по .desktop-файлам (freedesktop Desktop Entry).
+# Позволяет открывать приложения по человеческому имени ("Калькулятор", "Документы"):
+# Name, Name[ru], GenericName и Keywords -> Exec и StartupWMClass.
+# Индекс сохраняется в config/desktop_entries.json и перечитывается только для каталогов,
+# у которых изменился mtime (проверка не чаще раза в DESKTOP_INDEX_CHECK_INTERVAL секунд).
+
+import json
+import os
+import shlex
+import threading
+import time
+
+import utils
+
+DESKTOP_INDEX_FILE = os.path.join(utils.CONFIG_DIR, 'desktop_entries.json')
+DESKTOP_INDEX_CHECK_INTERVAL = float(os.environ.get('FAMILIAR_DESKTOP_INDEX_CHECK_INTERVAL', 5.0))
+_CACHE_VERSION = 1
+
+# Каталоги по возрастанию приоритета: пользовательские .desktop перекрывают системные с тем же ID
+DESKTOP_DIRS = [
+    "/usr/share/applications",
+    "/usr/local/share/applications",
+    "/var/lib/flatpak/exports/share/applications",
+    os.path.expanduser("~/.local/share/flatpak/exports/share/applications"),
+    os.path.expanduser("~/.local/share/applications"),
+]
+
+# Приоритет полей при совпадении имен (меньше - важнее)
+_FIELD_PRIORITY = {"Name": 0, "GenericName": 1, "Keywords": 2}
+# Программы-обертки: по ним не найти процесс приложения
+_LAUNCHER_WRAPPERS = {"flatpak", "env", "sh", "bash", "snap", "gtk-launch"}
+
+
+def normalize_entry_name(name: str) -> str:
+    return " ".join((name or "").lower().replace("ё", "е").split())
+
+
+def _parse_exec(exec_value: str) -> list[str]:
+    """Разбирает Exec и убирает коды полей (%f, %U, %i, ...), которые нам нечем заполнить."""
+    try:
+        argv = shlex.split(exec_value)
+    except ValueError:
+        argv = exec_value.split()
+    result = []
+    for arg in argv:
+        if len(arg) == 2 and arg[0] == "%":
+            if arg == "%%":
+                result.append("%")
+            continue
+        result.append(arg.replace("%%", "%"))
+    return result
+
+
+def parse_desktop_file(path: str) -> dict | None:
+    """
+    Читает секцию [Desktop Entry]. Возвращает None для скрытых записей,
+    не-приложений и записей без Exec.
+    """
+    fields = {}
+    in_entry = False
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("["):
+                    in_entry = line == "[Desktop Entry]"
+                    continue
+                if in_entry and "=" in line:
+                    key, value = line.split("=", 1)
+                    fields[key.strip()] = value.strip()
+    except OSError:
+        return None
+
+    if fields.get("Type", "Application") != "Application":
+        return None
+    if fields.get("NoDisplay", "").lower() == "true" or fields.get("Hidden", "").lower() == "true":
+        return None
+    exec_argv = _parse_exec(fields.get("Exec", ""))
+    if not exec_argv:
+        return None
+
+    names = []  # (поле, значение)
+    for key, value in fields.items():
+        base_key = key.split("[", 1)[0]
+        locale = key[len(base_key) + 1:-1] if "[" in key else ""
+        if base_key not in _FIELD_PRIORITY or (locale and not locale.startswith("ru")):
+            continue
+        values = value.split(";") if base_key == "Keywords" else [value]
+        names.extend((base_key, item) for item in values if item.strip())
+
+    display_name = next((fields[k] for k in ("Name[ru_RU]", "Name[ru]", "Name") if fields.get(k)), "")
+    return {
+        "name": display_name,
+        "exec": exec_argv,
+        "wm_class": fields.get("StartupWMClass") or None,
+        "names": names,
+        "path": path,
+    }
+
+
+def _desktop_id(root: str, path: str) -> str:
+    """ID по спецификации: путь относительно каталога applications, '/' заменяется на '-'."""
+    return os.path.relpath(path, root).replace(os.sep, "-")
+
+
+class DesktopEntryIndex:
+    """Имя (нормализованное) -> запись приложения из .desktop."""
+
+    def __init__(self, dirs=None, cache_file: str | None = DESKTOP_INDEX_FILE,
+                 check_interval: float = DESKTOP_INDEX_CHECK_INTERVAL):
+        self.dirs = list(dirs if dirs is not None else DESKTOP_DIRS)
+        self.cache_file = cache_file
+        self.check_interval = check_interval
+        self._dir_state = {}   # корень -> {"mtimes": {каталог: mtime_ns}, "entries": {desktop_id: запись}}
+        self._by_name = {}     # нормализованное имя -> desktop_id
+        self._entries = {}     # desktop_id -> запись (после перекрытия по приоритету каталогов)
+        self._by_command = {}  # имя исполняемого файла из Exec -> desktop_id
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"dir_rescans": 0, "rebuilds": 0, "lookups": 0, "loaded_from_cache": False}
+        self._load_cache()
+
+    # --- Постоянный кэш ---
+    def _load_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get("version") != _CACHE_VERSION:
+                return
+            self._dir_state = {root: state for root, state in cached.get("dirs", {}).items() if root in self.dirs}
+            self.stats["loaded_from_cache"] = True
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"[DESKTOP_INDEX][WARN] Не удалось прочитать кэш {self.cache_file}: {e}")
+            self._dir_state = {}
+
+    def _save_cache_locked(self):
+        if not self.cache_file:
+            return
+        try:
+            utils.atomic_write_json(self.cache_file, {"version": _CACHE_VERSION, "dirs": self._dir_state})
+        except OSError as e:
+            print(f"[DESKTOP_INDEX][WARN] Не удалось сохранить кэш {self.cache_file}: {e}")
+
+    # --- Актуальность ---
+    @staticmethod
+    def _scan_mtimes(root: str) -> dict:
+        """mtime корня и всех подкаталогов (новый .desktop меняет mtime своего каталога)."""
+        mtimes = {}
+        for directory, subdirs, _files in os.walk(root):
+            try:
+                mtimes[directory] = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+        return mtimes
+
+    def _ensure_fresh_locked(self):
+        now = time.monotonic()
+        first_check = not self._last_check
+        if not first_check and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        changed = first_check and bool(self._dir_state) # Данные из кэша еще не слиты
+        rescanned = False
+        for root in self.dirs:
+            mtimes = self._scan_mtimes(root) if os.path.isdir(root) else {}
+            state = self._dir_state.get(root)
+            if state is not None and state.get("mtimes") == mtimes:
+                continue
+            entries = {}
+            for directory in mtimes:
+                try:
+                    file_names = os.listdir(directory)
+                except OSError:
+                    continue
+                for file_name in file_names:
+                    if file_name.endswith(".desktop"):
+                        path = os.path.join(directory, file_name)
+                        entry = parse_desktop_file(path)
+                        if entry:
+                            entries[_desktop_id(root, path)] = entry
+            self._dir_state[root] = {"mtimes": mtimes, "entries": entries}
+            self.stats["dir_rescans"] += 1
+            changed = rescanned = True
+        if changed:
+            self._merge_locked()
+        if rescanned:
+            self._save_cache_locked()
+
+    def _merge_locked(self):
+        entries = {}
+        for root in self.dirs: # Более поздние (приоритетные) каталоги перекрывают ранние
+            entries.update(self._dir_state.get(root, {}).get("entries", {}))
+        by_name = {}
+        ranks = {}
+        for desktop_id, entry in entries.items():
+            for field, value in entry["names"]:
+                key = normalize_entry_name(value)
+                rank = _FIELD_PRIORITY[field]
+                if key and (key not in ranks or rank < ranks[key]):
+                    by_name[key] = desktop_id
+                    ranks[key] = rank
+        by_command = {}
+        for desktop_id, entry in sorted(entries.items()):
+            by_command.setdefault(os.path.basename(entry["exec"][0]).lower(), desktop_id)
+        self._entries = entries
+        self._by_name = by_name
+        self._by_command = by_command
+        self.stats["rebuilds"] += 1
+
+    # --- Поиск ---
+    def _describe(self, desktop_id: str) -> dict:
+        entry = self._entries[desktop_id]
+        exec_name = os.path.basename(entry["exec"][0])
+        if exec_name in _LAUNCHER_WRAPPERS:
+            # flatpak run org.gnome.Calculator: процесс ищем по WM_CLASS или ID записи
+            exec_name = (entry["wm_class"] or desktop_id[:-len(".desktop")].rsplit(".", 1)[-1]).lower()
+        return {
+            "desktop_id": desktop_id,
+            "name": entry["name"],
+            "exec": list(entry["exec"]),
+            "wm_class": entry["wm_class"],
+            "process_name": exec_name,
+        }
+
+    def lookup(self, name: str) -> dict | None:
+        """
+        Ищет приложение по Name/GenericName/Keywords (без учета регистра).
+
+        Returns:
+            dict | None: {"desktop_id", "name", "exec", "wm_class", "process_name"} или None.
+        """
+        key = normalize_entry_name(name)
+        if not key:
+            return None
+        with self._lock:
+            self._ensure_fresh_locked()
+            self.stats["lookups"] += 1
+            desktop_id = self._by_name.get(key)
+            return self._describe(desktop_id) if desktop_id is not None else None
+
+    def lookup_by_command(self, command: str) -> dict | None:
+        """Запись, у которой Exec запускает эту команду (чтобы узнать StartupWMClass для 'telegram-desktop')."""
+        if not command:
+            return None
+        with self._lock:
+            self._ensure_fresh_locked()
+            self.stats["lookups"] += 1
+            desktop_id = self._by_command.get(os.path.basename(command).lower())
+            return self._describe(desktop_id) if desktop_id is not None else None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["names"] = len(self._by_name)
+        return stats
+
+
+_desktop_index = None
+_desktop_index_lock = threading.Lock()
+
+def get_desktop_entry_index() -> DesktopEntryIndex:
+    """Возвращает общий (ленивый) индекс .desktop-файлов."""
+    global _desktop_index
+    if _desktop_index is None:
+        with _desktop_index_lock:
+            if _desktop_index is None:
+                _desktop_index = DesktopEntryIndex()
+    return _desktop_index
@@ -0,0 +1,162 @@
+# File: executable_index.py
+# -*- coding: utf-8 -*-
+
+# Общий индекс исполняемых файлов из PATH.
+# shutil.which на каждый вызов делает stat в каждом каталоге PATH; здесь каталоги
+# читаются один раз, а дальше "which" - это поиск в словаре. Индекс перестраивается,
+# если изменилась переменная PATH или mtime одного из каталогов (проверка не чаще,
+# чем раз в EXEC_INDEX_CHECK_INTERVAL секунд), причем перечитываются только измененные каталоги.
+# Модули проекта ищут команды через executable_index.which() и get_executable_index().exists(), а не shutil.which.
+
+import bisect
+import os
+import shutil
+import threading
+import time
+
+EXEC_INDEX_CHECK_INTERVAL = float(os.environ.get('FAMILIAR_EXEC_INDEX_CHECK_INTERVAL', 2.0))
+
+
+def _list_executables(directory: str) -> dict:
+    """{имя: полный_путь} для исполняемых файлов одного каталога."""
+    executables = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    # is_file() следует по симлинкам, как и shutil.which
+                    if entry.is_file() and os.access(entry.path, os.X_OK):
+                        executables[entry.name] = entry.path
+                except OSError:
+                    continue
+    except OSError: # Каталога из PATH может не существовать
+        pass
+    return executables
+
+
+def _dir_mtime(directory: str) -> int | None:
+    try:
+        return os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ExecutableIndex:
+    """Имя команды -> полный путь (первый каталог PATH выигрывает, как в shutil.which)."""
+
+    def __init__(self, check_interval: float = EXEC_INDEX_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._path_value = None
+        self._dirs = []          # Каталоги PATH по порядку (без повторов)
+        self._dir_mtimes = {}    # каталог -> st_mtime_ns | None
+        self._dir_listings = {}  # каталог -> {имя: путь}
+        self._names = {}         # имя -> путь (слияние с учетом порядка PATH)
+        self._sorted_names = []  # для поиска по префиксу
+        self._frozen_names = frozenset()
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"rebuilds": 0, "dir_rescans": 0, "lookups": 0}
+
+    # --- Актуальность ---
+    def _ensure_fresh_locked(self):
+        path_value = os.environ.get("PATH", os.defpath)
+        now = time.monotonic()
+        changed = False
+        if path_value != self._path_value:
+            changed = True # Порядок каталогов мог измениться - нужно заново слить списки
+            self._path_value = path_value
+            dirs = []
+            for directory in path_value.split(os.pathsep):
+                directory = directory or os.curdir
+                if directory not in dirs:
+                    dirs.append(directory)
+            self._dirs = dirs
+            self._dir_listings = {d: self._dir_listings[d] for d in dirs if d in self._dir_listings}
+            self._dir_mtimes = {d: self._dir_mtimes[d] for d in dirs if d in self._dir_mtimes}
+        elif now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        for directory in self._dirs:
+            mtime = _dir_mtime(directory)
+            if directory not in self._dir_listings or mtime != self._dir_mtimes.get(directory):
+                self._dir_mtimes[directory] = mtime
+                self._dir_listings[directory] = _list_executables(directory) if mtime is not None else {}
+                self.stats["dir_rescans"] += 1
+                changed = True
+        if changed:
+            self._merge_locked()
+
+    def _merge_locked(self):
+        names = {}
+        for directory in reversed(self._dirs): # Ранние каталоги PATH перезаписывают поздние
+            names.update(self._dir_listings.get(directory, {}))
+        self._names = names
+        self._sorted_names = sorted(names)
+        self._frozen_names = frozenset(names)
+        self.stats["rebuilds"] += 1
+
+    def refresh(self):
+        """Принудительно проверяет каталоги PATH (например, сразу после установки программы)."""
+        with self._lock:
+            self._last_check = 0.0
+            self._ensure_fresh_locked()
+
+    # --- Поиск ---
+    def resolve(self, command: str) -> str | None:
+        """Аналог shutil.which: полный путь к команде или None."""
+        if not command:
+            return None
+        if os.name == 'nt': # PATHEXT и прочие особенности Windows - через стандартную функцию
+            return shutil.which(command)
+        if os.path.dirname(command): # Путь (абсолютный или относительный) проверяем напрямую
+            if os.path.isfile(command) and os.access(command, os.X_OK):
+                return command
+            return None
+        with self._lock:
+            self._ensure_fresh_locked()
+            self.stats["lookups"] += 1
+            return self._names.get(command)
+
+    def exists(self, command: str) -> bool:
+        return self.resolve(command) is not None
+
+    def iter_prefix(self, prefix: str):
+        """Имена команд, начинающиеся с prefix, в алфавитном порядке."""
+        with self._lock:
+            self._ensure_fresh_locked()
+            sorted_names = self._sorted_names
+        position = bisect.bisect_left(sorted_names, prefix)
+        while position < len(sorted_names) and sorted_names[position].startswith(prefix):
+            yield sorted_names[position]
+            position += 1
+
+    def snapshot(self) -> tuple[int, frozenset]:
+        """(номер_перестроения, имена_команд): по номеру потребители видят, что список изменился."""
+        with self._lock:
+            self._ensure_fresh_locked()
+            return self.stats["rebuilds"], self._frozen_names
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["executables"] = len(self._names)
+            stats["directories"] = len(self._dirs)
+        return stats
+
+
+_executable_index = None
+_executable_index_lock = threading.Lock()
+
+def get_executable_index() -> ExecutableIndex:
+    """Возвращает общий (ленивый) индекс исполняемых файлов."""
+    global _executable_index
+    if _executable_index is None:
+        with _executable_index_lock:
+            if _executable_index is None:
+                _executable_index = ExecutableIndex()
+    return _executable_index
+
+def which(command: str) -> str | None:
+    """Замена shutil.which через общий индекс."""
+    return get_executable_index().resolve(command)
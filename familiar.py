@@ -1,9 +1,40 @@
 # File: familiar.py (Ядро/Движок Фамильяра)
 # -*- coding: utf-8 -*-
 
+import copy
+import functools
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import nlu_processor # Наш обновленный модуль
 import command_dispatcher
+import fast_intent_router # Быстрый путь без LLM для частых команд
+import response_renderer # Шаблонные ответы без второго запроса к LLM
+
+# --- Ответ NLU ограничивается схемой, собранной из реестра обработчиков ---
+# Схема строится при первом промахе быстрого маршрутизатора (ей нужны модули всех
+# обработчиков), а не при импорте: команды без LLM не платят за импорт лишних модулей.
+_nlu_schema_configured = False
+_nlu_schema_lock = threading.Lock()
+
+def ensure_nlu_output_schema():
+    """Один раз передает в nlu_processor схему ответа NLU (до обращения к кэшу NLU: от схемы зависит его отпечаток)."""
+    global _nlu_schema_configured
+    if _nlu_schema_configured or not nlu_processor.NLU_SCHEMA_ENABLED:
+        return
+    with _nlu_schema_lock:
+        if not _nlu_schema_configured:
+            nlu_processor.configure_nlu_output_schema(command_dispatcher.build_nlu_output_schema())
+            _nlu_schema_configured = True
+
+# --- "Многословный" режим: все ответы генерирует LLM (шаблоны не используются) ---
+VERBOSE_RESPONSES = os.environ.get('FAMILIAR_VERBOSE_RESPONSES', '').lower() in ('1', 'true', 'yes')
+
+# --- Пул потоков для блокирующих действий (psutil, wmctrl/xdotool, sudo) в async-режиме ---
+ACTION_WORKERS = int(os.environ.get('FAMILIAR_ACTION_WORKERS', 4))
+ACTION_EXECUTOR = ThreadPoolExecutor(max_workers=ACTION_WORKERS, thread_name_prefix="familiar-action")
 
 # --- Шаблон инструкции для NLU (извлечение интента) ---
 # Используется функцией nlu_processor.get_nlu_intent_from_text
@@ -52,81 +83,138 @@ RESPONSE_GENERATION_INSTRUCTION_TEMPLATE = """Тебе будет предост
 7.  `message_code`: "ERROR_PERMISSION_SUDO"
     Ответ: "Кажется, у меня недостаточно прав для выполнения этой команды. Возможно, нужно настроить sudo."
 
+8.  `message_code`: "MULTI_COMMAND_RESULT", `data`: {{"results": [результат, результат, ...]}}
+    Это составная команда: ответь одной репликой обо всех результатах по порядку, например: "Открыл Chrome и Telegram, звук сделал тише."
+
 Действуй! Вот структурированный результат:
 {structured_data_json}
 Твой ответ:
 """
 
-def generate_natural_response(structured_result: dict) -> str:
+def _build_response_prompt(structured_result: dict) -> tuple[str | None, str | None]:
     """
-    Отправляет структурированный результат в LLM для генерации ответа.
+    Готовит ответ без LLM или prompt для LLM.
+    Возвращает (готовый_ответ, prompt): заполнено ровно одно из значений.
     """
     print(f"[FAMILIAR_CORE][INFO] Generating natural response for: {structured_result}")
     if not structured_result or not isinstance(structured_result, dict):
         print("[FAMILIAR_CORE][ERROR] Structured result is invalid, cannot generate response.")
-        return "Произошла внутренняя ошибка при подготовке ответа."
+        return "Произошла внутренняя ошибка при подготовке ответа.", None
+
+    # Быстрый путь: готовый шаблон для message_code (LLM не нужна)
+    if not VERBOSE_RESPONSES:
+        rendered_response = response_renderer.render_response(structured_result)
+        if rendered_response:
+            return rendered_response, None
 
     try:
         structured_data_json_string = json.dumps(structured_result, ensure_ascii=False, indent=2)
     except TypeError as e:
         print(f"[FAMILIAR_CORE][ERROR] Failed to serialize structured_result to JSON: {e}")
-        return "Произошла внутренняя ошибка: не удалось сериализовать результат."
+        return "Произошла внутренняя ошибка: не удалось сериализовать результат.", None
 
     # Формируем ПОЛНЫЙ текст инструкции для генерации ответа
-    instruction_for_response_generation = RESPONSE_GENERATION_INSTRUCTION_TEMPLATE.format(
+    return None, RESPONSE_GENERATION_INSTRUCTION_TEMPLATE.format(
         structured_data_json=structured_data_json_string
     )
 
-    # Вызываем новую функцию из nlu_processor для генерации ответа
-    response_text = nlu_processor.generate_llm_response_from_template(
-        full_prompt_text=instruction_for_response_generation
-        # model_name, api_url и т.д. будут использоваться по умолчанию из nlu_processor
-    )
-
+def _finish_natural_response(structured_result: dict, response_text: str | None) -> str:
+    """Возвращает ответ LLM или запасной вариант на основе user_message_hint."""
     if response_text:
         return response_text.strip()
+    print("[FAMILIAR_CORE][ERROR] LLM did not return a response for structured data.")
+    hint = structured_result.get("user_message_hint", "")
+    if structured_result.get("status") == "success":
+        return hint if hint else "Команда выполнена."
     else:
-        print("[FAMILIAR_CORE][ERROR] LLM did not return a response for structured data.")
-        # Возвращаем запасной вариант на основе user_message_hint или общего сообщения
-        hint = structured_result.get("user_message_hint", "")
-        if structured_result.get("status") == "success":
-            return hint if hint else "Команда выполнена."
-        else:
-            return hint if hint else "Произошла ошибка при выполнении команды."
+        return hint if hint else "Произошла ошибка при выполнении команды."
+
+def generate_natural_response(structured_result: dict) -> str:
+    """
+    Формирует ответ пользователю по структурированному результату.
+    Сначала пробует шаблон из response_renderer; в LLM идут только коды без шаблона
+    или все ответы, если включен VERBOSE_RESPONSES.
+    """
+    ready_response, prompt = _build_response_prompt(structured_result)
+    if ready_response is not None:
+        return ready_response
+    # model_name, api_url и т.д. будут использоваться по умолчанию из nlu_processor
+    response_text = nlu_processor.generate_llm_response_from_template(full_prompt_text=prompt)
+    return _finish_natural_response(structured_result, response_text)
+
+async def generate_natural_response_async(structured_result: dict) -> str:
+    """Асинхронный аналог generate_natural_response (LLM вызывается без блокировки event loop)."""
+    ready_response, prompt = _build_response_prompt(structured_result)
+    if ready_response is not None:
+        return ready_response
+    response_text = await nlu_processor.generate_llm_response_from_template_async(full_prompt_text=prompt)
+    return _finish_natural_response(structured_result, response_text)
+
+
+def _nlu_error_message(nlu_error: str | None) -> str:
+    """Текст для пользователя, если NLU не дал результата."""
+    if nlu_error == "NLU_NO_RESPONSE":
+        print("[FAMILIAR_CORE][ERROR] NLU processor did not return a response.")
+        # TODO: Можно сделать вызов generate_natural_response с ошибкой NLU_FAILED
+        return "Извините, не удалось связаться с системой распознавания команд."
+    print("[FAMILIAR_CORE][ERROR] Failed to parse JSON from NLU or 'intent' is missing.")
+    # TODO: Можно сделать вызов generate_natural_response с ошибкой NLU_PARSE_FAILED
+    return "Простите, я получил не совсем понятный ответ от системы распознавания. Попробуйте перефразировать."
+
+def _is_valid_structured_result(structured_result) -> bool:
+    if not structured_result or not isinstance(structured_result, dict):
+        print(f"[FAMILIAR_CORE][ERROR] Dispatcher returned invalid structured result: {structured_result}")
+        return False
+    return True
+
+
+def _emit_progress(on_event, stage: str, data: dict):
+    """Передает промежуточный этап обработки (для потоковых ответов демона); ошибки получателя не мешают команде."""
+    if on_event is None:
+        return
+    try:
+        on_event({"event": "progress", "stage": stage, "data": data})
+    except Exception as e:
+        print(f"[FAMILIAR_CORE][WARN] Progress callback failed at stage '{stage}': {e}")
 
 
-def process_text_command(user_text: str) -> str:
+def process_text_command(user_text: str, on_event=None, origin: dict | None = None) -> str:
     """
     Полный цикл обработки текстовой команды пользователя.
     1. NLU для извлечения интента и параметров.
     2. Диспетчеризация и выполнение команды.
     3. Генерация естественного ответа на основе результата.
+    on_event(message) получает этапы "understood" (интент и параметры) и "executed" (итог действия).
+    origin - откуда пришла команда ({"frontend": "telegram", "chat_id": ...}); по нему
+    доставляются отложенные ответы (напоминания). Без него - консоль.
     """
     print(f"[FAMILIAR_CORE][INFO] Processing command: '{user_text}'")
 
     # 1. NLU (извлечение интента)
-    # Используем переименованную функцию nlu_processor.get_nlu_intent_from_text
-    nlu_raw_response = nlu_processor.get_nlu_intent_from_text(user_text)
-    if not nlu_raw_response:
-        print("[FAMILIAR_CORE][ERROR] NLU processor did not return a response.")
-        # TODO: Можно сделать вызов generate_natural_response с ошибкой NLU_FAILED
-        return "Извините, не удалось связаться с системой распознавания команд."
-
-    parsed_nlu = nlu_processor.extract_json_from_response(nlu_raw_response)
-    if not parsed_nlu or "intent" not in parsed_nlu : # Добавил проверку на "intent"
-        print(f"[FAMILIAR_CORE][ERROR] Failed to parse JSON from NLU or 'intent' is missing. Raw: '{nlu_raw_response}'")
-        # TODO: Можно сделать вызов generate_natural_response с ошибкой NLU_PARSE_FAILED
-        return "Простите, я получил не совсем понятный ответ от системы распознавания. Попробуйте перефразировать."
+    # Сначала пробуем быстрый маршрутизатор по правилам, LLM - только при промахе
+    parsed_nlu = fast_intent_router.route_command(user_text, command_dispatcher.get_aliases())
+    if parsed_nlu is None:
+        # Затем кэш результатов NLU, и только потом запрос к модели
+        ensure_nlu_output_schema()
+        parsed_nlu, nlu_error = nlu_processor.get_nlu_result(user_text)
+        if nlu_error or not parsed_nlu:
+            return _nlu_error_message(nlu_error)
+    if "intents" in parsed_nlu:
+        _emit_progress(on_event, "understood", {"intents": parsed_nlu["intents"]})
+    else:
+        _emit_progress(on_event, "understood", {"intent": parsed_nlu.get("intent"),
+                                                "parameters": parsed_nlu.get("parameters", {})})
 
     # 2. Диспетчеризация и выполнение команды
     # dispatch_command теперь возвращает структурированный ответ
-    # Передаем APP_ALIASES из command_dispatcher, так как обработчики ожидают его
-    structured_result = command_dispatcher.dispatch_command(parsed_nlu, debug_mode=False)
+    # Алиасы диспетчер передает обработчикам сам (command_dispatcher.get_aliases())
+    structured_result = command_dispatcher.dispatch_command(parsed_nlu, debug_mode=False, origin=origin)
 
-    if not structured_result or not isinstance(structured_result, dict):
-        print(f"[FAMILIAR_CORE][ERROR] Dispatcher returned invalid structured result: {structured_result}")
+    if not _is_valid_structured_result(structured_result):
         # TODO: Можно сделать вызов generate_natural_response с ошибкой DISPATCHER_FAILED
         return "Произошла внутренняя ошибка при выполнении вашей команды."
+    _emit_progress(on_event, "executed", {"status": structured_result.get("status"),
+                                          "message_code": structured_result.get("message_code")})
 
     # 3. Генерация естественного ответа
     final_response = generate_natural_response(structured_result)
@@ -135,28 +223,161 @@ def process_text_command(user_text: str) -> str:
     return final_response
 
 
-if __name__ == "__main__":
-    # Простой тестовый цикл для familiar.py
-    print("Фамильяр (консольный интерфейс ядра) v0.3 - Генерация ответов")
-    print("Инициализация...")
-    # command_dispatcher.initialize_dispatcher() # Вызывается при импорте command_dispatcher
-    print("Готов к приему команд. Введите 'выход' для завершения.")
-    print("-" * 30)
-
-    while True:
+# --- Пакетная обработка (скрипты, прогон логов и тестовых корпусов) ---
+# Сколько запросов к Ollama (NLU и генерация ответов) одновременно отправлять при пакетной обработке.
+# Выигрыш есть, если сервер обрабатывает запросы параллельно (OLLAMA_NUM_PARALLEL > 1);
+# по умолчанию - по размеру пула соединений nlu_processor.
+BATCH_PARALLELISM = int(os.environ.get('FAMILIAR_BATCH_PARALLELISM', nlu_processor.DEFAULT_POOL_SIZE))
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _timed_call(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, _elapsed_ms(started)
+
+
+def process_text_commands(user_texts: list[str], max_parallel: int = BATCH_PARALLELISM,
+                          origin: dict | None = None) -> list[dict]:
+    """
+    Пакетный вариант process_text_command.
+    1. Быстрый маршрутизатор для всех строк; промахи уходят в NLU одновременно
+       (не больше max_parallel запросов к Ollama, одинаковые строки - одним запросом).
+    2. Команды выполняются строго в порядке входа (действия могут зависеть друг от друга).
+    3. Ответы по шаблонам готовы сразу, ответы через LLM снова запрашиваются параллельно.
+    Ошибка в одной строке не мешает остальным.
+
+    Returns:
+        list[dict]: по элементу на строку, в порядке входа:
+            {"index", "text", "ok", "response", "nlu_source": "router" | "nlu" | None,
+             "parsed_nlu", "structured_result", "error": код | None,
+             "timings": {"nlu_ms", "dispatch_ms", "response_ms", "total_ms"}}
+            ok - команда распознана и выполнена без внутренних ошибок
+            (исход самого действия - в structured_result["status"]).
+    """
+    print(f"[FAMILIAR_CORE][INFO] Processing batch of {len(user_texts)} commands (parallelism {max_parallel})")
+    max_parallel = max(1, max_parallel)
+    items = [{"index": index, "text": user_text, "ok": False, "response": None, "nlu_source": None,
+              "parsed_nlu": None, "structured_result": None, "error": None,
+              "timings": {"nlu_ms": 0.0, "dispatch_ms": 0.0, "response_ms": 0.0, "total_ms": 0.0}}
+             for index, user_text in enumerate(user_texts)]
+
+    # 1. NLU: сначала правила, промахи - в Ollama параллельно
+    aliases = command_dispatcher.get_aliases()
+    llm_items = {} # текст -> элементы с этим текстом
+    for item in items:
+        if not isinstance(item["text"], str) or not item["text"].strip():
+            item["error"], item["response"] = "EMPTY_COMMAND", "Пустая команда."
+            continue
+        parsed_nlu, item["timings"]["nlu_ms"] = _timed_call(fast_intent_router.route_command, item["text"], aliases)
+        if parsed_nlu is not None:
+            item["parsed_nlu"], item["nlu_source"] = parsed_nlu, "router"
+        else:
+            llm_items.setdefault(item["text"], []).append(item)
+
+    if llm_items:
+        ensure_nlu_output_schema()
+        with ThreadPoolExecutor(max_workers=min(max_parallel, len(llm_items)),
+                                thread_name_prefix="familiar-batch") as pool:
+            futures = {text: pool.submit(_timed_call, nlu_processor.get_nlu_result, text) for text in llm_items}
+            for text, future in futures.items():
+                try:
+                    (parsed_nlu, nlu_error), nlu_ms = future.result()
+                except Exception as e:
+                    print(f"[FAMILIAR_CORE][ERROR] NLU failed for '{text}': {e}")
+                    parsed_nlu, nlu_error, nlu_ms = None, "NLU_NO_RESPONSE", 0.0
+                for item in llm_items[text]:
+                    item["nlu_source"] = "nlu"
+                    item["timings"]["nlu_ms"] = nlu_ms
+                    if nlu_error or not parsed_nlu:
+                        item["error"] = nlu_error or "NLU_PARSE_FAILED"
+                        item["response"] = _nlu_error_message(nlu_error)
+                    else:
+                        item["parsed_nlu"] = copy.deepcopy(parsed_nlu) # Обработчики могут менять параметры
+
+    # 2. Выполнение строго по порядку; ответы по шаблонам - сразу
+    llm_responses = [] # (элемент, prompt)
+    for item in items:
+        if item["parsed_nlu"] is None:
+            continue
         try:
-            command = input(">>> Вы: ")
-            if command.lower() in ['выход', 'exit', 'quit']:
-                break
-            if not command:
-                continue
-
-            response = process_text_command(command)
-            print(f"Фамильяр: {response}")
-            print("-" * 30)
-        except EOFError:
-            print("\nЗавершение работы.")
-            break
-        except KeyboardInterrupt:
-            print("\nЗавершение работы по Ctrl+C.")
-            break
+            structured_result, item["timings"]["dispatch_ms"] = _timed_call(
+                command_dispatcher.dispatch_command, item["parsed_nlu"], debug_mode=False, origin=origin)
+        except Exception as e:
+            print(f"[FAMILIAR_CORE][ERROR] Dispatch failed for '{item['text']}': {e}")
+            structured_result = None
+        if not _is_valid_structured_result(structured_result):
+            item["error"] = "DISPATCH_FAILED"
+            item["response"] = "Произошла внутренняя ошибка при выполнении вашей команды."
+            continue
+        item["structured_result"] = structured_result
+        (ready_response, prompt), item["timings"]["response_ms"] = _timed_call(_build_response_prompt, structured_result)
+        if ready_response is not None:
+            item["response"], item["ok"] = ready_response, True
+        else:
+            llm_responses.append((item, prompt))
+
+    # 3. Ответы через LLM - параллельно
+    if llm_responses:
+        with ThreadPoolExecutor(max_workers=min(max_parallel, len(llm_responses)),
+                                thread_name_prefix="familiar-batch") as pool:
+            futures = [(item, pool.submit(_timed_call, nlu_processor.generate_llm_response_from_template, prompt))
+                       for item, prompt in llm_responses]
+            for item, future in futures:
+                try:
+                    response_text, response_ms = future.result()
+                except Exception as e:
+                    print(f"[FAMILIAR_CORE][ERROR] Response generation failed for '{item['text']}': {e}")
+                    response_text, response_ms = None, 0.0
+                item["timings"]["response_ms"] += response_ms
+                item["response"] = _finish_natural_response(item["structured_result"], response_text)
+                item["ok"] = True
+
+    for item in items:
+        timings = item["timings"]
+        timings["total_ms"] = round(timings["nlu_ms"] + timings["dispatch_ms"] + timings["response_ms"], 1)
+    print(f"[FAMILIAR_CORE][INFO] Batch done: {sum(item['ok'] for item in items)}/{len(items)} succeeded, "
+          f"{len(llm_items)} NLU requests, {len(llm_responses)} LLM responses.")
+    return items
+
+
+async def process_text_command_async(user_text: str, origin: dict | None = None) -> str:
+    """
+    Асинхронный вариант process_text_command для asyncio-фронтендов (Telegram).
+    Запросы к Ollama идут через неблокирующий клиент, а блокирующие действия
+    обработчиков (psutil, wmctrl/xdotool, sudo) выполняются в ACTION_EXECUTOR,
+    поэтому event loop свободен для других чатов.
+    """
+    print(f"[FAMILIAR_CORE][INFO] Processing command (async): '{user_text}'")
+
+    parsed_nlu = fast_intent_router.route_command(user_text, command_dispatcher.get_aliases())
+    if parsed_nlu is None:
+        ensure_nlu_output_schema()
+        parsed_nlu, nlu_error = await nlu_processor.get_nlu_result_async(user_text)
+        if nlu_error or not parsed_nlu:
+            return _nlu_error_message(nlu_error)
+
+    import asyncio # Уже загружен event loop-ом вызывающего; на старте CLI не импортируем
+    loop = asyncio.get_running_loop()
+    structured_result = await loop.run_in_executor(
+        ACTION_EXECUTOR, functools.partial(command_dispatcher.dispatch_command, parsed_nlu, debug_mode=False,
+                                           origin=origin))
+
+    if not _is_valid_structured_result(structured_result):
+        return "Произошла внутренняя ошибка при выполнении вашей команды."
+
+    final_response = await generate_natural_response_async(structured_result)
+    print(f"[FAMILIAR_CORE][INFO] Final response to user: '{final_response}'")
+    return final_response
+
+
+if __name__ == "__main__":
+    # Консольный интерфейс - клиент демона (familiar_daemon.py): алиасы, кэши и соединения
+    # с Ollama общие с Telegram-ботом. Без демона команды выполняются в этом процессе.
+    # Самый быстрый запуск разовой команды: python familiar_client.py "команда"
+    import sys
+    import familiar_client
+    sys.exit(familiar_client.main(fallback_processor=process_text_command))
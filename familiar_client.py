@@ -0,0 +1,373 @@
+# File: familiar_client.py
+# -*- coding: utf-8 -*-
+
+# Тонкий клиент демона Фамильяра (familiar_daemon.py).
+# Импортирует только стандартную библиотеку, поэтому разовая команда
+#     python familiar_client.py "открой firefox"
+# не тянет за собой ядро (NLU, обработчики, psutil, requests): все выполняет демон,
+# у которого общие для всех фронтендов алиасы, кэши и соединения с Ollama.
+# Если демон не запущен, команда выполняется в этом же процессе (familiar.process_text_command).
+#
+# Протокол: Unix-сокет, по одной JSON-строке на сообщение (UTF-8, '\n' в конце).
+#   Запрос:  {"op": "command", "text": "...", "stream": false, "origin": {"frontend": "telegram", "chat_id": 42}}
+#            (origin - необязательно, по нему доставляются напоминания; без него - "console")
+#            {"op": "batch", "texts": ["...", ...], "max_parallel": 4} (max_parallel - необязательно)
+#            {"op": "ping"} | {"op": "stats"}
+#   Ответ:   {"event": "result", "ok": true, "response": "..."}
+#            для batch: {"event": "result", "ok": true, "results": [...]} (см. familiar.process_text_commands)
+#            ошибка: {"event": "result", "ok": false, "error": "КОД", "response": "текст для пользователя"}
+#   При "stream": true перед результатом приходят события
+#            {"event": "progress", "stage": "understood" | "executed", "data": {...}}
+# По одному соединению можно отправлять несколько запросов подряд.
+#   Подписка на напоминания: {"op": "subscribe", "frontend": "console"} -> {"event": "result", "ok": true},
+#   затем соединение остается открытым и на каждое срабатывание
+#            {"event": "reminder", "reminder": {...}, "text": "Напоминание: ..."}
+#   клиент отвечает {"op": "ack", "id": "<reminder id>", "ok": true} (false - не доставлено, демон подождет
+#   другого подписчика этого фронтенда).
+
+import json
+import os
+import socket
+import sys
+import tempfile
+
+
+def _default_socket_path() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "familiar.sock")
+    return os.path.join(tempfile.gettempdir(), f"familiar-{os.getuid()}.sock")
+
+SOCKET_PATH = os.environ.get("FAMILIAR_SOCKET") or _default_socket_path()
+CONNECT_TIMEOUT = float(os.environ.get("FAMILIAR_CLIENT_CONNECT_TIMEOUT", 1.0))
+# Команда может ждать LLM, поэтому таймаут ответа - как у чтения из Ollama плюс запас
+REQUEST_TIMEOUT = float(os.environ.get("FAMILIAR_CLIENT_TIMEOUT", 120.0))
+# Выполнять команду в своем процессе, если демон недоступен
+FALLBACK_ENABLED = os.environ.get("FAMILIAR_CLIENT_FALLBACK", "1").lower() not in ("0", "false", "no")
+# Пауза перед повторной подпиской на напоминания после обрыва (демон перезапускается)
+RESUBSCRIBE_DELAY = 5.0
+
+INTERNAL_ERROR_REPLY = "Произошла неожиданная внутренняя ошибка при обработке вашей команды."
+
+
+class DaemonUnavailable(ConnectionError):
+    """Демон не запущен (нет сокета или никто не слушает). Команда еще не отправлена."""
+
+
+def encode_message(message: dict) -> bytes:
+    # default=str: в data результатов обработчиков могут оказаться не-JSON значения
+    return (json.dumps(message, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+def _connect(socket_path: str) -> socket.socket:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        sock.close()
+        raise DaemonUnavailable(f"Демон Фамильяра не отвечает на {socket_path}: {e}") from e
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def request(payload: dict, socket_path: str | None = None, on_event=None,
+            timeout: float = REQUEST_TIMEOUT) -> dict:
+    """
+    Отправляет один запрос демону и возвращает итоговое сообщение {"event": "result", ...}.
+    События "progress" передаются в on_event(message).
+
+    Raises:
+        DaemonUnavailable: демон не запущен (запрос не отправлен).
+        ConnectionError: демон закрыл соединение, не ответив.
+        TimeoutError: ответа нет дольше timeout секунд.
+    """
+    sock = _connect(socket_path or SOCKET_PATH)
+    try:
+        sock.settimeout(timeout)
+        sock.sendall(encode_message(payload))
+        with sock.makefile("rb") as reader:
+            for raw_line in reader:
+                message = json.loads(raw_line)
+                if message.get("event") == "progress":
+                    if on_event is not None:
+                        on_event(message)
+                    continue
+                return message
+    finally:
+        sock.close()
+    raise ConnectionError("Демон Фамильяра закрыл соединение без ответа.")
+
+
+def ping(socket_path: str | None = None) -> bool:
+    """True, если демон запущен и отвечает."""
+    try:
+        return bool(request({"op": "ping"}, socket_path, timeout=CONNECT_TIMEOUT).get("ok"))
+    except (OSError, ValueError):
+        return False
+
+
+def _reply_text(message: dict) -> str:
+    if not message.get("ok"):
+        print(f"[FAMILIAR_CLIENT][ERROR] Демон вернул ошибку: {message.get('error')}", file=sys.stderr)
+    return message.get("response") or INTERNAL_ERROR_REPLY
+
+
+def _command_payload(user_text: str, stream: bool, origin: dict | None) -> dict:
+    payload = {"op": "command", "text": user_text, "stream": stream}
+    if origin is not None:
+        payload["origin"] = origin
+    return payload
+
+
+def process_text_command(user_text: str, on_event=None, socket_path: str | None = None,
+                         fallback: bool = FALLBACK_ENABLED, fallback_processor=None,
+                         origin: dict | None = None) -> str:
+    """
+    Выполняет команду через демон; без демона - в этом процессе (если fallback включен).
+    Повтора в своем процессе после обрыва уже отправленного запроса нет: команда
+    (например, "выключи компьютер") могла успеть выполниться.
+    """
+    try:
+        message = request(_command_payload(user_text, on_event is not None, origin), socket_path, on_event=on_event)
+    except DaemonUnavailable:
+        if not fallback:
+            raise
+        if fallback_processor is None:
+            import familiar # Тяжелый импорт - только когда демона нет
+            fallback_processor = familiar.process_text_command
+        return fallback_processor(user_text, origin=origin)
+    return _reply_text(message)
+
+
+def process_text_commands(user_texts: list[str], socket_path: str | None = None,
+                          fallback: bool = FALLBACK_ENABLED) -> list[dict]:
+    """Пакетная обработка через демон (без демона - familiar.process_text_commands в этом процессе)."""
+    user_texts = list(user_texts)
+    try:
+        message = request({"op": "batch", "texts": user_texts}, socket_path,
+                          timeout=REQUEST_TIMEOUT * max(1, len(user_texts)))
+    except DaemonUnavailable:
+        if not fallback:
+            raise
+        import familiar
+        return familiar.process_text_commands(user_texts)
+    if not message.get("ok"):
+        raise ConnectionError(f"Демон не выполнил пакет команд: {message.get('error')}")
+    return message["results"]
+
+
+# --- Асинхронный вариант (для telegram_bot.py) ---
+async def request_async(payload: dict, socket_path: str | None = None, timeout: float = REQUEST_TIMEOUT) -> dict:
+    """Асинхронный аналог request() (события progress пропускаются)."""
+    import asyncio # Уже загружен event loop-ом вызывающего
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(socket_path or SOCKET_PATH), CONNECT_TIMEOUT)
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        raise DaemonUnavailable(f"Демон Фамильяра не отвечает на {socket_path or SOCKET_PATH}: {e}") from e
+
+    async def read_result():
+        while raw_line := await reader.readline():
+            message = json.loads(raw_line)
+            if message.get("event") != "progress":
+                return message
+        raise ConnectionError("Демон Фамильяра закрыл соединение без ответа.")
+
+    try:
+        writer.write(encode_message(payload))
+        await writer.drain()
+        return await asyncio.wait_for(read_result(), timeout)
+    finally:
+        writer.close()
+
+
+async def process_text_command_async(user_text: str, socket_path: str | None = None,
+                                     fallback: bool = FALLBACK_ENABLED, origin: dict | None = None) -> str:
+    """Асинхронный аналог process_text_command (без демона - familiar.process_text_command_async)."""
+    try:
+        message = await request_async(_command_payload(user_text, False, origin), socket_path)
+    except DaemonUnavailable:
+        if not fallback:
+            raise
+        import familiar
+        return await familiar.process_text_command_async(user_text, origin=origin)
+    return _reply_text(message)
+
+
+# --- Напоминания (подписка фронтенда) ---
+def subscribe(frontend: str, on_reminder, socket_path: str | None = None):
+    """
+    Получает напоминания своего фронтенда от демона, пока соединение живо.
+    on_reminder(message) -> bool вызывается на каждое {"event": "reminder", ...}; результат уходит в ack.
+
+    Raises:
+        DaemonUnavailable: демон не запущен.
+        ConnectionError: демон закрыл соединение (например, перезапускается).
+    """
+    sock = _connect(socket_path or SOCKET_PATH)
+    try:
+        sock.settimeout(None) # Напоминания приходят когда угодно
+        sock.sendall(encode_message({"op": "subscribe", "frontend": frontend}))
+        with sock.makefile("rb") as reader:
+            for raw_line in reader:
+                message = json.loads(raw_line)
+                if message.get("event") == "result" and not message.get("ok"):
+                    raise ConnectionError(f"Демон отклонил подписку: {message.get('response')}")
+                if message.get("event") != "reminder":
+                    continue
+                try:
+                    delivered = bool(on_reminder(message))
+                except Exception as e:
+                    print(f"[FAMILIAR_CLIENT][ERROR] Reminder handler failed: {e}", file=sys.stderr)
+                    delivered = False
+                sock.sendall(encode_message({"op": "ack", "id": message["reminder"]["id"], "ok": delivered}))
+    finally:
+        sock.close()
+    raise ConnectionError("Демон Фамильяра закрыл подписку на напоминания.")
+
+
+async def subscribe_async(frontend: str, on_reminder, socket_path: str | None = None):
+    """Асинхронный аналог subscribe(): on_reminder - корутина-функция, возвращающая bool."""
+    import asyncio
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(socket_path or SOCKET_PATH), CONNECT_TIMEOUT)
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        raise DaemonUnavailable(f"Демон Фамильяра не отвечает на {socket_path or SOCKET_PATH}: {e}") from e
+    try:
+        writer.write(encode_message({"op": "subscribe", "frontend": frontend}))
+        await writer.drain()
+        while raw_line := await reader.readline():
+            message = json.loads(raw_line)
+            if message.get("event") == "result" and not message.get("ok"):
+                raise ConnectionError(f"Демон отклонил подписку: {message.get('response')}")
+            if message.get("event") != "reminder":
+                continue
+            try:
+                delivered = bool(await on_reminder(message))
+            except Exception as e:
+                print(f"[FAMILIAR_CLIENT][ERROR] Reminder handler failed: {e}", file=sys.stderr)
+                delivered = False
+            writer.write(encode_message({"op": "ack", "id": message["reminder"]["id"], "ok": delivered}))
+            await writer.drain()
+    finally:
+        writer.close()
+    raise ConnectionError("Демон Фамильяра закрыл подписку на напоминания.")
+
+
+# --- Командная строка ---
+def _print_progress(message: dict):
+    print(f"[{message.get('stage')}] {json.dumps(message.get('data'), ensure_ascii=False)}", file=sys.stderr)
+
+
+def _print_reminder(text: str) -> bool:
+    # Напоминание приходит посреди ввода: печатаем его и заново показываем приглашение
+    print(f"\n*** {text} ***\n>>> Вы: ", end="", flush=True)
+    return True
+
+
+def _listen_console_reminders(socket_path: str | None):
+    """Фоновая подписка консоли на напоминания демона (с переподключением)."""
+    import threading
+    import time
+
+    def listen():
+        while True:
+            try:
+                subscribe("console", lambda message: _print_reminder(message["text"]), socket_path)
+            except (OSError, ValueError):
+                time.sleep(RESUBSCRIBE_DELAY)
+
+    threading.Thread(target=listen, name="familiar-reminders-listener", daemon=True).start()
+
+
+def run_repl(socket_path: str | None = None, fallback: bool = FALLBACK_ENABLED, fallback_processor=None):
+    """Интерактивный цикл консольного Фамильяра поверх демона."""
+    print("Фамильяр (консольный интерфейс ядра) v0.3 - Генерация ответов")
+    print("Инициализация...")
+    if ping(socket_path):
+        print(f"Подключен к демону: {socket_path or SOCKET_PATH}")
+        _listen_console_reminders(socket_path)
+    elif fallback:
+        print("Демон не запущен (python familiar_daemon.py), команды выполняются в этом процессе.")
+        import threading
+        import nlu_processor
+        import reminder_scheduler
+        # Напоминания срабатывают в этом процессе, пока он работает
+        if not reminder_scheduler.register_delivery(
+                "console", lambda entry: _print_reminder(reminder_scheduler.format_reminder(entry))):
+            print("Напоминания ведет другой запущенный Фамильяр, здесь их поставить нельзя "
+                  "(чтобы работали везде, запустите python familiar_daemon.py).")
+        if nlu_processor.NLU_PROMPT_CACHE_ENABLED:
+            # Прогреваем KV-кэш статической NLU-инструкции в фоне, не задерживая приглашение
+            threading.Thread(target=nlu_processor.warm_up_nlu_prefix, daemon=True).start()
+    print("Готов к приему команд. Введите 'выход' для завершения.")
+    print("-" * 30)
+
+    while True:
+        try:
+            command = input(">>> Вы: ")
+            if command.lower() in ['выход', 'exit', 'quit']:
+                break
+            if not command:
+                continue
+
+            response = process_text_command(command, socket_path=socket_path, fallback=fallback,
+                                            fallback_processor=fallback_processor)
+            print(f"Фамильяр: {response}")
+            print("-" * 30)
+        except DaemonUnavailable as e:
+            print(f"Фамильяр: {e}")
+        except (ConnectionError, TimeoutError) as e:
+            print(f"Фамильяр: связь с демоном прервана ({e}).")
+        except EOFError:
+            print("\nЗавершение работы.")
+            break
+        except KeyboardInterrupt:
+            print("\nЗавершение работы по Ctrl+C.")
+            break
+
+
+def main(argv=None, fallback_processor=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Клиент Фамильяра: разовая команда или интерактивный режим")
+    parser.add_argument("text", nargs="*", help="Команда (без нее - интерактивный режим)")
+    parser.add_argument("--socket", default=None, help=f"Путь к сокету демона (по умолчанию {SOCKET_PATH})")
+    parser.add_argument("--no-fallback", action="store_true", help="Не выполнять команду в этом процессе без демона")
+    parser.add_argument("--stream", action="store_true", help="Показывать ход выполнения (в stderr)")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Выполнить команды из файла (по строке; '-' - stdin), результаты - JSON по строке")
+    args = parser.parse_args(argv)
+    fallback = FALLBACK_ENABLED and not args.no_fallback
+
+    if args.batch:
+        source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+        with source:
+            user_texts = [line.strip() for line in source if line.strip()]
+        try:
+            results = process_text_commands(user_texts, args.socket, fallback)
+        except (ConnectionError, TimeoutError) as e:
+            print(f"Ошибка: {e}", file=sys.stderr)
+            return 1
+        for result in results:
+            print(json.dumps(result, ensure_ascii=False, default=str))
+        return 0 if all(result["ok"] for result in results) else 1
+
+    if not args.text:
+        run_repl(args.socket, fallback, fallback_processor)
+        return 0
+    try:
+        print(process_text_command(" ".join(args.text), on_event=_print_progress if args.stream else None,
+                                   socket_path=args.socket, fallback=fallback,
+                                   fallback_processor=fallback_processor))
+    except (ConnectionError, TimeoutError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+# File: familiar_daemon.py
+# -*- coding: utf-8 -*-
+
+# Резидентный демон Фамильяра: единственный владелец ядра (familiar.process_text_command),
+# алиасов, кэшей и соединений с Ollama. Консольный клиент, разовые команды и Telegram-бот
+# подключаются к нему через Unix-сокет (протокол описан в familiar_client.py),
+# поэтому алиас, добавленный в одном фронтенде, сразу виден в остальных.
+# Запуск из корня проекта:
+#     python familiar_daemon.py [--socket /run/user/1000/familiar.sock]
+
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import familiar_client
+import familiar
+import command_dispatcher
+import fast_intent_router
+import nlu_processor
+import reminder_scheduler
+
+DAEMON_STATS = {"connections": 0, "commands": 0, "batches": 0, "failed": 0, "bad_requests": 0, "subscriptions": 0}
+# Сколько ждать подтверждения доставки напоминания от подписчика
+DELIVERY_ACK_TIMEOUT = float(os.environ.get('FAMILIAR_DELIVERY_ACK_TIMEOUT', 10.0))
+_stats_lock = threading.Lock()
+_started_at = time.time()
+
+
+def _count(key: str):
+    with _stats_lock:
+        DAEMON_STATS[key] += 1
+
+
+class _ClientConnection(socketserver.StreamRequestHandler):
+    """Одно соединение клиента: JSON-запросы построчно, ответы в том же порядке."""
+
+    def setup(self):
+        super().setup()
+        self._disconnected = False
+        self._write_lock = threading.Lock() # Напоминания пишет поток планировщика
+        self._subscription = None # (frontend, callback), если клиент подписан на напоминания
+        self._pending_acks = {} # id напоминания -> [threading.Event, доставлено]
+        _count("connections")
+
+    def finish(self):
+        if self._subscription is not None:
+            reminder_scheduler.unregister_delivery(*self._subscription)
+        for pending in list(self._pending_acks.values()):
+            pending[0].set() # Не держим поток планировщика до таймаута
+        super().finish()
+
+    def _send(self, message: dict) -> bool:
+        if self._disconnected:
+            return False
+        try:
+            with self._write_lock:
+                self.wfile.write(familiar_client.encode_message(message))
+                self.wfile.flush()
+            return True
+        except OSError:
+            # Клиент ушел; команду все равно доводим до конца (она могла уже начать выполняться)
+            self._disconnected = True
+            return False
+
+    def handle(self):
+        for raw_line in self.rfile:
+            if self._disconnected:
+                return
+            try:
+                request = json.loads(raw_line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+            except ValueError as e:
+                _count("bad_requests")
+                self._send({"event": "result", "ok": False, "error": "BAD_REQUEST", "response": str(e)})
+                continue
+
+            op = request.get("op")
+            if op == "ping":
+                self._send({"event": "result", "ok": True, "pid": os.getpid()})
+            elif op == "stats":
+                self._send({"event": "result", "ok": True, "stats": get_daemon_stats()})
+            elif op == "command":
+                self._handle_command(request)
+            elif op == "batch":
+                self._handle_batch(request)
+            elif op == "subscribe":
+                self._handle_subscribe(request)
+            elif op == "ack":
+                pending = self._pending_acks.get(request.get("id"))
+                if pending is not None:
+                    pending[1] = bool(request.get("ok", True))
+                    pending[0].set()
+            else:
+                _count("bad_requests")
+                self._send({"event": "result", "ok": False, "error": "UNKNOWN_OP", "response": f"Unknown op: {op}"})
+
+    def _handle_command(self, request: dict):
+        user_text = request.get("text")
+        if not isinstance(user_text, str) or not user_text.strip():
+            _count("bad_requests")
+            self._send({"event": "result", "ok": False, "error": "EMPTY_COMMAND", "response": "Пустая команда."})
+            return
+        _count("commands")
+        on_event = self._send if request.get("stream") else None
+        origin = request.get("origin") if isinstance(request.get("origin"), dict) else None
+        try:
+            response = familiar.process_text_command(user_text, on_event=on_event, origin=origin)
+        except Exception as e:
+            _count("failed")
+            print(f"[FAMILIAR_DAEMON][ERROR] Command '{user_text}' failed: {e}")
+            import traceback
+            traceback.print_exc()
+            self._send({"event": "result", "ok": False, "error": "INTERNAL_ERROR",
+                        "response": familiar_client.INTERNAL_ERROR_REPLY})
+            return
+        self._send({"event": "result", "ok": True, "response": response})
+
+    def _handle_batch(self, request: dict):
+        user_texts = request.get("texts")
+        max_parallel = request.get("max_parallel") or familiar.BATCH_PARALLELISM
+        if not isinstance(user_texts, list) or not isinstance(max_parallel, int):
+            _count("bad_requests")
+            self._send({"event": "result", "ok": False, "error": "BAD_REQUEST",
+                        "response": "'texts' must be a list and 'max_parallel' an integer."})
+            return
+        _count("batches")
+        try:
+            results = familiar.process_text_commands(user_texts, max_parallel=max_parallel)
+        except Exception as e:
+            _count("failed")
+            print(f"[FAMILIAR_DAEMON][ERROR] Batch of {len(user_texts)} commands failed: {e}")
+            import traceback
+            traceback.print_exc()
+            self._send({"event": "result", "ok": False, "error": "INTERNAL_ERROR",
+                        "response": familiar_client.INTERNAL_ERROR_REPLY})
+            return
+        self._send({"event": "result", "ok": True, "results": results})
+
+
+    def _handle_subscribe(self, request: dict):
+        """Подписка фронтенда на напоминания: соединение остается открытым, каждое срабатывание подтверждается ack."""
+        frontend = request.get("frontend")
+        if not isinstance(frontend, str) or not frontend or self._subscription is not None:
+            _count("bad_requests")
+            self._send({"event": "result", "ok": False, "error": "BAD_REQUEST",
+                        "response": "'frontend' must be a non-empty string (one subscription per connection)."})
+            return
+        _count("subscriptions")
+        self._send({"event": "result", "ok": True})
+        self._subscription = (frontend, self._deliver_reminder)
+        reminder_scheduler.register_delivery(frontend, self._deliver_reminder)
+        print(f"[FAMILIAR_DAEMON][INFO] Front end '{frontend}' subscribed to reminders.")
+
+    def _deliver_reminder(self, entry: dict) -> bool:
+        """Функция доставки для планировщика (его поток): событие подписчику и ожидание ack."""
+        pending = [threading.Event(), False]
+        self._pending_acks[entry["id"]] = pending
+        try:
+            if not self._send({"event": "reminder", "reminder": entry,
+                               "text": reminder_scheduler.format_reminder(entry)}):
+                return False
+            pending[0].wait(DELIVERY_ACK_TIMEOUT)
+            return pending[1]
+        finally:
+            self._pending_acks.pop(entry["id"], None)
+
+
+class FamiliarDaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True # Незавершенные соединения не мешают остановке
+
+
+def get_daemon_stats() -> dict:
+    """Счетчики демона и компонентов ядра, которые он держит в памяти."""
+    with _stats_lock:
+        stats = dict(DAEMON_STATS)
+    stats["pid"] = os.getpid()
+    stats["uptime_s"] = round(time.time() - _started_at, 1)
+    stats["aliases"] = len(command_dispatcher.get_aliases())
+    stats["router"] = fast_intent_router.get_router_stats()
+    stats["ollama"] = nlu_processor.get_connection_stats() if nlu_processor.requests is not None else None
+    try:
+        scheduler = reminder_scheduler.get_scheduler()
+        stats["reminders"] = dict(scheduler.stats, pending=scheduler.pending_count())
+    except reminder_scheduler.ReminderStoreBusy as e:
+        stats["reminders"] = {"error": str(e)}
+    return stats
+
+
+def _claim_socket_path(socket_path: str):
+    """Удаляет оставшийся от упавшего демона сокет; если демон уже работает - завершаемся."""
+    if not os.path.exists(socket_path):
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        print(f"[FAMILIAR_DAEMON][INFO] Removing stale socket {socket_path}")
+        os.unlink(socket_path)
+        return
+    finally:
+        probe.close()
+    raise SystemExit(f"[FAMILIAR_DAEMON][ERROR] Another daemon is already listening on {socket_path}")
+
+
+def serve(socket_path: str = familiar_client.SOCKET_PATH):
+    """Запускает демон и обслуживает клиентов до SIGTERM/SIGINT."""
+    _claim_socket_path(socket_path)
+    previous_umask = os.umask(0o177) # Сокет доступен только владельцу (он выполняет команды от его имени)
+    try:
+        server = FamiliarDaemonServer(socket_path, _ClientConnection)
+    finally:
+        os.umask(previous_umask)
+
+    # Демон живет долго: алиасы, модули обработчиков и схему NLU загружаем сразу,
+    # чтобы первая команда клиента не платила за них
+    command_dispatcher.get_aliases()
+    familiar.ensure_nlu_output_schema()
+    try:
+        reminder_scheduler.get_scheduler() # Просроченные за время простоя напоминания ждут подписчиков
+    except reminder_scheduler.ReminderStoreBusy as e:
+        # Консоль или бот, запущенные без демона, уже ведут хранилище; повторим при первой команде
+        print(f"[FAMILIAR_DAEMON][WARN] {e}. Перезапустите его как клиента демона.")
+    if nlu_processor.NLU_PROMPT_CACHE_ENABLED:
+        threading.Thread(target=nlu_processor.warm_up_nlu_prefix, daemon=True).start()
+
+    def request_shutdown(signum, frame):
+        print(f"[FAMILIAR_DAEMON][INFO] Signal {signum} received, shutting down...")
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+
+    print(f"[FAMILIAR_DAEMON][INFO] Listening on {socket_path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+        print("[FAMILIAR_DAEMON][INFO] Stopped.")
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Резидентный демон Фамильяра (Unix-сокет)")
+    parser.add_argument("--socket", default=familiar_client.SOCKET_PATH,
+                        help=f"Путь к сокету (по умолчанию {familiar_client.SOCKET_PATH}, env FAMILIAR_SOCKET)")
+    args = parser.parse_args(argv)
+    serve(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+# File: fast_intent_router.py
+# -*- coding: utf-8 -*-
+
+# Быстрый детерминированный маршрутизатор интентов.
+# Распознает самые частые формулировки команд по правилам, без обращения к LLM.
+# Возвращает тот же словарь {"intent": ..., "parameters": {...}}, что и
+# nlu_processor.extract_json_from_response, или None (тогда команда уходит в Ollama).
+
+import re
+import threading
+
+# --- Счетчики попаданий/промахов (чтобы видеть, сколько запросов к LLM мы экономим) ---
+ROUTER_STATS = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+# --- Словарь глаголов и фраз ---
+_OPEN_VERBS = ("открой", "открыть", "запусти", "запустить", "включи", "покажи", "разверни")
+_CLOSE_VERBS = ("закрой", "закрыть", "заверши", "завершить", "убей", "останови")
+# Необязательные слова между глаголом и именем приложения ("убей процесс firefox")
+_APP_FILLER_WORDS = ("процесс", "приложение", "программу", "мне", "пожалуйста")
+
+_SYSTEM_PATTERNS = [
+    ("reboot", re.compile(r"^(ребут|reboot|перезагрузка|перезагрузи(сь)?( (компьютер|комп|систему|пк))?)$")),
+    ("shutdown", re.compile(r"^(выключись|выключение|выключи (компьютер|комп|систему|пк))$")),
+    ("update", re.compile(r"^(обновись|обнови систему|обновление системы|обнови пакеты)$")),
+    ("uptime", re.compile(r"^(аптайм|uptime|время работы( системы)?|сколько (система|компьютер|комп) работает)$")),
+]
+
+# manage_job: "статус обновления", "как там обновление", "отмени обновление", "отмени задачу 3f9c2a1b"
+_JOB_ID = r"(?: (?P<job_id>[0-9a-f]{8}))?"
+_JOB_PATTERNS = [
+    ("status", re.compile(r"^(?:статус|прогресс|состояние) (?:обновления|задачи)" + _JOB_ID + r"$")),
+    ("status", re.compile(r"^(?:как там|как идет) (?:обновление|задача)" + _JOB_ID + r"$")),
+    ("cancel", re.compile(r"^(?:отмени|останови|прерви) (?:обновление|задачу)" + _JOB_ID + r"$")),
+]
+
+_SOUND_AMOUNT = r"(?: на (?P<amount>\d{1,3}) ?(?:%|процент(?:а|ов)?)| (?P<soft>немного|чуть-чуть|чуть|слегка))?"
+_SOUND_PATTERNS = [
+    ("up", re.compile(r"^(?:сделай )?(?:звук )?(?:по)?громче" + _SOUND_AMOUNT + r"$")),
+    ("up", re.compile(r"^(?:прибавь|увеличь) (?:звук|громкость)" + _SOUND_AMOUNT + r"$")),
+    ("down", re.compile(r"^(?:сделай )?(?:звук )?(?:по)?тише" + _SOUND_AMOUNT + r"$")),
+    ("down", re.compile(r"^(?:убавь|уменьши) (?:звук|громкость)" + _SOUND_AMOUNT + r"$")),
+    ("mute", re.compile(r"^(выключи звук|отключи звук|без звука|замьють)$")),
+    ("unmute", re.compile(r"^(включи звук|верни звук)$")),
+]
+
+_TIME_PATTERN = re.compile(r"^(который час|сколько времени|сколько сейчас времени|который сейчас час|время)$")
+
+# add_alias: "X это Y", "свяжи X и Y", "пусть X будет Y", "запомни X как Y"
+_ALIAS_LEAD = r"^(?:(?:запомни|сохрани)(?: у себя| себе)?,? )?"
+_ALIAS_PATTERNS = [
+    re.compile(_ALIAS_LEAD + r"(?P<e1>[^\s,]+) это (?P<e2>[^\s,]+)$"),
+    re.compile(r"^свяжи (?P<e1>[^\s,]+) и (?P<e2>[^\s,]+)$"),
+    re.compile(r"^пусть (?P<e1>[^\s,]+) будет (?P<e2>[^\s,]+)$"),
+    re.compile(r"^(?:запомни|сохрани) (?P<e1>[^\s,]+) как (?P<e2>[^\s,]+)$"),
+]
+
+# Хотя бы одна из сторон алиаса должна выглядеть как имя команды ("что это такое" - не алиас)
+_COMMAND_LIKE_RE = re.compile(r"^[a-z0-9][a-z0-9._+-]*$")
+
+# Составные команды: "открой хром и телеграм, и сделай потише" -> части по запятым и союзам
+_CLAUSE_SEPARATOR_RE = re.compile(r"\s*,\s*(?:(?:и|а)\s+)?(?:(?:потом|затем)\s+)?|\s+(?:и|а потом|потом|затем|а также)\s+")
+MAX_COMPOUND_CLAUSES = 4
+# Глагол, который наследуют перечисленные после него приложения ("открой хром и телеграм")
+_ACTION_VERBS = {"open": _OPEN_VERBS[0], "close": _CLOSE_VERBS[0]}
+
+_PUNCTUATION_RE = re.compile(r"[?!.;]+")
+_SPACES_RE = re.compile(r"\s+")
+
+# Окончания винительного падежа: "открой телегу" -> "телега"
+_ACCUSATIVE_ENDINGS = (("у", "а"), ("ю", "я"))
+
+
+def normalize_command_text(text: str) -> str:
+    """Приводит команду к нижнему регистру, убирает пунктуацию и лишние пробелы."""
+    text = text.lower().replace("ё", "е")
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip(" ,")
+
+
+def _resolve_app_word(app_text: str, aliases: dict) -> str | None:
+    """
+    Ищет имя приложения в лексиконе (ключи и значения APP_ALIASES).
+    Возвращает найденную форму (алиас или каноническое имя) или None.
+    """
+    if not app_text:
+        return None
+    known_names = set(aliases.keys()) | set(aliases.values())
+    if app_text in known_names:
+        return app_text
+    for ending, base_ending in _ACCUSATIVE_ENDINGS:
+        if app_text.endswith(ending):
+            candidate = app_text[:-len(ending)] + base_ending
+            if candidate in known_names:
+                return candidate
+    return None
+
+
+def _match_manage_app(text: str, aliases: dict) -> dict | None:
+    words = text.split(" ")
+    if len(words) < 2:
+        return None
+    verb = words[0]
+    if verb in _OPEN_VERBS:
+        action = "open"
+    elif verb in _CLOSE_VERBS:
+        action = "close"
+    else:
+        return None
+
+    rest = [w for w in words[1:] if w not in _APP_FILLER_WORDS]
+    app_name = _resolve_app_word(" ".join(rest), aliases)
+    if not app_name:
+        return None
+    return {"intent": "manage_app", "parameters": {"action": action, "app_name": app_name}}
+
+
+def _match_manage_system(text: str) -> dict | None:
+    for action, pattern in _SYSTEM_PATTERNS:
+        if pattern.match(text):
+            return {"intent": "manage_system", "parameters": {"action": action}}
+    return None
+
+
+def _match_manage_job(text: str) -> dict | None:
+    for action, pattern in _JOB_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            parameters = {"action": action}
+            if match.group("job_id"):
+                parameters["job_id"] = match.group("job_id")
+            return {"intent": "manage_job", "parameters": parameters}
+    return None
+
+
+def _match_manage_sound(text: str) -> dict | None:
+    for action, pattern in _SOUND_PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+        parameters = {"action": action}
+        groups = match.groupdict()
+        if groups.get("amount"):
+            parameters["amount"] = f"{groups['amount']}%"
+        elif groups.get("soft"):
+            parameters["amount"] = "немного"
+        return {"intent": "manage_sound", "parameters": parameters}
+    return None
+
+
+def _match_ask_time(text: str) -> dict | None:
+    if _TIME_PATTERN.match(text):
+        return {"intent": "ask_time", "parameters": {}}
+    return None
+
+
+def _match_add_alias(text: str) -> dict | None:
+    for pattern in _ALIAS_PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+        entity1, entity2 = match.group("e1"), match.group("e2")
+        if not (_COMMAND_LIKE_RE.match(entity1) or _COMMAND_LIKE_RE.match(entity2)):
+            return None
+        return {"intent": "add_alias", "parameters": {"entity1": entity1, "entity2": entity2}}
+    return None
+
+
+def _match_single(text: str, aliases: dict) -> dict | None:
+    # Порядок важен: "выключи звук" - это manage_sound, а не manage_app/manage_system
+    return (_match_manage_sound(text)
+            or _match_manage_system(text)
+            or _match_manage_job(text)
+            or _match_ask_time(text)
+            or _match_add_alias(text)
+            or _match_manage_app(text, aliases))
+
+
+def _match_compound(text: str, aliases: dict) -> dict | None:
+    """
+    Составная команда: каждая часть должна распознаться по правилам, иначе - None (пусть решает LLM).
+    Часть без глагола наследует действие предыдущей команды manage_app ("открой хром и телеграм").
+    """
+    clauses = [clause for clause in _CLAUSE_SEPARATOR_RE.split(text) if clause]
+    if not 2 <= len(clauses) <= MAX_COMPOUND_CLAUSES:
+        return None
+    intents = []
+    inherited_action = None
+    for clause in clauses:
+        result = _match_single(clause, aliases)
+        if result is None and inherited_action is not None:
+            result = _match_manage_app(f"{_ACTION_VERBS[inherited_action]} {clause}", aliases)
+        if result is None:
+            return None
+        inherited_action = result["parameters"]["action"] if result["intent"] == "manage_app" else None
+        intents.append(result)
+    return {"intents": intents}
+
+
+def looks_compound(user_text: str) -> bool:
+    """Есть ли в команде разделители частей (запятая, "и", "потом"...) - возможно, составная."""
+    return len(_CLAUSE_SEPARATOR_RE.split(normalize_command_text(user_text or ""))) >= 2
+
+
+def route_command(user_text: str, aliases: dict | None = None, record_stats: bool = True) -> dict | None:
+    """
+    Пытается распознать команду по правилам.
+
+    Args:
+        user_text (str): Исходный текст команды пользователя.
+        aliases (dict | None): Словарь алиасов (используется как лексикон имен приложений).
+        record_stats (bool): Учитывать ли вызов в ROUTER_STATS (False - для предварительной
+                             классификации, например, при выборе приоритета в очереди).
+
+    Returns:
+        dict | None: {"intent": ..., "parameters": {...}}, для составной команды -
+                     {"intents": [...]}, или None, если правило не найдено.
+    """
+    text = normalize_command_text(user_text or "")
+    aliases = aliases or {}
+
+    result = None
+    if text:
+        result = _match_single(text, aliases) or _match_compound(text, aliases)
+
+    if not record_stats:
+        return result
+
+    with _stats_lock:
+        ROUTER_STATS["hits" if result else "misses"] += 1
+
+    if result:
+        print(f"[FAST_ROUTER][INFO] Hit for '{user_text}': {result}")
+    else:
+        print(f"[FAST_ROUTER][DEBUG] Miss for '{user_text}', falling back to LLM.")
+    return result
+
+
+def get_router_stats() -> dict:
+    """Возвращает копию счетчиков и долю команд, обработанных без LLM."""
+    with _stats_lock:
+        stats = dict(ROUTER_STATS)
+    total = stats["hits"] + stats["misses"]
+    stats["total"] = total
+    stats["hit_rate"] = round(stats["hits"] / total, 3) if total else 0.0
+    return stats
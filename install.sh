@@ -39,6 +39,20 @@ echo "Рабочая директория проекта: ${PROJECT_DIR}"
 echo "Имя пользователя для сервиса: ${CURRENT_USER}" # Display the detected user
 echo "Путь к Python 3: ${PYTHON_PATH}"
 
+# --- Optional Python dependencies (not vendored in the repo) ---
+# python-xlib: native window activation (actions/x11_windows.py), otherwise wmctrl/xdotool
+# pulsectl: persistent PulseAudio/PipeWire connection (actions/volume_action.py), otherwise pactl
+MISSING_OPTIONAL=""
+for module_and_package in "Xlib:python-xlib" "pulsectl:pulsectl"; do
+    if ! sudo -u "$CURRENT_USER" "$PYTHON_PATH" -c "import ${module_and_package%%:*}" 2>/dev/null; then
+        MISSING_OPTIONAL="${MISSING_OPTIONAL} ${module_and_package##*:}"
+    fi
+done
+if [ -n "$MISSING_OPTIONAL" ]; then
+    echo "Необязательные пакеты Python не установлены:${MISSING_OPTIONAL}"
+    echo "Без них используются wmctrl/xdotool и pactl. Установить: sudo -u ${CURRENT_USER} ${PYTHON_PATH} -m pip install --user${MISSING_OPTIONAL}"
+fi
+
 # --- Get Telegram Bot Token ---
 # Check if token already exists in env file to avoid asking again unnecessarily
 EXISTING_TOKEN=$(grep '^TELEGRAM_BOT_TOKEN=' "$ENV_FILE" 2>/dev/null | cut -d '=' -f2-)
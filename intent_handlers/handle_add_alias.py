@@ -2,11 +2,23 @@
 # -*- coding: utf-8 -*-
 
 import utils
-import shutil # Для shutil.which
+import executable_index
+import app_name_resolver # Нечеткий поиск команды при опечатке
 
 # Список стоп-слов для алиасов (можно вынести в utils или config, если будет расти)
 INVALID_ALIAS_WORDS = {'сохрани', 'запомни', 'свяжи', 'пусть', 'себе', 'у', 'это', 'для', 'будет', 'на', 'мне'}
 
+# Схема поля "parameters" для NLU (JSON Schema): псевдоним и команда в любом порядке
+PARAMETERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "entity1": {"type": "string", "minLength": 1, "maxLength": 40},
+        "entity2": {"type": "string", "minLength": 1, "maxLength": 40},
+    },
+    "required": ["entity1", "entity2"],
+    "additionalProperties": False,
+}
+
 def handle(parameters: dict, aliases: dict) -> dict:
     """
     Обрабатывает интент add_alias: добавляет псевдоним для приложения
@@ -43,8 +55,20 @@ def handle(parameters: dict, aliases: dict) -> dict:
     entity2_lower = entity2.lower()
 
     # Определяем, что является командой, а что псевдонимом
-    entity1_is_command = shutil.which(entity1_lower) is not None
-    entity2_is_command = shutil.which(entity2_lower) is not None
+    entity1_is_command = executable_index.get_executable_index().exists(entity1_lower)
+    entity2_is_command = executable_index.get_executable_index().exists(entity2_lower)
+
+    if not entity1_is_command and not entity2_is_command:
+        # Возможно, команда названа с опечаткой ("telegram-deskop") - ищем похожую в PATH
+        resolver = app_name_resolver.get_app_name_resolver()
+        matches = [resolver.resolve(entity, sources=(app_name_resolver.SOURCE_EXECUTABLE,))
+                   for entity in (entity1_lower, entity2_lower)]
+        if matches[0] and not matches[1]:
+            print(f"[HANDLER_ADD_ALIAS][INFO] Fuzzy match for '{entity1}': {matches[0]}")
+            entity1_lower, entity1_is_command = matches[0]["command"], True
+        elif matches[1] and not matches[0]:
+            print(f"[HANDLER_ADD_ALIAS][INFO] Fuzzy match for '{entity2}': {matches[1]}")
+            entity2_lower, entity2_is_command = matches[1]["command"], True
 
     app_name_command = None
     alias_name = None
@@ -111,15 +135,20 @@ def handle(parameters: dict, aliases: dict) -> dict:
     
     print(f"[HANDLER_ADD_ALIAS][INFO] Alias operation in memory successful: {util_message}")
 
-    # Сохраняем измененный словарь aliases в файл
-    save_success, save_message = utils.save_aliases(aliases)
+    # Определяем, был ли алиас новым или уже существовал
+    alias_already_existed = "уже существует" in util_message.lower() # Проверяем сообщение от utils.add_alias
+    if alias_already_existed:
+        save_success, save_message = True, "Nothing to save"
+    else:
+        # Сохраняем только изменившуюся запись (одна строка в журнале, а не перезапись всего файла)
+        save_success, save_message = utils.save_alias_entry(alias_name, app_name_command, aliases)
+        app_name_resolver.get_app_name_resolver().add_alias(alias_name, app_name_command)
 
     if save_success:
-        print("[HANDLER_ADD_ALIAS][INFO] Aliases saved successfully to file and updated in memory.")
-        # Определяем message_code в зависимости от того, был ли алиас новым или уже существовал
+        print("[HANDLER_ADD_ALIAS][INFO] Alias saved to the journal and updated in memory.")
         final_message_code = "ALIAS_ADDED_SUCCESS"
         final_user_hint = f"Псевдоним '{alias_name}' для '{app_name_command}' добавлен"
-        if "уже существует" in util_message.lower(): # Проверяем сообщение от utils.add_alias
+        if alias_already_existed:
             final_message_code = "ALIAS_EXISTED_SAME_COMMAND"
             final_user_hint = f"Псевдоним '{alias_name}' для '{app_name_command}' уже был"
         
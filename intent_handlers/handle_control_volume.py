@@ -0,0 +1,93 @@
+# File: intent_handlers/handle_control_volume.py
+# -*- coding: utf-8 -*-
+
+from actions import volume_action
+
+# Схема поля "parameters" для NLU (JSON Schema)
+PARAMETERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["up", "down", "mute", "unmute"]},
+        "amount": {"type": "string", "maxLength": 16},
+    },
+    "required": ["action"],
+    "additionalProperties": False,
+}
+
+
+def handle(parameters: dict, aliases: dict) -> dict:
+    """
+    Обрабатывает интент manage_sound: меняет громкость или выключает/включает звук
+    (см. actions/volume_action.py) и возвращает СТРУКТУРИРОВАННЫЙ СЛОВАРЬ с результатом.
+
+    Args:
+        parameters (dict): Словарь с параметрами от NLU ('action', необязательный 'amount': "20%", "немного").
+        aliases (dict): Словарь с алиасами (здесь не используется, но принимается для унификации).
+
+    Returns:
+        dict: Структурированный словарь с результатом операции.
+    """
+    action = parameters.get("action")
+    amount = parameters.get("amount")
+    intent_name = "manage_sound"
+
+    print(f"[HANDLER_VOLUME][INFO] Handling '{intent_name}' with action: '{action}', amount: '{amount}'")
+
+    response = {
+        "status": "error",
+        "intent": intent_name,
+        "action_performed": action or "unknown",
+        "message_code": "ERROR_UNKNOWN_SOUND_ACTION",
+        "user_message_hint": f"Неизвестное действие со звуком: '{action}'",
+        "data": {},
+        "error_details": {"type": "UnknownAction", "message": f"Action '{action}' is not defined for intent '{intent_name}'"},
+    }
+
+    deferred_failure = volume_action.take_deferred_failure()
+    if deferred_failure is not None:
+        # Конец прошлой серии "громче"/"тише" не записался, а пользователь услышал, что все в порядке:
+        # сообщаем об этом вместо новой команды - уровень сейчас не тот, от которого она считалась бы
+        print(f"[HANDLER_VOLUME][WARN] Previous deferred volume change failed: {deferred_failure}")
+        response.update(message_code="ERROR_VOLUME_PREVIOUS_CHANGE_FAILED",
+                        user_message_hint=f"Не удалось установить громкость {deferred_failure['volume']}%",
+                        data={"volume": deferred_failure["volume"]},
+                        error_details={"type": "VolumeBackendError", "message": deferred_failure["error"]})
+
+    elif action in ("up", "down"):
+        step = volume_action.normalize_amount(amount)
+        if step is None:
+            print(f"[HANDLER_VOLUME][WARN] Cannot normalize amount '{amount}'.")
+            response.update(message_code="ERROR_VOLUME_AMOUNT_INVALID",
+                            user_message_hint=f"Не понял, на сколько менять громкость: '{amount}'",
+                            data={"amount": str(amount)},
+                            error_details={"type": "InvalidAmount", "message": str(amount)})
+            return response
+        success, result = volume_action.change_volume(action, step)
+        if success:
+            # Уровень уже на пределе: "громче" при 100% ничего не меняет
+            at_limit = result["volume"] == result["volume_before"]
+            if action == "up":
+                message_code = "VOLUME_AT_MAX" if at_limit else "VOLUME_UP"
+            else:
+                message_code = "VOLUME_AT_MIN" if at_limit else "VOLUME_DOWN"
+            response.update(status="success", message_code=message_code,
+                            user_message_hint=f"Громкость {result['volume']}%", data=result, error_details={})
+        else:
+            response.update(message_code="ERROR_VOLUME_CHANGE_FAILED", user_message_hint="Не удалось изменить громкость",
+                            error_details={"type": "VolumeBackendError", "message": result})
+
+    elif action in ("mute", "unmute"):
+        success, result = volume_action.set_mute(action == "mute")
+        if success:
+            response.update(status="success", message_code="VOLUME_MUTED" if action == "mute" else "VOLUME_UNMUTED",
+                            user_message_hint=result, error_details={})
+        else:
+            response.update(message_code="ERROR_VOLUME_MUTE_FAILED",
+                            user_message_hint="Не удалось выключить звук" if action == "mute" else "Не удалось включить звук",
+                            error_details={"type": "VolumeBackendError", "message": result})
+
+    else:
+        print(f"[HANDLER_VOLUME][ERROR] Unknown action '{action}' for intent '{intent_name}'.")
+
+    print(f"[HANDLER_VOLUME][DEBUG] Returning structured response: {response}")
+    return response
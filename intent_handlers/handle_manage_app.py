@@ -1,13 +1,27 @@
 # File: intent_handlers/handle_manage_app.py
 # -*- coding: utf-8 -*-
 
-import shutil # Для shutil.which
+import executable_index
+import app_name_resolver # Нечеткий поиск имени приложения
+import desktop_entry_index # Установленные приложения по .desktop-файлам
 import time   # Для time.sleep
 
 # Используем относительный импорт для доступа к соседней папке actions
 from actions import manage_app_action
 from actions import close_app_action
 
+# Схема поля "parameters" для NLU (JSON Schema). Из нее command_dispatcher собирает
+# схему ответа модели, поэтому разрешенные действия и параметры описаны только здесь.
+PARAMETERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["open", "close"]},
+        "app_name": {"type": "string", "minLength": 1, "maxLength": 40},
+    },
+    "required": ["action", "app_name"],
+    "additionalProperties": False,
+}
+
 def handle(parameters: dict, aliases: dict) -> dict:
     """
     Обрабатывает интент manage_app: запускает, фокусирует или закрывает приложение
@@ -41,30 +55,67 @@ def handle(parameters: dict, aliases: dict) -> dict:
 
     # --- Нормализация имени и подготовка переменных ---
     canonical_name = aliases.get(app_name_raw.lower(), app_name_raw.lower())
+    resolved_match = None
+    desktop_index = desktop_entry_index.get_desktop_entry_index()
+    desktop_entry = None
+    app_display_name = canonical_name
+    launch_via_desktop_entry = False
+    running_pid = None
+    if action == "open":
+        running_pid = manage_app_action.find_running_process_pid(canonical_name)
+        if not running_pid and canonical_name not in aliases.values() and not executable_index.which(canonical_name):
+            # Имя не алиас, не команда и не запущенный процесс. Только для open: для close подставленное
+            # имя (WM_CLASS, хвост ID .desktop-записи, похожая команда) могло бы завершить чужой процесс.
+            # Сначала ищем среди установленных приложений (.desktop: "Калькулятор")
+            desktop_entry = desktop_index.lookup(app_name_raw)
+            if desktop_entry:
+                print(f"[HANDLER_MANAGE_APP][INFO] Desktop entry for '{app_name_raw}': {desktop_entry}")
+                canonical_name = desktop_entry["process_name"]
+                app_display_name = desktop_entry["name"] or canonical_name
+                launch_via_desktop_entry = True
+            else:
+                # Последняя попытка перед "не найдено" - нечеткий поиск ("Телеграмм", "Fire fox"):
+                # запущенное приложение не из PATH (AppImage, /opt) нельзя подменять похожей командой
+                resolved_match = app_name_resolver.get_app_name_resolver().resolve(app_name_raw, aliases)
+                if resolved_match:
+                    print(f"[HANDLER_MANAGE_APP][INFO] Fuzzy match for '{app_name_raw}': {resolved_match}")
+                    canonical_name = resolved_match["command"]
+                    app_display_name = canonical_name
+            if desktop_entry or resolved_match:
+                running_pid = manage_app_action.find_running_process_pid(canonical_name)
+    if desktop_entry is None:
+        # Для обычной команды .desktop-файл подскажет StartupWMClass ее окна
+        desktop_entry = desktop_index.lookup_by_command(canonical_name)
     print(f"[HANDLER_MANAGE_APP][INFO] Canonical app name: '{canonical_name}' (raw: '{app_name_raw}')")
 
     status_result = "error" # По умолчанию
     message_code_result = f"ERROR_UNKNOWN_APP_ACTION"
     user_message_hint_result = f"Неизвестное действие '{action}' для приложения '{canonical_name}'"
-    data_result = {"app_name": canonical_name, "app_name_raw": app_name_raw}
+    data_result = {"app_name": app_display_name, "app_name_raw": app_name_raw}
+    if resolved_match:
+        data_result["app_name_match_score"] = resolved_match["score"]
+    if desktop_entry:
+        data_result["desktop_entry"] = desktop_entry["desktop_id"]
     error_details_result = {"type": "UnknownAppAction", "message": f"Action '{action}' is not defined for app '{canonical_name}'"}
 
     # --- Логика для действия "open" ---
     if action == "open":
-        running_pid = manage_app_action.find_running_process_pid(canonical_name)
-
         if running_pid:
             # --- Сценарий 1: Приложение уже запущено ---
             print(f"[HANDLER_MANAGE_APP][INFO] App '{canonical_name}' is already running (PID: {running_pid}). Attempting to activate...")
             activation_succeeded, activation_code = manage_app_action.activate_window_by_class_or_pid(
-                window_class_or_name=canonical_name,
+                # StartupWMClass из .desktop точнее имени команды (telegram-desktop -> TelegramDesktop)
+                window_class_or_name=(desktop_entry or {}).get("wm_class") or canonical_name,
                 pid=running_pid
             )
 
             if activation_succeeded:
                 status_result = "success"
                 error_details_result = {}
-                if activation_code == "WMCTRL_ACTIVATED":
+                if activation_code == "X11_ACTIVATED":
+                    message_code_result = "APP_FOCUSED_EXISTING_X11"
+                    user_message_hint_result = f"Окно '{canonical_name}' активировано (X11)"
+                elif activation_code == "WMCTRL_ACTIVATED":
                     message_code_result = "APP_FOCUSED_EXISTING_WMCTRL"
                     user_message_hint_result = f"Окно '{canonical_name}' активировано (wmctrl)"
                 elif activation_code == "XDOTOL_ACTIVATED_FROM_PID":
@@ -97,11 +148,13 @@ def handle(parameters: dict, aliases: dict) -> dict:
         else:
             # --- Сценарий 2: Приложение НЕ запущено ---
             print(f"[HANDLER_MANAGE_APP][INFO] App '{canonical_name}' not found running. Attempting to launch...")
-            executable_path = shutil.which(canonical_name)
-            if executable_path:
-                print(f"[HANDLER_MANAGE_APP][INFO] Found executable: '{executable_path}'. Launching...")
+            executable_path = executable_index.which(canonical_name)
+            # Приложение, найденное по .desktop, запускаем его строкой Exec
+            launch_command = desktop_entry["exec"] if launch_via_desktop_entry else executable_path
+            if launch_command:
+                print(f"[HANDLER_MANAGE_APP][INFO] Found executable: '{launch_command}'. Launching...")
                 # --- ИЗМЕНЕНИЕ: Просто запускаем, НЕ пытаемся активировать сразу ---
-                launch_success = manage_app_action.run_application(executable_path)
+                launch_success = manage_app_action.run_application(launch_command)
                 if launch_success:
                     status_result = "success"
                     message_code_result = "APP_LAUNCHED_SUCCESSFULLY" # Новый код
@@ -112,19 +165,23 @@ def handle(parameters: dict, aliases: dict) -> dict:
                     status_result = "error"
                     message_code_result = "ERROR_APP_START_FAILED"
                     user_message_hint_result = f"Не удалось запустить '{canonical_name}'"
-                    error_details_result = {"type": "StartFailed", "message": f"manage_app_action.run_application failed for {executable_path}"}
+                    error_details_result = {"type": "StartFailed", "message": f"manage_app_action.run_application failed for {launch_command}"}
                 # --- КОНЕЦ ИЗМЕНЕНИЯ ---
             else:
                 # Приложение не найдено в системе
                 status_result = "error"
                 message_code_result = "ERROR_APP_NOT_FOUND_SYSTEM"
                 user_message_hint_result = f"Приложение '{canonical_name}' не найдено в системе"
-                error_details_result = {"type": "AppNotFoundSystem", "message": f"Executable for '{canonical_name}' not found via shutil.which"}
+                error_details_result = {"type": "AppNotFoundSystem", "message": f"Executable for '{canonical_name}' not found in PATH"}
 
     # --- Логика для действия "close" ---
     elif action == "close":
         print(f"[HANDLER_MANAGE_APP][INFO] Attempting to close '{canonical_name}'...")
-        close_success = close_app_action.close_application_by_name(canonical_name)
+        close_success, process_outcomes = close_app_action.close_application_by_name(canonical_name)
+        # Исход по каждому процессу группы (pid, name, outcome: terminated/killed/already_gone/access_denied/survived)
+        data_result["processes"] = process_outcomes
+        data_result["closed_count"] = sum(1 for item in process_outcomes if item["outcome"] != close_app_action.OUTCOME_SURVIVED
+                                          and item["outcome"] != close_app_action.OUTCOME_ACCESS_DENIED)
         if close_success:
             status_result = "success"
             message_code_result = "APP_CLOSE_COMMAND_SENT"
@@ -134,7 +191,7 @@ def handle(parameters: dict, aliases: dict) -> dict:
             status_result = "error"
             message_code_result = "ERROR_APP_CLOSE_FAILED_ACTIVE"
             user_message_hint_result = f"Не удалось закрыть '{canonical_name}' (возможно, нет прав)"
-            error_details_result = {"type": "CloseFailedActive", "message": f"close_app_action.close_application_by_name returned False for {canonical_name}"}
+            error_details_result = {"type": "CloseFailedActive", "message": f"close_app_action.close_application_by_name returned False for {canonical_name}: {process_outcomes}"}
 
     # --- Обработка неизвестного действия ---
     else:
@@ -0,0 +1,101 @@
+# File: intent_handlers/handle_manage_job.py
+# -*- coding: utf-8 -*-
+
+import job_manager
+
+# Схема поля "parameters" для NLU (JSON Schema)
+PARAMETERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["status", "cancel"]},
+        "job_id": {"type": "string", "pattern": "^[0-9a-f]{8}$", "maxLength": 8}, # maxLength - для оценки num_predict
+    },
+    "required": ["action"],
+    "additionalProperties": False,
+}
+
+# Код ответа на вопрос о состоянии задачи
+_STATUS_CODES = {
+    "queued": "JOB_STATUS_RUNNING",
+    "running": "JOB_STATUS_RUNNING",
+    "cancelling": "JOB_STATUS_CANCELLING",
+    "succeeded": "JOB_STATUS_SUCCEEDED",
+    "failed": "JOB_STATUS_FAILED",
+    "cancelled": "JOB_STATUS_CANCELLED",
+    "lost": "JOB_STATUS_LOST",
+}
+
+
+def _job_data(job: dict) -> dict:
+    """Поля задачи для шаблона ответа."""
+    return {
+        "job_id": job["job_id"],
+        "job_title": job.get("title", ""),
+        "state": job.get("state"),
+        "step_title": job.get("step_title", ""),
+        "progress": int(job.get("progress") or 0),
+        "status_message": job.get("status_message", ""),
+        "returncode": job.get("returncode"),
+    }
+
+
+def handle(parameters: dict, aliases: dict) -> dict:
+    """
+    Обрабатывает интент manage_job: состояние или отмена фоновой задачи (см. job_manager).
+    Без job_id берется последняя запущенная задача ("как там обновление?").
+
+    Args:
+        parameters (dict): Словарь с параметрами от NLU ('action', необязательный 'job_id').
+        aliases (dict): Словарь с алиасами (здесь не используется, но принимается для унификации).
+
+    Returns:
+        dict: Структурированный словарь с результатом операции.
+    """
+    action = parameters.get("action")
+    job_id = parameters.get("job_id")
+    intent_name = "manage_job"
+
+    print(f"[HANDLER_JOB][INFO] Handling '{intent_name}' with action: '{action}', job_id: '{job_id}'")
+
+    response = {
+        "status": "error",
+        "intent": intent_name,
+        "action_performed": action or "unknown",
+        "message_code": "ERROR_UNKNOWN_JOB_ACTION",
+        "user_message_hint": f"Неизвестное действие с задачей: '{action}'",
+        "data": {},
+        "error_details": {"type": "UnknownAction", "message": f"Action '{action}' is not defined for intent '{intent_name}'"},
+    }
+    if action not in ("status", "cancel"):
+        print(f"[HANDLER_JOB][ERROR] Unknown action '{action}' for intent '{intent_name}'.")
+        return response
+
+    job = job_manager.get_job(job_id) if job_id else job_manager.latest_job()
+    if job is None:
+        print(f"[HANDLER_JOB][WARN] Job '{job_id or 'latest'}' not found.")
+        response.update(message_code="ERROR_JOB_NOT_FOUND",
+                        user_message_hint="Такой фоновой задачи нет" if job_id else "Фоновых задач еще не было",
+                        data={"job_id": job_id or ""},
+                        error_details={"type": "JobNotFound", "message": f"No job '{job_id or 'latest'}'"})
+        return response
+
+    if action == "status":
+        response.update(status="success", message_code=_STATUS_CODES.get(job.get("state"), "JOB_STATUS_RUNNING"),
+                        user_message_hint=f"Состояние задачи: {job.get('state')}", data=_job_data(job),
+                        error_details={})
+    elif job.get("state") not in job_manager.ACTIVE_STATES:
+        response.update(status="success", message_code="JOB_ALREADY_FINISHED",
+                        user_message_hint="Задача уже завершена, отменять нечего", data=_job_data(job),
+                        error_details={})
+    else:
+        cancel_sent, job = job_manager.cancel_job(job["job_id"])
+        if cancel_sent:
+            response.update(status="success", message_code="JOB_CANCEL_REQUESTED",
+                            user_message_hint="Отмена задачи запрошена", data=_job_data(job), error_details={})
+        else:
+            response.update(message_code="ERROR_JOB_CANCEL_FAILED", user_message_hint="Не удалось отменить задачу",
+                            data=_job_data(job) if job else {"job_id": job_id or ""},
+                            error_details={"type": "CancelFailed", "message": "Job runner is not reachable"})
+
+    print(f"[HANDLER_JOB][DEBUG] Returning structured response: {response}")
+    return response
@@ -3,6 +3,16 @@
 
 from actions import manage_system_action # Используем относительный импорт
 
+# Схема поля "parameters" для NLU (JSON Schema)
+PARAMETERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"type": "string", "enum": ["reboot", "update", "shutdown", "uptime"]},
+    },
+    "required": ["action"],
+    "additionalProperties": False,
+}
+
 def handle(parameters: dict, aliases: dict) -> dict:
     """
     Обрабатывает интент manage_system: вызывает соответствующее действие
@@ -69,19 +79,23 @@ def handle(parameters: dict, aliases: dict) -> dict:
 
     elif action == "update":
         print("[HANDLER_SYS][INFO] Initiating system update process.")
-        action_success, action_message = manage_system_action.system_update()
+        # Обновление идет минутами: action-модуль запускает фоновую задачу и сразу возвращает ее запись
+        action_success, action_result = manage_system_action.system_update()
         if action_success:
             status_result = "success"
-            message_code_result = "SYSTEM_UPDATE_COMPLETED" # Или INITIATED, если процесс долгий и мы не ждем
-            user_message_hint_result = "Обновление системы завершено" # Или "запущено"
-            # action_message от system_update уже содержит подходящее сообщение
-            data_result = {"update_status_message": action_message}
+            if action_result.get("already_running"):
+                message_code_result = "SYSTEM_UPDATE_ALREADY_RUNNING"
+                user_message_hint_result = "Обновление системы уже идет"
+            else:
+                message_code_result = "SYSTEM_UPDATE_INITIATED"
+                user_message_hint_result = "Обновление системы запущено в фоне"
+            data_result = {"job_id": action_result["job_id"], "progress": int(action_result.get("progress") or 0)}
             error_details_result = {}
         else:
             message_code_result = "ERROR_SYSTEM_UPDATE_FAILED"
-            user_message_hint_result = "Ошибка при обновлении системы"
-            error_details_result = {"type": "UpdateFailed", "message": action_message}
-            data_result = {"update_status_message": action_message} # Можно передать сообщение об ошибке
+            user_message_hint_result = "Не удалось запустить обновление системы"
+            error_details_result = {"type": "UpdateFailed", "message": action_result}
+            data_result = {"update_status_message": action_result} # Можно передать сообщение об ошибке
 
     elif action == "uptime":
         print("[HANDLER_SYS][INFO] Getting system uptime.")
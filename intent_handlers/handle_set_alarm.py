@@ -0,0 +1,87 @@
+# File: intent_handlers/handle_set_alarm.py
+# -*- coding: utf-8 -*-
+
+import time
+
+import reminder_scheduler
+import time_parser
+
+# Схема поля "parameters" для NLU (JSON Schema)
+PARAMETERS_SCHEMA = {
+    "type": "object",
+    "properties": {"time_spec": {"type": "string", "minLength": 1, "maxLength": 30}},
+    "required": ["time_spec"],
+    "additionalProperties": False,
+}
+
+
+def handle(parameters: dict, aliases: dict) -> dict:
+    """
+    Обрабатывает интент set_alarm: ставит будильник в планировщик (reminder_scheduler)
+    и возвращает СТРУКТУРИРОВАННЫЙ СЛОВАРЬ с результатом.
+
+    Args:
+        parameters (dict): Словарь с параметрами от NLU ('time_spec').
+        aliases (dict): Словарь с алиасами (здесь не используется, но принимается для унификации).
+
+    Returns:
+        dict: Структурированный словарь с результатом операции.
+    """
+    intent_name = "set_alarm"
+    time_spec = (parameters.get("time_spec") or "").strip()
+
+    print(f"[HANDLER_ALARM][INFO] Handling '{intent_name}': time_spec '{time_spec}'")
+
+    response = {
+        "status": "error",
+        "intent": intent_name,
+        "action_performed": "set_alarm",
+        "message_code": "",
+        "user_message_hint": "",
+        "data": {"time_spec": time_spec},
+        "error_details": {},
+    }
+    if not time_spec:
+        print(f"[HANDLER_ALARM][ERROR] Missing time_spec in parameters.")
+        response.update(message_code="ERROR_ALARM_PARAMS_MISSING", user_message_hint="Не указано время будильника",
+                        error_details={"type": "ParameterMissing", "message": "time_spec is missing"})
+        return response
+
+    parsed = time_parser.parse_time_spec(time_spec)
+    if parsed is None:
+        print(f"[HANDLER_ALARM][WARN] Cannot resolve time_spec '{time_spec}'.")
+        response.update(message_code="ERROR_TIME_SPEC_UNRECOGNIZED",
+                        user_message_hint=f"Не понял время будильника: '{time_spec}'",
+                        error_details={"type": "TimeSpecUnrecognized", "message": time_spec})
+        return response
+    now = time.time()
+    due = parsed["datetime"].timestamp()
+    if due <= now:
+        response.update(message_code="ERROR_TIME_IN_PAST", user_message_hint="Это время уже прошло",
+                        error_details={"type": "TimeInPast", "message": time_spec})
+        return response
+
+    try:
+        entry = reminder_scheduler.get_scheduler().add("alarm", due, origin=parameters.get("_origin"),
+                                                        time_spec=time_spec)
+    except reminder_scheduler.ReminderStoreBusy as e:
+        # Без демона напоминания ведет первый запущенный фронтенд (консоль или бот)
+        print(f"[HANDLER_ALARM][WARN] Reminder store is owned by another process: {e}")
+        response.update(message_code="ERROR_REMINDER_STORE_BUSY", user_message_hint=str(e),
+                        error_details={"type": "ReminderStoreBusy", "message": str(e)})
+        return response
+    except OSError as e:
+        print(f"[HANDLER_ALARM][ERROR] Cannot save alarm: {e}")
+        response.update(message_code="ERROR_REMINDER_SAVE_FAILED", user_message_hint="Не удалось сохранить будильник",
+                        error_details={"type": "SaveFailed", "message": str(e)})
+        return response
+
+    response.update(status="success", message_code="ALARM_SET", user_message_hint="Будильник поставлен")
+    response["data"].update(reminder_id=entry["id"], due_at=due, time_human=reminder_scheduler.format_due(due, now))
+    if parsed["ambiguous"]:
+        # "в 7" - 07:00 или 19:00: ставим вероятный вариант и называем другой, чтобы пользователь мог поправить
+        alternative = parsed["alternatives"][0].timestamp()
+        response.update(message_code="ALARM_SET_ASSUMED", user_message_hint="Будильник поставлен; время понято неоднозначно")
+        response["data"].update(alternative_human=reminder_scheduler.format_due(alternative, now))
+    print(f"[HANDLER_ALARM][DEBUG] Returning structured response: {response}")
+    return response
@@ -0,0 +1,93 @@
+# File: intent_handlers/handle_set_reminder.py
+# -*- coding: utf-8 -*-
+
+import time
+
+import reminder_scheduler
+import time_parser
+
+# Схема поля "parameters" для NLU (JSON Schema)
+PARAMETERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reminder_text": {"type": "string", "minLength": 1, "maxLength": 60},
+        "time_spec": {"type": "string", "minLength": 1, "maxLength": 30},
+    },
+    "required": ["reminder_text", "time_spec"],
+    "additionalProperties": False,
+}
+
+
+def handle(parameters: dict, aliases: dict) -> dict:
+    """
+    Обрабатывает интент set_reminder: ставит напоминание в планировщик (reminder_scheduler)
+    и возвращает СТРУКТУРИРОВАННЫЙ СЛОВАРЬ с результатом. Напоминание придет во фронтенд,
+    из которого пришла команда (parameters["_origin"], его добавляет диспетчер).
+
+    Args:
+        parameters (dict): Словарь с параметрами от NLU ('reminder_text', 'time_spec').
+        aliases (dict): Словарь с алиасами (здесь не используется, но принимается для унификации).
+
+    Returns:
+        dict: Структурированный словарь с результатом операции.
+    """
+    intent_name = "set_reminder"
+    reminder_text = (parameters.get("reminder_text") or "").strip()
+    time_spec = (parameters.get("time_spec") or "").strip()
+
+    print(f"[HANDLER_REMINDER][INFO] Handling '{intent_name}': text '{reminder_text}', time_spec '{time_spec}'")
+
+    response = {
+        "status": "error",
+        "intent": intent_name,
+        "action_performed": "set_reminder",
+        "message_code": "",
+        "user_message_hint": "",
+        "data": {"reminder_text": reminder_text, "time_spec": time_spec},
+        "error_details": {},
+    }
+    if not reminder_text or not time_spec:
+        print(f"[HANDLER_REMINDER][ERROR] Missing reminder_text or time_spec in parameters.")
+        response.update(message_code="ERROR_REMINDER_PARAMS_MISSING",
+                        user_message_hint="Не указано, о чем и когда напомнить",
+                        error_details={"type": "ParameterMissing", "message": "reminder_text or time_spec is missing"})
+        return response
+
+    parsed = time_parser.parse_time_spec(time_spec)
+    if parsed is None:
+        print(f"[HANDLER_REMINDER][WARN] Cannot resolve time_spec '{time_spec}'.")
+        response.update(message_code="ERROR_TIME_SPEC_UNRECOGNIZED",
+                        user_message_hint=f"Не понял, когда напомнить: '{time_spec}'",
+                        error_details={"type": "TimeSpecUnrecognized", "message": time_spec})
+        return response
+    now = time.time()
+    due = parsed["datetime"].timestamp()
+    if due <= now:
+        response.update(message_code="ERROR_TIME_IN_PAST", user_message_hint="Это время уже прошло",
+                        error_details={"type": "TimeInPast", "message": time_spec})
+        return response
+
+    try:
+        entry = reminder_scheduler.get_scheduler().add("reminder", due, reminder_text,
+                                                        origin=parameters.get("_origin"), time_spec=time_spec)
+    except reminder_scheduler.ReminderStoreBusy as e:
+        # Без демона напоминания ведет первый запущенный фронтенд (консоль или бот)
+        print(f"[HANDLER_REMINDER][WARN] Reminder store is owned by another process: {e}")
+        response.update(message_code="ERROR_REMINDER_STORE_BUSY", user_message_hint=str(e),
+                        error_details={"type": "ReminderStoreBusy", "message": str(e)})
+        return response
+    except OSError as e:
+        print(f"[HANDLER_REMINDER][ERROR] Cannot save reminder: {e}")
+        response.update(message_code="ERROR_REMINDER_SAVE_FAILED", user_message_hint="Не удалось сохранить напоминание",
+                        error_details={"type": "SaveFailed", "message": str(e)})
+        return response
+
+    response.update(status="success", message_code="REMINDER_SET", user_message_hint="Напоминание поставлено")
+    response["data"].update(reminder_id=entry["id"], due_at=due, time_human=reminder_scheduler.format_due(due, now))
+    if parsed["ambiguous"]:
+        # "в 7" - 07:00 или 19:00: ставим вероятный вариант и называем другой, чтобы пользователь мог поправить
+        alternative = parsed["alternatives"][0].timestamp()
+        response.update(message_code="REMINDER_SET_ASSUMED", user_message_hint="Напоминание поставлено; время понято неоднозначно")
+        response["data"].update(alternative_human=reminder_scheduler.format_due(alternative, now))
+    print(f"[HANDLER_REMINDER][DEBUG] Returning structured response: {response}")
+    return response
@@ -0,0 +1,343 @@
+# File: job_manager.py
+# -*- coding: utf-8 -*-
+
+# Фоновые задачи для долгих системных действий (обновление системы).
+# Обработчик не ждет минутами: start_job() сразу возвращает запись задачи с job_id,
+# а шаги выполняет отдельный процесс-исполнитель (python job_manager.py run <job_id>)
+# в своей сессии, поэтому перезапуск консоли, демона или Telegram-бота его не прерывает.
+#
+# Состояние задачи - JSON-файл config/jobs/<job_id>.json (атомарная запись), вывод
+# команд - config/jobs/<job_id>.log. Пишет запись только исполнитель; фронтенд меняет
+# ее лишь тогда, когда исполнителя уже нет (задача "потеряна").
+# Прогресс apt берется из строк статуса (-o APT::Status-Fd=1):
+#     dlstatus:<n>:<процент>:<описание>   pmstatus:<пакет>:<процент>:<описание>
+
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import utils
+
+JOBS_DIR = os.path.join(utils.CONFIG_DIR, 'jobs')
+# Сколько завершенных задач хранить (старые удаляются при запуске новой)
+JOB_HISTORY_LIMIT = int(os.environ.get('FAMILIAR_JOB_HISTORY', 20))
+# Как часто исполнитель сохраняет прогресс (запись с fsync на каждую строку apt - лишнее)
+PROGRESS_WRITE_INTERVAL = float(os.environ.get('FAMILIAR_JOB_PROGRESS_INTERVAL', 1.0))
+# Задача, чей исполнитель так и не отметился за это время, считается потерянной
+START_TIMEOUT = 30.0
+
+ACTIVE_STATES = ("queued", "running", "cancelling")
+FINISHED_STATES = ("succeeded", "failed", "cancelled", "lost")
+
+# "pmstatus:firefox:42.8571:Installing firefox (amd64)"
+_APT_STATUS_RE = re.compile(r"^(?P<kind>dlstatus|pmstatus|pmerror|pmconffile|media-change):"
+                            r"(?P<item>[^:]*):(?P<percent>[\d.]+):(?P<message>.*)$")
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{8}$")
+
+_store_lock = threading.RLock()
+
+
+# --- Хранилище записей ---
+
+def _job_path(job_id: str, suffix: str = ".json") -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}{suffix}")
+
+
+def _read_record(job_id: str) -> dict | None:
+    try:
+        with open(_job_path(job_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[JOBS][WARN] Cannot read job record {job_id}: {e}")
+        return None
+
+
+def _write_record(record: dict):
+    utils.atomic_write_json(_job_path(record["job_id"]), record)
+
+
+def _process_start_time(pid: int) -> float | None:
+    """Время создания процесса (psutil) или None, если процесса нет."""
+    import psutil # Нужен только для проверки живости исполнителя
+    try:
+        return psutil.Process(pid).create_time()
+    except psutil.Error:
+        return None
+
+
+def _runner_alive(record: dict) -> bool:
+    """Жив ли исполнитель задачи: pid существует и это тот же процесс (create_time совпадает)."""
+    pid = record.get("pid")
+    if not pid:
+        return False
+    create_time = _process_start_time(pid)
+    return create_time is not None and abs(create_time - (record.get("pid_create_time") or 0)) < 1.0
+
+
+def _check_lost(record: dict) -> dict:
+    """Помечает активную задачу без живого исполнителя как потерянную (исполнитель упал, ОС перезагружалась)."""
+    if record.get("state") not in ACTIVE_STATES:
+        return record
+    if record.get("pid") is None:
+        if time.time() - record.get("created_at", 0) < START_TIMEOUT:
+            return record # Исполнитель еще стартует
+    elif _runner_alive(record):
+        return record
+    with _store_lock:
+        current = _read_record(record["job_id"]) or record
+        if current.get("state") not in ACTIVE_STATES:
+            return current # Исполнитель успел завершить задачу сам
+        current.update(state="lost", finished_at=time.time(),
+                       status_message="Процесс задачи завершился, не сохранив результат.")
+        _write_record(current)
+    print(f"[JOBS][WARN] Job {current['job_id']} lost its runner (pid {current.get('pid')}).")
+    return current
+
+
+def get_job(job_id: str) -> dict | None:
+    """Запись задачи по id (с проверкой живости исполнителя) или None."""
+    if not job_id or not _JOB_ID_RE.match(job_id):
+        return None
+    record = _read_record(job_id)
+    return _check_lost(record) if record else None
+
+
+def list_jobs(kind: str | None = None) -> list[dict]:
+    """Все задачи (новые первыми), при необходимости - только одного вида."""
+    try:
+        names = os.listdir(JOBS_DIR)
+    except FileNotFoundError:
+        return []
+    records = []
+    for name in names:
+        job_id, ext = os.path.splitext(name)
+        if ext != ".json" or not _JOB_ID_RE.match(job_id):
+            continue
+        record = _read_record(job_id)
+        if record and (kind is None or record.get("kind") == kind):
+            records.append(_check_lost(record))
+    records.sort(key=lambda record: record.get("created_at", 0), reverse=True)
+    return records
+
+
+def latest_job(kind: str | None = None) -> dict | None:
+    """Последняя запущенная задача (для "как там обновление?" без id)."""
+    jobs = list_jobs(kind)
+    return jobs[0] if jobs else None
+
+
+def find_active_job(kind: str) -> dict | None:
+    """Незавершенная задача этого вида, если есть."""
+    return next((job for job in list_jobs(kind) if job.get("state") in ACTIVE_STATES), None)
+
+
+def _prune_history():
+    finished = [job for job in list_jobs() if job.get("state") in FINISHED_STATES]
+    for job in finished[JOB_HISTORY_LIMIT:]:
+        for suffix in (".json", ".log"):
+            try:
+                os.unlink(_job_path(job["job_id"], suffix))
+            except FileNotFoundError:
+                pass
+
+
+# --- Запуск и отмена (вызываются из обработчиков) ---
+
+def start_job(kind: str, title: str, steps: list[dict]) -> dict:
+    """
+    Создает задачу и запускает ее исполнитель в отдельной сессии. Не ждет выполнения.
+
+    Args:
+        kind (str): Вид задачи ("system_update"), по нему ищется "последняя задача".
+        title (str): Название для ответов пользователю.
+        steps (list[dict]): Шаги по порядку: {"name": ..., "title": ..., "argv": [...]}.
+                            Шаг с ненулевым кодом возврата завершает задачу ошибкой.
+
+    Returns:
+        dict: Запись задачи (state "queued").
+
+    Raises:
+        OSError: Не удалось сохранить запись или запустить исполнитель.
+    """
+    job_id = uuid.uuid4().hex[:8]
+    record = {
+        "job_id": job_id,
+        "kind": kind,
+        "title": title,
+        "state": "queued",
+        "steps": steps,
+        "step_index": 0,
+        "step_title": steps[0]["title"] if steps else "",
+        "progress": 0.0,
+        "status_message": "",
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "pid": None,
+        "pid_create_time": None,
+        "returncode": None,
+        "log_path": _job_path(job_id, ".log"),
+    }
+    with _store_lock:
+        _prune_history()
+        _write_record(record)
+    with open(record["log_path"], 'ab') as log_file:
+        runner = subprocess.Popen([sys.executable, os.path.abspath(__file__), "run", job_id],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  stdin=subprocess.DEVNULL, stdout=log_file, stderr=log_file,
+                                  start_new_session=True) # Сигналы терминала и фронтенда его не касаются
+    # Забираем код завершения, чтобы упавший исполнитель не висел зомби (и не казался живым)
+    threading.Thread(target=runner.wait, daemon=True).start()
+    print(f"[JOBS][INFO] Started job {job_id} ({kind}): {len(steps)} step(s).")
+    return record
+
+
+def cancel_job(job_id: str) -> tuple[bool, dict | None]:
+    """
+    Просит исполнитель остановить задачу (SIGTERM). Загрузку и обновление списков
+    исполнитель прерывает сразу, а установку пакетов (dpkg) доводит до конца шага,
+    чтобы не оставить систему наполовину обновленной.
+
+    Returns:
+        tuple[bool, dict | None]: (запрос отправлен, актуальная запись задачи).
+    """
+    record = get_job(job_id)
+    if record is None or record.get("state") not in ACTIVE_STATES:
+        return False, record
+    if record.get("pid") is None or not _runner_alive(record):
+        return False, record # Исполнитель еще не стартовал или уже исчез
+    try:
+        os.kill(record["pid"], signal.SIGTERM)
+    except ProcessLookupError:
+        return False, _check_lost(record)
+    print(f"[JOBS][INFO] Cancel requested for job {job_id} (pid {record['pid']}).")
+    # Исполнитель запишет "cancelling" сам, при следующей строке вывода шага
+    return True, dict(record, state="cancelling")
+
+
+# --- Исполнитель (отдельный процесс) ---
+
+class _JobRunner:
+    def __init__(self, record: dict):
+        self.record = record
+        self.cancel_requested = False
+        self.current_process = None
+        self.installing = False # Идет установка пакетов (pmstatus) - прерывать нельзя
+        self._last_write = 0.0
+
+    def save(self, force: bool = False):
+        now = time.monotonic()
+        if force or now - self._last_write >= PROGRESS_WRITE_INTERVAL:
+            _write_record(self.record)
+            self._last_write = now
+
+    def request_cancel(self, signum, frame):
+        # Обработчик сигнала не пишет запись: он мог прервать save() основного цикла на середине.
+        # Состояние сохраняет основной цикл (_sync_cancel_state).
+        self.cancel_requested = True
+        process = self.current_process
+        if process is not None and process.poll() is None and not self.installing:
+            # Шаг запущен в своей сессии: sudo перешлет сигнал apt
+            process.terminate()
+
+    def _sync_cancel_state(self):
+        """Записывает "cancelling" после запроса отмены (вызывается из основного цикла)."""
+        if self.cancel_requested and self.record["state"] == "running":
+            self.record["state"] = "cancelling"
+            self.save(force=True)
+
+    def _update_progress(self, line: str):
+        match = _APT_STATUS_RE.match(line)
+        if not match:
+            return
+        kind = match.group("kind")
+        if kind == "pmstatus":
+            self.installing = True
+        if kind in ("dlstatus", "pmstatus"):
+            steps_total = len(self.record["steps"]) or 1
+            step_percent = min(float(match.group("percent")), 100.0)
+            self.record["progress"] = round((self.record["step_index"] + step_percent / 100) / steps_total * 100, 1)
+        self.record["status_message"] = match.group("message").strip()
+        self.save()
+
+    def run_step(self, step: dict) -> int:
+        self.installing = False
+        process = subprocess.Popen(step["argv"], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True, encoding='utf-8',
+                                   errors='replace', bufsize=1, start_new_session=True)
+        self.current_process = process
+        if self.cancel_requested and not self.installing:
+            process.terminate() # SIGTERM пришел между шагами
+        for line in process.stdout:
+            sys.stdout.write(line) # Полный вывод - в лог задачи
+            self._sync_cancel_state()
+            self._update_progress(line.rstrip("\n"))
+        sys.stdout.flush()
+        returncode = process.wait()
+        self.current_process = None
+        self._sync_cancel_state()
+        return returncode
+
+    def run(self) -> int:
+        record = self.record
+        record.update(state="running", started_at=time.time(), pid=os.getpid(),
+                      pid_create_time=_process_start_time(os.getpid()))
+        self.save(force=True)
+        signal.signal(signal.SIGTERM, self.request_cancel)
+        signal.signal(signal.SIGINT, self.request_cancel)
+
+        returncode = 0
+        completed_steps = 0
+        steps = record["steps"]
+        for index, step in enumerate(steps):
+            if self.cancel_requested:
+                break
+            record.update(step_index=index, step_title=step.get("title", step.get("name", "")),
+                          progress=round(index / len(steps) * 100, 1), status_message="")
+            self.save(force=True)
+            print(f"[JOBS][INFO] Job {record['job_id']}: step {index + 1}/{len(steps)}: {' '.join(step['argv'])}",
+                  flush=True)
+            try:
+                returncode = self.run_step(step)
+            except OSError as e:
+                print(f"[JOBS][ERROR] Cannot start step '{step.get('name')}': {e}", flush=True)
+                returncode = 127
+            if returncode != 0:
+                break
+            completed_steps += 1
+
+        if completed_steps == len(steps):
+            # Все шаги выполнены (в том числе если отмена пришла во время последней установки пакетов)
+            state = "succeeded"
+            record["progress"] = 100.0
+        elif self.cancel_requested:
+            state = "cancelled"
+        else:
+            state = "failed"
+        record.update(state=state, returncode=returncode, finished_at=time.time())
+        self.save(force=True)
+        print(f"[JOBS][INFO] Job {record['job_id']} finished: {state} (code {returncode}).", flush=True)
+        return 0 if state == "succeeded" else 1
+
+
+def run_job(job_id: str) -> int:
+    """Точка входа исполнителя: выполняет шаги задачи и ведет ее запись."""
+    record = _read_record(job_id)
+    if record is None or record.get("state") != "queued":
+        print(f"[JOBS][ERROR] Job {job_id} not found or already started.", flush=True)
+        return 1
+    return _JobRunner(record).run()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "run":
+        sys.exit("Usage: python job_manager.py run <job_id>")
+    sys.exit(run_job(sys.argv[2]))
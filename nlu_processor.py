@@ -1,14 +1,162 @@
 # File: nlu_processor.py
 # -*- coding: utf-8 -*-
 
+import hashlib
 import json
-import requests
 import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import fast_intent_router
+
+try:
+    import fcntl
+except ImportError: # Не POSIX: без блокировки параллельные процессы могут потерять чужие записи кэша
+    fcntl = None
+
+# HTTP-библиотеки импортируются лениво (при создании первого клиента Ollama):
+# requests + urllib3 стоят ~90 мс, а команды из быстрого маршрутизатора и кэша NLU их не используют.
+requests = None
+HTTPAdapter = None
+httpx = None # Нужен только для асинхронного клиента (ставится вместе с python-telegram-bot)
+_http_import_lock = threading.Lock()
+
+def _import_requests():
+    """Импортирует requests при первом обращении к синхронному клиенту."""
+    global requests, HTTPAdapter
+    if requests is None:
+        with _http_import_lock:
+            if requests is None:
+                from requests.adapters import HTTPAdapter as adapter_class
+                import requests as requests_module
+                HTTPAdapter = adapter_class
+                requests = requests_module
+    return requests
+
+def _import_httpx():
+    """Импортирует httpx при первом обращении к асинхронному клиенту (None, если не установлен)."""
+    global httpx
+    if httpx is None:
+        with _http_import_lock:
+            if httpx is None:
+                try:
+                    import httpx as httpx_module
+                except ImportError:
+                    return None
+                httpx = httpx_module
+    return httpx
 
 # --- Constants (Can be moved to config later) ---
 DEFAULT_API_URL = os.environ.get('OLLAMA_API_URL', 'http://localhost:11434/api/generate')
 DEFAULT_MODEL_NAME = "mistral" # Default model for all LLM calls
-DEFAULT_TIMEOUT = 90 # Default timeout for API requests
+# Раздельные таймауты: подключение должно быть быстрым, а генерация на CPU может идти долго
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 5))
+DEFAULT_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', 90))
+DEFAULT_TIMEOUT = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT) # (connect, read) для requests
+# Потоковая генерация NLU: читаем токены по мере появления и обрываем поток на первом полном JSON
+NLU_STREAMING_ENABLED = os.environ.get('FAMILIAR_NLU_STREAM', '1').lower() not in ('0', 'false', 'no')
+# Ограничивать ответ NLU JSON-схемой (поле "format" Ollama), построенной из реестра обработчиков
+NLU_SCHEMA_ENABLED = os.environ.get('FAMILIAR_NLU_SCHEMA', '1').lower() not in ('0', 'false', 'no')
+DEFAULT_NUM_PREDICT = 200
+# Сколько держать модель (и ее KV-кэш статического префикса NLU) загруженной после запроса
+DEFAULT_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')
+# Отправлять статическую часть NLU-инструкции как system-prompt (KV-кэш префикса переиспользуется)
+NLU_PROMPT_CACHE_ENABLED = os.environ.get('FAMILIAR_NLU_PROMPT_CACHE', '1').lower() not in ('0', 'false', 'no')
+# --- Кэш результатов NLU (переживает перезапуски familiar.py и telegram_bot.py) ---
+NLU_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'nlu_cache.json')
+NLU_CACHE_MAX_ENTRIES = int(os.environ.get('FAMILIAR_NLU_CACHE_SIZE', 512))
+NLU_CACHE_TTL = float(os.environ.get('FAMILIAR_NLU_CACHE_TTL', 7 * 24 * 3600)) # секунды
+NLU_CACHE_ENABLED = os.environ.get('FAMILIAR_NLU_CACHE', '1').lower() not in ('0', 'false', 'no')
+# Сколько keep-alive соединений держать к Ollama (по числу одновременных пользователей Telegram)
+DEFAULT_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE', 4))
+
+
+# --- Долгоживущий HTTP-клиент с пулом соединений ---
+class OllamaClient:
+    """
+    Обертка над requests.Session с пулом keep-alive соединений к Ollama.
+    Один экземпляр переиспользуется для всех запросов (NLU и генерация ответа),
+    поэтому TCP-соединение устанавливается один раз, а не на каждый вызов.
+    """
+
+    def __init__(self,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        _import_requests()
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        self._lock = threading.Lock()
+        self._requests_sent = 0
+        self._errors = 0
+
+    def normalize_timeout(self, timeout) -> tuple[float, float]:
+        """Число трактуется как таймаут чтения (как раньше), кортеж - как (connect, read)."""
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        if isinstance(timeout, (tuple, list)):
+            return (float(timeout[0]), float(timeout[1]))
+        return (self.connect_timeout, float(timeout))
+
+    def post(self, api_url: str, payload: dict, timeout=None, **kwargs) -> "requests.Response":
+        """Отправляет POST через общий пул. Исключения requests пробрасываются вызывающему."""
+        with self._lock:
+            self._requests_sent += 1
+        try:
+            return self.session.post(api_url, json=payload, timeout=self.normalize_timeout(timeout), **kwargs)
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+
+    def get_stats(self) -> dict:
+        """Статистика переиспользования соединений (по данным пулов urllib3)."""
+        connections_opened = 0
+        pool_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections_opened += pool.num_connections
+            pool_requests += pool.num_requests
+        with self._lock:
+            requests_sent, errors = self._requests_sent, self._errors
+        return {
+            "pool_size": self.pool_size,
+            "requests_sent": requests_sent,
+            "errors": errors,
+            "connections_opened": connections_opened,
+            "connections_reused": max(pool_requests - connections_opened, 0),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_ollama_client = None
+_ollama_client_lock = threading.Lock()
+
+def get_ollama_client() -> OllamaClient:
+    """Возвращает общий (ленивый) экземпляр OllamaClient для всего процесса."""
+    global _ollama_client
+    if _ollama_client is None:
+        with _ollama_client_lock:
+            if _ollama_client is None:
+                _ollama_client = OllamaClient()
+    return _ollama_client
+
+def get_connection_stats() -> dict:
+    """Статистика соединений общего клиента Ollama."""
+    return get_ollama_client().get_stats()
 
 # --- NLU INSTRUCTION TEMPLATE (v8 - из предыдущих шагов) ---
 # (Этот шаблон остается здесь, так как он нужен для get_nlu_intent_from_text)
@@ -25,10 +173,14 @@ NLU_INSTRUCTION_TEMPLATE = """Тебе будет предоставлена п
     * Обязательный параметр: "app_name".
 * intent: manage_system
     * action: "reboot" (Перезагрузить)
-    * action: "update" (Обновить систему - запуск apt update && apt upgrade -y && apt dist-upgrade -y)
+    * action: "update" (Обновить систему - apt update, upgrade и dist-upgrade в фоновой задаче)
     * action: "shutdown" (Выключить)
     * action: "uptime" (Показать время работы системы)
     * Параметры не требуются.
+* intent: manage_job (Фоновые задачи, например идущее обновление системы)
+    * action: "status" (Как идет задача)
+    * action: "cancel" (Отменить задачу)
+    * Опциональный параметр: "job_id" (8 шестнадцатеричных символов; без него - последняя задача).
 * intent: manage_sound
     * action: "up" (Громче)
     * action: "down" (Тише)
@@ -48,6 +200,10 @@ NLU_INSTRUCTION_TEMPLATE = """Тебе будет предоставлена п
 * intent: unknown
     * Намерение не распознано.
 
+Если команда состоит из нескольких действий ("открой X и Y", "..., и сделай потише"), верни объект
+{{"intents": [...]}} со списком интентов в порядке их упоминания. Глагол относится ко всем
+перечисленным после него приложениям.
+
 Примеры:
 
 Команда: запусти стим
@@ -122,6 +278,14 @@ NLU_INSTRUCTION_TEMPLATE = """Тебе будет предоставлена п
 Результат:
 {{"intent": "manage_system", "parameters": {{"action": "update"}}}}
 
+Команда: как там обновление?
+Результат:
+{{"intent": "manage_job", "parameters": {{"action": "status"}}}}
+
+Команда: отмени задачу 3f9c2a1b
+Результат:
+{{"intent": "manage_job", "parameters": {{"action": "cancel", "job_id": "3f9c2a1b"}}}}
+
 Команда: аптайм
 Результат:
 {{"intent": "manage_system", "parameters": {{"action": "uptime"}}}}
@@ -146,52 +310,182 @@ NLU_INSTRUCTION_TEMPLATE = """Тебе будет предоставлена п
 Результат:
 {{"intent": "unknown", "parameters": {{}}}}
 
+Команда: открой хром и телеграм, и сделай потише
+Результат:
+{{"intents": [{{"intent": "manage_app", "parameters": {{"action": "open", "app_name": "Chrome"}}}}, {{"intent": "manage_app", "parameters": {{"action": "open", "app_name": "Telegram"}}}}, {{"intent": "manage_sound", "parameters": {{"action": "down"}}}}]}}
+
 Команда: {user_command}
 Результат:
 """
 
-# --- Вспомогательная функция для вызова LLM ---
-def _call_ollama_api(full_prompt_text: str,
-                     model_name: str = DEFAULT_MODEL_NAME,
-                     api_url: str = DEFAULT_API_URL,
-                     timeout: int = DEFAULT_TIMEOUT) -> str | None:
+# --- Разделение шаблона на статический префикс и изменяемую часть ---
+# Префикс (инструкция + примеры) одинаков для всех команд: он уходит в поле "system",
+# Ollama держит модель загруженной (keep_alive) и переиспользует KV-кэш этого префикса,
+# поэтому на каждый запрос вычисляется только последняя строка с командой.
+_NLU_USER_MARKER = "Команда: {user_command}"
+NLU_SYSTEM_PROMPT = NLU_INSTRUCTION_TEMPLATE.split(_NLU_USER_MARKER)[0].replace("{{", "{").replace("}}", "}").rstrip() + "\n"
+NLU_USER_PROMPT_TEMPLATE = _NLU_USER_MARKER + NLU_INSTRUCTION_TEMPLATE.split(_NLU_USER_MARKER)[1]
+
+# Ключи, по которым JSON-объект в ответе модели считается результатом NLU:
+# "intent" - одна команда, "intents" - составная ("открой хром и телеграм")
+NLU_RESULT_KEYS = ("intent", "intents")
+
+# --- Схема ответа NLU (задается из familiar.py через configure_nlu_output_schema) ---
+NLU_OUTPUT_SCHEMA = None
+# num_predict считается отдельно для одной команды и для составной ({"intents": [...]}):
+# составной вариант в несколько раз длиннее и упирался бы в DEFAULT_NUM_PREDICT для каждой команды
+NLU_OUTPUT_NUM_PREDICT = DEFAULT_NUM_PREDICT
+NLU_OUTPUT_COMPOUND_NUM_PREDICT = DEFAULT_NUM_PREDICT
+
+def _max_json_chars(schema: dict) -> tuple[int, int]:
     """
-    Внутренняя функция для отправки запроса к Ollama API.
-    Принимает уже полностью сформированный текст инструкции (prompt).
-    Возвращает текстовый ответ от модели или None в случае ошибки.
+    Грубая верхняя оценка длины JSON по схеме.
+    Возвращает (символы разметки/ключей/enum, символы свободного текста).
+    """
+    if "anyOf" in schema:
+        return max((_max_json_chars(variant) for variant in schema["anyOf"]),
+                   key=lambda sizes: sizes[0] // 2 + sizes[1])
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        markup, free_text = 2, 0
+        for key, property_schema in schema.get("properties", {}).items():
+            property_markup, property_text = _max_json_chars(property_schema)
+            markup += len(key) + 6 + property_markup # "key": value,
+            free_text += property_text
+        return markup, free_text
+    if schema_type == "array":
+        item_markup, item_text = _max_json_chars(schema.get("items", {}))
+        max_items = schema.get("maxItems", 1)
+        return 2 + max_items * (item_markup + 2), max_items * item_text
+    if schema_type == "string":
+        if "enum" in schema:
+            return max(len(value) for value in schema["enum"]) + 2, 0
+        return 2, schema.get("maxLength", DEFAULT_NUM_PREDICT)
+    return 8, 0
+
+def estimate_schema_num_predict(schema: dict) -> int:
+    """
+    Оценивает num_predict по схеме: разметка JSON и латинские ключи токенизируются
+    примерно по 2 символа на токен, свободный (часто кириллический) текст - до токена на символ.
+    """
+    markup, free_text = _max_json_chars(schema)
+    return min(DEFAULT_NUM_PREDICT, markup // 2 + free_text + 8)
+
+def configure_nlu_output_schema(schema: dict | None):
+    """
+    Задает JSON-схему ответа NLU (None - без ограничений) и пересчитывает num_predict:
+    по вариантам с одним интентом и отдельно по составному варианту ("intents").
+    """
+    global NLU_OUTPUT_SCHEMA, NLU_OUTPUT_NUM_PREDICT, NLU_OUTPUT_COMPOUND_NUM_PREDICT, _nlu_cache
+    NLU_OUTPUT_SCHEMA = schema
+    if schema:
+        variants = schema.get("anyOf", [schema])
+        single = [variant for variant in variants if "intents" not in variant.get("properties", {})]
+        compound = [variant for variant in variants if "intents" in variant.get("properties", {})]
+        NLU_OUTPUT_NUM_PREDICT = estimate_schema_num_predict({"anyOf": single or variants})
+        NLU_OUTPUT_COMPOUND_NUM_PREDICT = (estimate_schema_num_predict({"anyOf": compound})
+                                           if compound else NLU_OUTPUT_NUM_PREDICT)
+    else:
+        NLU_OUTPUT_NUM_PREDICT = NLU_OUTPUT_COMPOUND_NUM_PREDICT = DEFAULT_NUM_PREDICT
+    _nlu_cache = None # отпечаток кэша зависит от схемы
+    print(f"[NLU_PROCESSOR][INFO] NLU output schema {'set' if schema else 'cleared'}, "
+          f"num_predict={NLU_OUTPUT_NUM_PREDICT} (compound: {NLU_OUTPUT_COMPOUND_NUM_PREDICT}).")
+
+
+# --- Инкрементальный поиск JSON-объекта в потоке текста ---
+class IncrementalJSONScanner:
+    """
+    Принимает текст кусками (токенами) и находит первый сбалансированный JSON-объект,
+    содержащий один из обязательных ключей. Учитывает строки и экранирование,
+    поэтому скобки внутри значений ("app_name": "{x}") не сбивают подсчет.
+    Объекты без нужного ключа пропускаются, поиск продолжается со следующего '{'.
+    """
+
+    def __init__(self, required_keys: tuple[str, ...] = NLU_RESULT_KEYS):
+        self.required_keys = required_keys
+        self.result = None
+        self._chars = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> dict | None:
+        """Добавляет кусок текста. Возвращает найденный объект (один раз) или None."""
+        if self.result is not None:
+            return None
+        for ch in chunk:
+            if self._depth == 0:
+                if ch == '{':
+                    self._chars = ['{']
+                    self._depth = 1
+                    self._in_string = False
+                    self._escape = False
+                continue
+
+            self._chars.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                self._depth += 1
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = self._try_parse(''.join(self._chars))
+                    if candidate is not None:
+                        self.result = candidate
+                        return candidate
+        return None
+
+    def _try_parse(self, json_str: str) -> dict | None:
+        try:
+            parsed = json.loads(json_str)
+        except json.JSONDecodeError:
+            print(f"[NLU_PROCESSOR][WARN] Skipping unparsable JSON fragment: {json_str[:200]}")
+            return None
+        if isinstance(parsed, dict) and any(key in parsed for key in self.required_keys):
+            return parsed
+        print(f"[NLU_PROCESSOR][WARN] Skipping JSON object without {self.required_keys}: {parsed}")
+        return None
+
+
+# --- Вспомогательные функции для вызова LLM ---
+def _post_to_ollama(payload: dict,
+                    api_url: str = DEFAULT_API_URL,
+                    timeout: float | tuple[float, float] = DEFAULT_TIMEOUT) -> dict | None:
+    """
+    Отправляет готовый payload в Ollama API через общий пул соединений.
+    Возвращает полный JSON-ответ (включая метрики prompt_eval_*) или None в случае ошибки.
     """
     if not api_url:
         print("[NLU_PROCESSOR][ERROR] Ollama API URL is not set.")
         return None
 
-    payload = {
-        "model": model_name,
-        "prompt": full_prompt_text,
-        "stream": False,
-        "options": {
-            "temperature": 0.3, # Низкая температура для NLU и более предсказуемых ответов
-            "repeat_penalty": 1.15,
-            "num_predict": 200 # Лимит длины ответа (можно настроить)
-        }
-    }
-
-    print(f"[NLU_PROCESSOR][DEBUG] Sending request to {api_url} for model '{model_name}'...")
-    # print(f"[NLU_PROCESSOR][DEBUG] Payload prompt (first 100 chars): {full_prompt_text[:100]}...") # Для отладки
+    print(f"[NLU_PROCESSOR][DEBUG] Sending request to {api_url} for model '{payload.get('model')}'...")
 
+    client = get_ollama_client()
+    response = None
     try:
-        response = requests.post(api_url, json=payload, timeout=timeout)
+        response = client.post(api_url, payload, timeout=timeout)
         response.raise_for_status()
         data = response.json()
 
         if 'response' in data:
-            result_text = data['response'].strip()
-            print(f"[NLU_PROCESSOR][DEBUG] Raw response from model: '{result_text}'")
-            return result_text
+            return data
         else:
             print(f"[NLU_PROCESSOR][ERROR] 'response' field not found in API response. Full response: {data}")
             return None
+    except requests.exceptions.ConnectTimeout:
+        print(f"[NLU_PROCESSOR][ERROR] Network Error: Connect timeout ({client.normalize_timeout(timeout)[0]}s) for {api_url}")
+        return None
     except requests.exceptions.Timeout:
-        print(f"[NLU_PROCESSOR][ERROR] Network Error: Timeout ({timeout}s) for {api_url}")
+        print(f"[NLU_PROCESSOR][ERROR] Network Error: Read timeout ({client.normalize_timeout(timeout)[1]}s) for {api_url}")
         return None
     except requests.exceptions.RequestException as e:
         print(f"[NLU_PROCESSOR][ERROR] Network Error during Ollama API request: {e}")
@@ -203,27 +497,180 @@ def _call_ollama_api(full_prompt_text: str,
         print(f"[NLU_PROCESSOR][ERROR] Unknown error during Ollama API call: {e}")
         return None
 
+def _stream_ollama_until_json(payload: dict,
+                              api_url: str = DEFAULT_API_URL,
+                              timeout: float | tuple[float, float] = DEFAULT_TIMEOUT,
+                              required_keys: tuple[str, ...] = NLU_RESULT_KEYS) -> str | None:
+    """
+    Потоковый запрос к Ollama: токены читаются по мере генерации и передаются в
+    IncrementalJSONScanner. Как только найден полный объект с нужным ключом, поток
+    закрывается (Ollama прекращает генерацию), и возвращается текст этого объекта.
+    Если объект так и не найден, возвращается весь сгенерированный текст.
+    """
+    if not api_url:
+        print("[NLU_PROCESSOR][ERROR] Ollama API URL is not set.")
+        return None
+
+    stream_payload = dict(payload, stream=True)
+    print(f"[NLU_PROCESSOR][DEBUG] Streaming request to {api_url} for model '{payload.get('model')}'...")
+
+    client = get_ollama_client()
+    scanner = IncrementalJSONScanner(required_keys)
+    generated_chunks = []
+    try:
+        with client.post(api_url, stream_payload, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "error" in data:
+                    print(f"[NLU_PROCESSOR][ERROR] Ollama returned error while streaming: {data['error']}")
+                    return None
+                chunk = data.get("response", "")
+                generated_chunks.append(chunk)
+                found = scanner.feed(chunk)
+                if found is not None:
+                    # Обрываем поток: хвост генерации (пояснения модели после JSON) нам не нужен.
+                    # Соединение при этом не возвращается в пул, но это дешевле ожидания хвоста.
+                    print(f"[NLU_PROCESSOR][DEBUG] Complete JSON received after {len(generated_chunks)} chunks, closing stream.")
+                    return json.dumps(found, ensure_ascii=False)
+                if data.get("done"):
+                    break
+    except requests.exceptions.ConnectTimeout:
+        print(f"[NLU_PROCESSOR][ERROR] Network Error: Connect timeout ({client.normalize_timeout(timeout)[0]}s) for {api_url}")
+        return None
+    except requests.exceptions.Timeout:
+        print(f"[NLU_PROCESSOR][ERROR] Network Error: Read timeout ({client.normalize_timeout(timeout)[1]}s) for {api_url}")
+        return None
+    except requests.exceptions.RequestException as e:
+        print(f"[NLU_PROCESSOR][ERROR] Network Error during Ollama streaming request: {e}")
+        return None
+    except json.JSONDecodeError as e:
+        print(f"[NLU_PROCESSOR][ERROR] Ollama stream line is not valid JSON: {e}")
+        return None
+    except Exception as e:
+        print(f"[NLU_PROCESSOR][ERROR] Unknown error during Ollama streaming call: {e}")
+        return None
+
+    result_text = ''.join(generated_chunks).strip()
+    print(f"[NLU_PROCESSOR][DEBUG] Stream finished without a complete JSON object: '{result_text}'")
+    return result_text
+
+def _build_payload(full_prompt_text: str,
+                   model_name: str = DEFAULT_MODEL_NAME,
+                   system_prompt: str | None = None,
+                   keep_alive: str | None = None) -> dict:
+    """Собирает payload для /api/generate."""
+    payload = {
+        "model": model_name,
+        "prompt": full_prompt_text,
+        "stream": False,
+        "options": {
+            "temperature": 0.3, # Низкая температура для NLU и более предсказуемых ответов
+            "repeat_penalty": 1.15,
+            "num_predict": DEFAULT_NUM_PREDICT # Лимит длины ответа (можно настроить)
+        }
+    }
+    if system_prompt:
+        payload["system"] = system_prompt
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+def _call_ollama_api(full_prompt_text: str,
+                     model_name: str = DEFAULT_MODEL_NAME,
+                     api_url: str = DEFAULT_API_URL,
+                     timeout: float | tuple[float, float] = DEFAULT_TIMEOUT,
+                     system_prompt: str | None = None,
+                     keep_alive: str | None = None) -> str | None:
+    """
+    Внутренняя функция для отправки запроса к Ollama API.
+    Принимает уже полностью сформированный текст инструкции (prompt)
+    и, опционально, статический system-prompt.
+    Возвращает текстовый ответ от модели или None в случае ошибки.
+    """
+    payload = _build_payload(full_prompt_text, model_name, system_prompt, keep_alive)
+    data = _post_to_ollama(payload, api_url, timeout)
+    if data is None:
+        return None
+    result_text = data['response'].strip()
+    print(f"[NLU_PROCESSOR][DEBUG] Raw response from model: '{result_text}' "
+          f"(prompt_eval_count={data.get('prompt_eval_count')}, "
+          f"prompt_eval_ms={round(data.get('prompt_eval_duration', 0) / 1e6, 1)})")
+    return result_text
+
+def build_nlu_prompt(user_command: str, use_prompt_cache: bool = NLU_PROMPT_CACHE_ENABLED) -> tuple[str, str | None]:
+    """
+    Возвращает (prompt, system_prompt) для NLU-запроса.
+    С кэшированием префикса статическая инструкция идет отдельно в system_prompt,
+    без него - весь шаблон целиком в prompt (как раньше).
+    """
+    if use_prompt_cache:
+        return NLU_USER_PROMPT_TEMPLATE.format(user_command=user_command), NLU_SYSTEM_PROMPT
+    return NLU_INSTRUCTION_TEMPLATE.format(user_command=user_command), None
+
+def warm_up_nlu_prefix(model_name: str = DEFAULT_MODEL_NAME,
+                       api_url: str = DEFAULT_API_URL,
+                       timeout: float | tuple[float, float] = DEFAULT_TIMEOUT) -> bool:
+    """
+    Заранее вычисляет статический префикс NLU, чтобы первая команда пользователя
+    уже попала в KV-кэш Ollama. Генерирует один токен и отбрасывает его.
+    """
+    prompt, system_prompt = build_nlu_prompt("", use_prompt_cache=True)
+    payload = _build_payload(prompt, model_name, system_prompt, DEFAULT_KEEP_ALIVE)
+    payload["options"]["num_predict"] = 1
+    data = _post_to_ollama(payload, api_url, timeout)
+    if data is None:
+        print("[NLU_PROCESSOR][WARN] NLU prefix warm-up failed.")
+        return False
+    print(f"[NLU_PROCESSOR][INFO] NLU prefix warmed up (prompt_eval_count={data.get('prompt_eval_count')}).")
+    return True
+
 # --- Функция для извлечения NLU (интент + параметры) ---
 def get_nlu_intent_from_text(user_command: str,
                              model_name: str = DEFAULT_MODEL_NAME,
                              api_url: str = DEFAULT_API_URL,
-                             timeout: int = DEFAULT_TIMEOUT) -> str | None:
+                             timeout: float | tuple[float, float] = DEFAULT_TIMEOUT) -> str | None:
     """
-    Отправляет команду пользователя и NLU_INSTRUCTION_TEMPLATE в LLM для извлечения интента.
+    Отправляет команду пользователя и NLU-инструкцию в LLM для извлечения интента.
+    Статическая часть инструкции передается как system-prompt (см. build_nlu_prompt).
     Возвращает сырой текстовый ответ от модели (ожидается JSON).
     """
     if not user_command:
         print("[NLU_PROCESSOR][WARN] Empty user command received for NLU.")
         return None
 
-    full_nlu_prompt = NLU_INSTRUCTION_TEMPLATE.format(user_command=user_command)
-    return _call_ollama_api(full_nlu_prompt, model_name, api_url, timeout)
+    nlu_prompt, system_prompt = build_nlu_prompt(user_command)
+    payload = _build_nlu_payload(nlu_prompt, model_name, system_prompt, user_command)
+    if NLU_STREAMING_ENABLED:
+        return _stream_ollama_until_json(payload, api_url, timeout)
+    data = _post_to_ollama(payload, api_url, timeout)
+    if data is None:
+        return None
+    result_text = data['response'].strip()
+    print(f"[NLU_PROCESSOR][DEBUG] Raw response from model: '{result_text}' "
+          f"(prompt_eval_count={data.get('prompt_eval_count')})")
+    return result_text
+
+def _build_nlu_payload(nlu_prompt: str, model_name: str, system_prompt: str | None, user_command: str) -> dict:
+    """
+    Payload NLU-запроса: с JSON-схемой в "format" (если задана) и укороченным num_predict -
+    бюджетом одной команды, а если в команде есть разделители частей ("и", запятая) - составной.
+    """
+    payload = _build_payload(nlu_prompt, model_name, system_prompt, DEFAULT_KEEP_ALIVE)
+    if NLU_OUTPUT_SCHEMA:
+        payload["format"] = NLU_OUTPUT_SCHEMA
+        payload["options"]["num_predict"] = (NLU_OUTPUT_COMPOUND_NUM_PREDICT
+                                             if fast_intent_router.looks_compound(user_command)
+                                             else NLU_OUTPUT_NUM_PREDICT)
+    return payload
 
 # --- НОВАЯ ФУНКЦИЯ: Для генерации ответа LLM на основе готовой инструкции ---
 def generate_llm_response_from_template(full_prompt_text: str,
                                         model_name: str = DEFAULT_MODEL_NAME,
                                         api_url: str = DEFAULT_API_URL,
-                                        timeout: int = DEFAULT_TIMEOUT) -> str | None:
+                                        timeout: float | tuple[float, float] = DEFAULT_TIMEOUT) -> str | None:
     """
     Отправляет уже полностью сформированный текст инструкции (prompt) в LLM.
     Используется для генерации ответов, когда инструкция формируется в другом месте (например, в familiar.py).
@@ -236,34 +683,397 @@ def generate_llm_response_from_template(full_prompt_text: str,
 
 # --- Функция для извлечения JSON из ответа NLU ---
 def extract_json_from_response(response_text: str | None) -> dict | None:
-    """Извлекает первый валидный JSON объект из строки ответа NLU."""
+    """
+    Извлекает первый валидный JSON объект (с ключом 'intent' или 'status') из строки ответа NLU.
+    Использует тот же сканер со счетом скобок, что и потоковый режим, поэтому
+    несколько объектов подряд или текст с '}' после JSON не ломают разбор.
+    """
     if not response_text:
         return None
 
     text_to_parse = response_text.strip()
-    start_index = text_to_parse.find('{')
-    end_index = text_to_parse.rfind('}')
+    scanner = IncrementalJSONScanner(required_keys=NLU_RESULT_KEYS + ("status",))
+    parsed_json = scanner.feed(text_to_parse)
+    if parsed_json is not None:
+        print(f"[NLU_PROCESSOR][DEBUG] JSON parsed successfully.")
+        return parsed_json
+    print(f"[NLU_PROCESSOR][WARN] Could not find a valid JSON object in the string: '{text_to_parse}'")
+    return None
+
+# --- Кэш результатов NLU ---
+_CACHE_KEY_PUNCT_RE = re.compile(r"[^\w\s-]")
+_CACHE_KEY_SPACES_RE = re.compile(r"\s+")
+
+def normalize_nlu_cache_key(user_command: str) -> str:
+    """Нормализует текст команды для ключа кэша: регистр, пунктуация, пробелы."""
+    text = (user_command or "").lower().replace("ё", "е")
+    text = _CACHE_KEY_PUNCT_RE.sub(" ", text)
+    return _CACHE_KEY_SPACES_RE.sub(" ", text).strip()
+
+def _nlu_cache_fingerprint(model_name: str = DEFAULT_MODEL_NAME) -> str:
+    """Отпечаток всего, от чего зависит ответ NLU. При его изменении кэш сбрасывается."""
+    digest = hashlib.sha256()
+    digest.update(NLU_INSTRUCTION_TEMPLATE.encode("utf-8"))
+    digest.update(b"\x00" + model_name.encode("utf-8"))
+    if NLU_OUTPUT_SCHEMA:
+        digest.update(b"\x00" + json.dumps(NLU_OUTPUT_SCHEMA, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+class NLUResultCache:
+    """
+    LRU-кэш распознанных команд (храним разобранный dict, а не сырой ответ модели)
+    с TTL и ограничением размера. Сохраняется на диск атомарно (уникальный tmp + os.replace).
+    Файл общий для клиента, демона и бота: запись идет под flock (файл .lock рядом) и сливает
+    записи, которые успели сохранить другие процессы, с нашими - иначе последний писатель затирал бы чужие.
+    Если изменился NLU_INSTRUCTION_TEMPLATE, имя модели или схема ответа, содержимое файла отбрасывается.
+    """
+
+    def __init__(self,
+                 path: str = NLU_CACHE_FILE,
+                 max_entries: int = NLU_CACHE_MAX_ENTRIES,
+                 ttl: float = NLU_CACHE_TTL,
+                 fingerprint: str | None = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fingerprint = fingerprint or _nlu_cache_fingerprint()
+        self._entries = OrderedDict() # key -> {"result": dict, "stored_at": float}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _read_stored_entries(self, log_errors: bool = True) -> OrderedDict:
+        """Непросроченные записи из файла (пусто, если файла нет, он битый или от другого шаблона/модели)."""
+        entries = OrderedDict()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return entries
+        except (json.JSONDecodeError, OSError) as e:
+            if log_errors:
+                print(f"[NLU_CACHE][WARN] Could not read cache file {self.path}: {e}. Starting empty.")
+            return entries
+        if not isinstance(stored, dict) or stored.get("fingerprint") != self.fingerprint:
+            if log_errors:
+                print("[NLU_CACHE][INFO] NLU template or model changed, cache invalidated.")
+            return entries
+        now = time.time()
+        for key, entry in stored.get("entries", []):
+            if now - entry.get("stored_at", 0) < self.ttl:
+                entries[key] = entry
+        return entries
+
+    def _load(self):
+        self._entries = self._read_stored_entries()
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self._entries:
+            print(f"[NLU_CACHE][INFO] Loaded {len(self._entries)} cached NLU results from {self.path}.")
+
+    def _save_locked(self, merge: bool = True):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = None
+        try:
+            with open(f"{self.path}.lock", 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX) # Снимается при закрытии файла
+                if merge:
+                    # Записи других процессов, которых у нас нет, - в начало (самые старые по LRU),
+                    # более свежие версии наших ключей - на место наших; потом обрезаем по размеру
+                    merged = OrderedDict()
+                    for key, entry in self._read_stored_entries(log_errors=False).items():
+                        own = self._entries.get(key)
+                        if own is None:
+                            merged[key] = entry
+                        elif own["stored_at"] < entry.get("stored_at", 0):
+                            self._entries[key] = entry
+                    merged.update(self._entries)
+                    while len(merged) > self.max_entries:
+                        merged.popitem(last=False)
+                    self._entries = merged
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".nlu_cache.", suffix=".tmp")
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({"fingerprint": self.fingerprint, "entries": list(self._entries.items())},
+                              f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+                tmp_path = None
+        except OSError as e:
+            print(f"[NLU_CACHE][WARN] Could not save cache file {self.path}: {e}")
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() - entry["stored_at"] >= self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return json.loads(json.dumps(entry["result"])) # копия, чтобы обработчики не портили кэш
+
+    def put(self, key: str, result: dict):
+        with self._lock:
+            self._entries[key] = {"result": result, "stored_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save_locked()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._save_locked(merge=False)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
 
-    if start_index != -1 and end_index != -1 and end_index > start_index:
-        json_str = text_to_parse[start_index:end_index + 1]
-        # print(f"[NLU_PROCESSOR][DEBUG] Attempting to parse JSON: {json_str}") # Можно раскомментировать для детальной отладки
+
+_nlu_cache = None
+_nlu_cache_lock = threading.Lock()
+
+def get_nlu_cache() -> NLUResultCache:
+    """Возвращает общий (ленивый) экземпляр кэша NLU."""
+    global _nlu_cache
+    if _nlu_cache is None:
+        with _nlu_cache_lock:
+            if _nlu_cache is None:
+                _nlu_cache = NLUResultCache()
+    return _nlu_cache
+
+def _lookup_cached_nlu(user_command: str, model_name: str) -> tuple[str | None, dict | None]:
+    """Возвращает (ключ_кэша, результат_из_кэша). Ключ None - кэш для этого запроса не используется."""
+    if not NLU_CACHE_ENABLED or model_name != DEFAULT_MODEL_NAME:
+        return None, None
+    cache_key = normalize_nlu_cache_key(user_command)
+    if not cache_key:
+        return None, None
+    cached_result = get_nlu_cache().get(cache_key)
+    if cached_result is not None:
+        print(f"[NLU_PROCESSOR][INFO] NLU cache hit for '{cache_key}': {cached_result}")
+    return cache_key, cached_result
+
+def _parse_nlu_response(nlu_raw_response: str | None) -> tuple[dict | None, str | None]:
+    """Разбирает сырой ответ модели в (результат, код_ошибки)."""
+    if not nlu_raw_response:
+        return None, "NLU_NO_RESPONSE"
+    parsed_nlu = extract_json_from_response(nlu_raw_response)
+    if parsed_nlu and "intent" not in parsed_nlu:
+        parsed_nlu = _normalize_compound_nlu(parsed_nlu)
+    if not parsed_nlu or ("intent" not in parsed_nlu and "intents" not in parsed_nlu):
+        print(f"[NLU_PROCESSOR][ERROR] Failed to parse JSON from NLU or 'intent' is missing. Raw: '{nlu_raw_response}'")
+        return None, "NLU_PARSE_FAILED"
+    return parsed_nlu, None
+
+def _normalize_compound_nlu(parsed_nlu: dict) -> dict | None:
+    """{"intents": [...]}: отбрасывает элементы без intent; один оставшийся интент - обычный результат."""
+    intents = parsed_nlu.get("intents")
+    if not isinstance(intents, list):
+        return None
+    intents = [item for item in intents if isinstance(item, dict) and item.get("intent")]
+    if not intents:
+        return None
+    if len(intents) == 1:
+        return intents[0]
+    return {"intents": intents}
+
+def _should_cache_nlu(cache_key: str | None, parsed_nlu: dict | None) -> bool:
+    # "unknown" не кэшируем: такие команды редко повторяются, а ошибку модели не хочется закреплять
+    if not (cache_key and parsed_nlu):
+        return False
+    intents = parsed_nlu.get("intents") or [parsed_nlu]
+    return all(item.get("intent") != "unknown" for item in intents)
+
+def get_nlu_result(user_command: str,
+                   model_name: str = DEFAULT_MODEL_NAME,
+                   api_url: str = DEFAULT_API_URL,
+                   timeout: float | tuple[float, float] = DEFAULT_TIMEOUT) -> tuple[dict | None, str | None]:
+    """
+    Возвращает разобранный результат NLU для команды, используя кэш.
+
+    Returns:
+        tuple[dict | None, str | None]: (результат, код_ошибки). Код ошибки:
+            "NLU_NO_RESPONSE" - модель не ответила, "NLU_PARSE_FAILED" - ответ не разобран.
+    """
+    cache_key, cached_result = _lookup_cached_nlu(user_command, model_name)
+    if cached_result is not None:
+        return cached_result, None
+
+    parsed_nlu, nlu_error = _parse_nlu_response(
+        get_nlu_intent_from_text(user_command, model_name, api_url, timeout))
+    if _should_cache_nlu(cache_key, parsed_nlu):
+        get_nlu_cache().put(cache_key, parsed_nlu)
+    return parsed_nlu, nlu_error
+
+
+# --- Асинхронный клиент Ollama (для telegram_bot.py и других asyncio-фронтендов) ---
+class AsyncOllamaClient:
+    """
+    Неблокирующий аналог OllamaClient на httpx.AsyncClient с тем же пулом
+    keep-alive соединений и раздельными таймаутами (connect/read).
+    Привязан к event loop, в котором был создан.
+    """
+
+    def __init__(self,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT):
+        if _import_httpx() is None:
+            raise RuntimeError("Для асинхронного клиента Ollama нужен пакет httpx (pip install httpx).")
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size))
+        self._requests_sent = 0
+        self._errors = 0
+
+    def normalize_timeout(self, timeout) -> "httpx.Timeout":
+        if timeout is None:
+            connect, read = self.connect_timeout, self.read_timeout
+        elif isinstance(timeout, (tuple, list)):
+            connect, read = float(timeout[0]), float(timeout[1])
+        else:
+            connect, read = self.connect_timeout, float(timeout)
+        return httpx.Timeout(read, connect=connect)
+
+    async def post_json(self, api_url: str, payload: dict, timeout=None) -> dict | None:
+        """POST без стриминга. Возвращает JSON-ответ Ollama или None при ошибке."""
+        self._requests_sent += 1
         try:
-            parsed_json = json.loads(json_str)
-            if "intent" in parsed_json or "status" in parsed_json: # Проверяем наличие ключевых полей
-                 print(f"[NLU_PROCESSOR][DEBUG] JSON parsed successfully.")
-                 return parsed_json
-            else:
-                 print(f"[NLU_PROCESSOR][WARN] Parsed JSON missing 'intent' or 'status' key: {parsed_json}")
-                 return None
+            response = await self.client.post(api_url, json=payload, timeout=self.normalize_timeout(timeout))
+            response.raise_for_status()
+            data = response.json()
+        except httpx.TimeoutException as e:
+            self._errors += 1
+            print(f"[NLU_PROCESSOR][ERROR] Network Error: Timeout ({type(e).__name__}) for {api_url}")
+            return None
+        except httpx.HTTPError as e:
+            self._errors += 1
+            print(f"[NLU_PROCESSOR][ERROR] Network Error during async Ollama API request: {e}")
+            return None
         except json.JSONDecodeError:
-            print(f"[NLU_PROCESSOR][ERROR] Failed to parse JSON string: {json_str}")
+            self._errors += 1
+            print(f"[NLU_PROCESSOR][ERROR] Ollama API response is not valid JSON.")
             return None
-        except Exception as e:
-             print(f"[NLU_PROCESSOR][ERROR] Unknown error during JSON parsing: {e}")
-             return None
-    else:
-        print(f"[NLU_PROCESSOR][WARN] Could not find a valid JSON object in the string: '{text_to_parse}'")
+        if 'response' not in data:
+            print(f"[NLU_PROCESSOR][ERROR] 'response' field not found in API response. Full response: {data}")
+            return None
+        return data
+
+    async def stream_until_json(self, api_url: str, payload: dict, timeout=None,
+                                required_keys: tuple[str, ...] = NLU_RESULT_KEYS) -> str | None:
+        """Асинхронный аналог _stream_ollama_until_json."""
+        self._requests_sent += 1
+        scanner = IncrementalJSONScanner(required_keys)
+        generated_chunks = []
+        try:
+            async with self.client.stream("POST", api_url, json=dict(payload, stream=True),
+                                          timeout=self.normalize_timeout(timeout)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if "error" in data:
+                        print(f"[NLU_PROCESSOR][ERROR] Ollama returned error while streaming: {data['error']}")
+                        return None
+                    chunk = data.get("response", "")
+                    generated_chunks.append(chunk)
+                    found = scanner.feed(chunk)
+                    if found is not None:
+                        print(f"[NLU_PROCESSOR][DEBUG] Complete JSON received after {len(generated_chunks)} chunks, closing stream.")
+                        return json.dumps(found, ensure_ascii=False)
+                    if data.get("done"):
+                        break
+        except httpx.TimeoutException as e:
+            self._errors += 1
+            print(f"[NLU_PROCESSOR][ERROR] Network Error: Timeout ({type(e).__name__}) for {api_url}")
+            return None
+        except httpx.HTTPError as e:
+            self._errors += 1
+            print(f"[NLU_PROCESSOR][ERROR] Network Error during async Ollama streaming request: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            self._errors += 1
+            print(f"[NLU_PROCESSOR][ERROR] Ollama stream line is not valid JSON: {e}")
+            return None
+        return ''.join(generated_chunks).strip()
+
+    def get_stats(self) -> dict:
+        return {"pool_size": self.pool_size, "requests_sent": self._requests_sent, "errors": self._errors}
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_async_ollama_clients = {} # id(event loop) -> AsyncOllamaClient
+
+def get_async_ollama_client() -> AsyncOllamaClient:
+    """Возвращает AsyncOllamaClient для текущего event loop (создается при первом вызове)."""
+    import asyncio # Уже загружен event loop-ом вызывающего; на старте CLI не импортируем (~40 мс)
+    loop_id = id(asyncio.get_running_loop())
+    client = _async_ollama_clients.get(loop_id)
+    if client is None:
+        client = AsyncOllamaClient()
+        _async_ollama_clients[loop_id] = client
+    return client
+
+async def get_nlu_intent_from_text_async(user_command: str,
+                                         model_name: str = DEFAULT_MODEL_NAME,
+                                         api_url: str = DEFAULT_API_URL,
+                                         timeout: float | tuple[float, float] = DEFAULT_TIMEOUT) -> str | None:
+    """Асинхронный аналог get_nlu_intent_from_text."""
+    if not user_command:
+        print("[NLU_PROCESSOR][WARN] Empty user command received for NLU.")
         return None
+    nlu_prompt, system_prompt = build_nlu_prompt(user_command)
+    payload = _build_nlu_payload(nlu_prompt, model_name, system_prompt, user_command)
+    client = get_async_ollama_client()
+    if NLU_STREAMING_ENABLED:
+        return await client.stream_until_json(api_url, payload, timeout)
+    data = await client.post_json(api_url, payload, timeout)
+    return data['response'].strip() if data else None
+
+async def generate_llm_response_from_template_async(full_prompt_text: str,
+                                                    model_name: str = DEFAULT_MODEL_NAME,
+                                                    api_url: str = DEFAULT_API_URL,
+                                                    timeout: float | tuple[float, float] = DEFAULT_TIMEOUT) -> str | None:
+    """Асинхронный аналог generate_llm_response_from_template."""
+    if not full_prompt_text:
+        print("[NLU_PROCESSOR][WARN] Empty prompt text received for LLM response generation.")
+        return None
+    data = await get_async_ollama_client().post_json(api_url, _build_payload(full_prompt_text, model_name), timeout)
+    return data['response'].strip() if data else None
+
+async def get_nlu_result_async(user_command: str,
+                               model_name: str = DEFAULT_MODEL_NAME,
+                               api_url: str = DEFAULT_API_URL,
+                               timeout: float | tuple[float, float] = DEFAULT_TIMEOUT) -> tuple[dict | None, str | None]:
+    """Асинхронный аналог get_nlu_result (запись кэша на диск уходит в поток)."""
+    cache_key, cached_result = _lookup_cached_nlu(user_command, model_name)
+    if cached_result is not None:
+        return cached_result, None
+
+    parsed_nlu, nlu_error = _parse_nlu_response(
+        await get_nlu_intent_from_text_async(user_command, model_name, api_url, timeout))
+    if _should_cache_nlu(cache_key, parsed_nlu):
+        import asyncio
+        await asyncio.to_thread(get_nlu_cache().put, cache_key, parsed_nlu)
+    return parsed_nlu, nlu_error
 
 # --- Старая функция get_nlu_from_ollama теперь переименована в get_nlu_intent_from_text ---
 # Для обратной совместимости, если где-то еще используется старое имя, можно добавить алиас:
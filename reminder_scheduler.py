@@ -0,0 +1,400 @@
+# File: reminder_scheduler.py
+# -*- coding: utf-8 -*-
+
+# Планировщик напоминаний и будильников (интенты set_reminder / set_alarm).
+# Ожидающие записи лежат в min-куче по времени срабатывания; один поток-таймер спит на
+# Condition до ближайшего срока (новая более ранняя запись его будит), без потока на запись.
+# Вставка - O(log n), отмена - O(1) с ленивым удалением из кучи (устаревшие элементы
+# выбрасываются при извлечении, куча перестраивается, когда их больше половины).
+#
+# Хранение - как у алиасов: снимок config/reminders.json (атомарная запись) плюс журнал
+# config/reminders.journal (по строке JSON на добавление/отмену/срабатывание, с fsync).
+# Просроченные за время простоя записи срабатывают сразу после загрузки (с пометкой опоздания).
+#
+# Срабатывание доставляется через фронтенд, из которого пришла команда (parameters["_origin"]):
+# фронтенд регистрирует функцию доставки register_delivery("telegram" | "console", callback).
+# Пока нужного фронтенда нет, запись ждет и уходит, как только он подключится. Если фронтенд
+# есть, но доставка не удалась (callback вернул False - например, нет подтверждения от клиента),
+# запись возвращается в кучу с экспоненциальной задержкой (или уходит сразу при переподключении).
+#
+# time_spec в абсолютное время переводит time_parser (в обработчиках интентов).
+#
+# Хранилище ведет один процесс: он держит flock на config/reminders.lock, пока работает
+# (демон, а без него - консоль или Telegram-бот). Второй процесс над теми же файлами
+# получает ReminderStoreBusy и напоминаний не ставит: иначе сворачивание журнала в одном
+# процессе теряло бы или воскрешало записи другого.
+
+import datetime
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError: # Не POSIX: блокировки нет, один процесс на хранилище - на совести пользователя
+    fcntl = None
+
+import utils
+
+REMINDERS_FILE = os.path.join(utils.CONFIG_DIR, 'reminders.json')
+REMINDERS_JOURNAL_FILE = os.path.join(utils.CONFIG_DIR, 'reminders.journal')
+REMINDERS_LOCK_FILE = os.path.join(utils.CONFIG_DIR, 'reminders.lock')
+# Журнал сворачивается в снимок, когда записей в нем не меньше, чем ожидающих напоминаний
+# (но не реже чем через это число) - амортизированно O(1) на операцию
+REMINDERS_COMPACT_MIN = int(os.environ.get('FAMILIAR_REMINDERS_COMPACT_MIN', 1000))
+# Опоздание, после которого в тексте указывается исходное время срабатывания
+LATE_NOTICE_S = 60.0
+# Предел сна таймера: сроки заданы по настенным часам, а они могут прыгнуть (сон ноутбука, NTP)
+MAX_TIMER_SLEEP_S = 60.0
+# Повтор неудавшейся доставки: задержка удваивается от первой до предельной
+DELIVERY_RETRY_BASE_S = 5.0
+DELIVERY_RETRY_MAX_S = 300.0
+
+DEFAULT_ORIGIN = {"frontend": "console"}
+
+
+class ReminderStoreBusy(OSError):
+    """Хранилище напоминаний ведет другой процесс (держит REMINDERS_LOCK_FILE)."""
+
+
+def format_due(due: float, now: float | None = None) -> str:
+    """Когда сработает: "в 18:30", "завтра в 07:00", "24.12 в 09:00"."""
+    now = time.time() if now is None else now
+    days_ahead = (datetime.date.fromtimestamp(due) - datetime.date.fromtimestamp(now)).days
+    clock = time.strftime("%H:%M", time.localtime(due))
+    if days_ahead == 0:
+        return f"в {clock}"
+    if days_ahead == 1:
+        return f"завтра в {clock}"
+    return f"{time.strftime('%d.%m', time.localtime(due))} в {clock}"
+
+
+def format_reminder(entry: dict, now: float | None = None) -> str:
+    """Текст, который фронтенд показывает при срабатывании."""
+    now = time.time() if now is None else now
+    if entry.get("kind") == "alarm":
+        text = f"Будильник! {time.strftime('%H:%M', time.localtime(entry['due']))}"
+    else:
+        text = f"Напоминание: {entry.get('text', '')}"
+    if now - entry["due"] > LATE_NOTICE_S:
+        text += f" (с опозданием: было назначено на {time.strftime('%d.%m %H:%M', time.localtime(entry['due']))})"
+    return text
+
+
+class ReminderScheduler:
+    """Куча ожидающих записей, их хранение и поток-таймер, доставляющий срабатывания."""
+
+    def __init__(self, snapshot_path: str = REMINDERS_FILE, journal_path: str = REMINDERS_JOURNAL_FILE,
+                 lock_path: str = REMINDERS_LOCK_FILE):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.lock_path = lock_path
+        self._lock_file = None # Открыт, пока процесс владеет хранилищем
+        self._condition = threading.Condition()
+        self._entries = {} # id -> запись (только ожидающие)
+        self._heap = [] # (due, seq, id); отмененные id остаются до извлечения
+        self._seq = itertools.count()
+        self._stale = 0 # Устаревших элементов в куче
+        self._journal_records = 0
+        self._deliveries = {} # frontend -> [callback, ...] (последний зарегистрированный - первый)
+        self._waiting = {} # frontend -> [id, ...]: сработали, но фронтенда нет
+        self._retries = {} # id -> (время повтора, число неудачных попыток): фронтенд есть, доставка не удалась
+        self._connected_frontends = set() # Зарегистрировались после прошлой попытки доставки
+        self._thread = None
+        self.stats = {"added": 0, "cancelled": 0, "fired": 0, "late": 0, "undelivered": 0, "retries": 0}
+
+    # --- Хранение ---
+    def _acquire_store(self):
+        """Берет исключительную блокировку хранилища до конца жизни процесса (или ReminderStoreBusy)."""
+        if self._lock_file is not None or fcntl is None:
+            return
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        lock_file = open(self.lock_path, 'a+', encoding='utf-8')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.seek(0)
+            owner = lock_file.read().strip()
+            lock_file.close()
+            raise ReminderStoreBusy(f"Напоминания ведет другой процесс ({owner or 'pid неизвестен'})")
+        except OSError:
+            lock_file.close()
+            raise
+        lock_file.truncate(0)
+        lock_file.write(f"pid {os.getpid()}\n")
+        lock_file.flush()
+        self._lock_file = lock_file
+
+    def load(self):
+        """Берет блокировку хранилища, читает снимок, проигрывает журнал и строит кучу (O(n))."""
+        self._acquire_store()
+        entries = {}
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                for entry in json.load(f).get("reminders", []):
+                    entries[entry["id"]] = entry
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"[REMINDERS][ERROR] Cannot read snapshot {self.snapshot_path}: {e}")
+        records = utils.read_journal(self.journal_path)
+        for record in records:
+            if record.get("op") == "add" and isinstance(record.get("reminder"), dict):
+                entries[record["reminder"]["id"]] = record["reminder"]
+            elif record.get("op") in ("cancel", "done"):
+                entries.pop(record.get("id"), None)
+        with self._condition:
+            self._entries = entries
+            self._journal_records = len(records)
+            self._rebuild_heap()
+        overdue = sum(1 for entry in entries.values() if entry["due"] <= time.time())
+        print(f"[REMINDERS][INFO] Loaded {len(entries)} pending reminder(s), {overdue} overdue "
+              f"({len(records)} journal records replayed).")
+
+    def _rebuild_heap(self):
+        waiting_ids = {entry_id for entry_ids in self._waiting.values() for entry_id in entry_ids}
+        self._heap = [(self._retries.get(entry_id, (entry["due"],))[0], next(self._seq), entry_id)
+                      for entry_id, entry in self._entries.items() if entry_id not in waiting_ids]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def _journal(self, record: dict):
+        """Дописывает запись в журнал (до изменения в памяти). Под self._condition."""
+        utils.append_journal_record(self.journal_path, record)
+        self._journal_records += 1
+
+    def _maybe_compact(self):
+        """Сворачивает журнал в снимок (после изменения в памяти). Под self._condition."""
+        if self._journal_records < max(REMINDERS_COMPACT_MIN, len(self._entries)):
+            return
+        try:
+            utils.atomic_write_json(self.snapshot_path, {"reminders": list(self._entries.values())})
+            utils.truncate_journal(self.journal_path)
+            self._journal_records = 0
+        except OSError as e:
+            # Журнал по-прежнему содержит все изменения - попробуем свернуть его в следующий раз
+            print(f"[REMINDERS][WARN] Cannot compact reminders journal: {e}")
+
+    # --- Операции ---
+    def add(self, kind: str, due: float, text: str = "", origin: dict | None = None, time_spec: str = "") -> dict:
+        """
+        Добавляет напоминание ("reminder") или будильник ("alarm"). O(log n).
+
+        Raises:
+            OSError: Не удалось записать журнал (запись не добавлена).
+        """
+        entry = {
+            "id": uuid.uuid4().hex[:12],
+            "kind": kind,
+            "due": due,
+            "text": text,
+            "time_spec": time_spec,
+            "origin": origin or DEFAULT_ORIGIN,
+            "created_at": time.time(),
+        }
+        with self._condition:
+            self._journal({"op": "add", "reminder": entry})
+            self._entries[entry["id"]] = entry
+            heapq.heappush(self._heap, (due, next(self._seq), entry["id"]))
+            self.stats["added"] += 1
+            self._maybe_compact()
+            if self._heap[0][2] == entry["id"]:
+                self._condition.notify() # Новая запись раньше, чем та, до которой спит таймер
+        print(f"[REMINDERS][INFO] Scheduled {kind} {entry['id']} at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(due))}.")
+        return entry
+
+    def cancel(self, entry_id: str) -> bool:
+        """Отменяет ожидающую запись. Элемент кучи удаляется лениво."""
+        with self._condition:
+            if entry_id not in self._entries:
+                return False
+            self._journal({"op": "cancel", "id": entry_id})
+            self._drop(entry_id)
+            self._maybe_compact()
+            self.stats["cancelled"] += 1
+        return True
+
+    def _drop(self, entry_id: str):
+        """Убирает запись из ожидающих; ее элемент в куче становится устаревшим. Под self._condition."""
+        self._entries.pop(entry_id, None)
+        self._retries.pop(entry_id, None)
+        self._stale += 1
+        if self._stale > 1024 and self._stale > len(self._heap) // 2:
+            self._rebuild_heap()
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._entries)
+
+    def pending(self, frontend: str | None = None) -> list[dict]:
+        """Ожидающие записи по времени срабатывания (при необходимости - одного фронтенда)."""
+        with self._condition:
+            entries = [entry for entry in self._entries.values()
+                       if frontend is None or entry["origin"].get("frontend") == frontend]
+        return sorted(entries, key=lambda entry: entry["due"])
+
+    # --- Доставка ---
+    def register_delivery(self, frontend: str, callback):
+        """
+        callback(entry) -> bool доставляет срабатывание (True - доставлено).
+        Вызывается из потока-таймера. Ожидавшие этот фронтенд записи уходят сразу.
+        """
+        with self._condition:
+            self._deliveries.setdefault(frontend, []).append(callback)
+            self._connected_frontends.add(frontend)
+            self._condition.notify()
+
+    def unregister_delivery(self, frontend: str, callback):
+        with self._condition:
+            callbacks = self._deliveries.get(frontend, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def _deliver(self, entry: dict) -> bool | None:
+        """
+        Пробует фронтенды записи, начиная с последнего подключившегося. Вне self._condition.
+        True - доставлено, False - не удалось, None - фронтенд не зарегистрирован.
+        """
+        frontend = entry["origin"].get("frontend", DEFAULT_ORIGIN["frontend"])
+        with self._condition:
+            callbacks = list(reversed(self._deliveries.get(frontend, [])))
+        if not callbacks:
+            return None
+        for callback in callbacks:
+            try:
+                if callback(entry):
+                    return True
+            except Exception as e:
+                print(f"[REMINDERS][WARN] Delivery of {entry['id']} to '{frontend}' failed: {e}")
+        return False
+
+    def _take_due(self, now: float) -> list[dict]:
+        """
+        Извлекает из кучи записи со сроком (или временем повтора) <= now и записи, ждавшие
+        только что подключившийся фронтенд. Под self._condition.
+        """
+        due_entries = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _seq, entry_id = heapq.heappop(self._heap)
+            entry = self._entries.get(entry_id)
+            retry = self._retries.get(entry_id)
+            if entry is None or due != (retry[0] if retry else entry["due"]):
+                self._stale = max(0, self._stale - 1)
+                continue
+            due_entries.append(entry)
+        for frontend in self._connected_frontends:
+            due_entries.extend(self._entries[entry_id] for entry_id in self._waiting.pop(frontend, [])
+                               if entry_id in self._entries)
+            # Повторы для этого фронтенда - сразу, не дожидаясь задержки (их элементы в куче устаревают)
+            for entry_id in [entry_id for entry_id in self._retries
+                             if self._entries[entry_id]["origin"].get("frontend", DEFAULT_ORIGIN["frontend"]) == frontend]:
+                due_entries.append(self._entries[entry_id])
+                self._stale += 1
+        self._connected_frontends.clear()
+        return list({entry["id"]: entry for entry in due_entries}.values()) # Повтор мог попасть и из кучи
+
+    def _fire(self, entries: list[dict]):
+        for entry in entries:
+            delivered = self._deliver(entry)
+            with self._condition:
+                if entry["id"] not in self._entries:
+                    continue # Отменена, пока доставлялась
+                if delivered:
+                    self.stats["fired"] += 1
+                    if time.time() - entry["due"] > LATE_NOTICE_S:
+                        self.stats["late"] += 1
+                    try:
+                        self._journal({"op": "done", "id": entry["id"]})
+                    except OSError as e:
+                        # После перезапуска запись сработает повторно - лучше, чем потерять ее
+                        print(f"[REMINDERS][ERROR] Cannot journal fired reminder {entry['id']}: {e}")
+                    del self._entries[entry["id"]] # Ее элемент уже извлечен из кучи
+                    self._retries.pop(entry["id"], None)
+                    self._maybe_compact()
+                elif delivered is None:
+                    frontend = entry["origin"].get("frontend", DEFAULT_ORIGIN["frontend"])
+                    self._retries.pop(entry["id"], None)
+                    self._waiting.setdefault(frontend, []).append(entry["id"])
+                    self.stats["undelivered"] += 1
+                    print(f"[REMINDERS][WARN] No '{frontend}' front end to deliver {entry['id']}, waiting for it.")
+                else:
+                    attempts = self._retries.get(entry["id"], (None, 0))[1] + 1
+                    delay = min(DELIVERY_RETRY_MAX_S, DELIVERY_RETRY_BASE_S * 2 ** (attempts - 1))
+                    retry_at = time.time() + delay
+                    self._retries[entry["id"]] = (retry_at, attempts)
+                    heapq.heappush(self._heap, (retry_at, next(self._seq), entry["id"]))
+                    self.stats["retries"] += 1
+                    print(f"[REMINDERS][WARN] Delivery of {entry['id']} failed (attempt {attempts}), "
+                          f"retrying in {delay:.0f} s.")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = time.time()
+                due_entries = self._take_due(now)
+                if not due_entries:
+                    timeout = MAX_TIMER_SLEEP_S
+                    if self._heap:
+                        timeout = min(timeout, max(0.0, self._heap[0][0] - now))
+                    self._condition.wait(timeout)
+                    continue
+            self._fire(due_entries)
+
+    def start(self):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="familiar-reminders", daemon=True)
+                self._thread.start()
+
+
+# --- Общий планировщик процесса ---
+_scheduler = None
+_scheduler_lock = threading.RLock()
+_deferred_deliveries = [] # (frontend, callback): зарегистрированы, пока хранилище вел другой процесс
+
+
+def get_scheduler() -> ReminderScheduler:
+    """
+    Возвращает (при первом вызове загружает и запускает) планировщик этого процесса.
+    ReminderStoreBusy, если хранилище ведет другой процесс (повторный вызов попробует снова).
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                scheduler = ReminderScheduler()
+                scheduler.load()
+                for frontend, callback in _deferred_deliveries:
+                    scheduler.register_delivery(frontend, callback)
+                _deferred_deliveries.clear()
+                scheduler.start()
+                _scheduler = scheduler
+    return _scheduler
+
+
+def register_delivery(frontend: str, callback) -> bool:
+    """
+    Регистрирует доставку. Если хранилище ведет другой процесс, запоминает ее до тех пор,
+    пока этот процесс не станет владельцем, и возвращает False.
+    """
+    with _scheduler_lock:
+        try:
+            get_scheduler().register_delivery(frontend, callback)
+            return True
+        except ReminderStoreBusy as e:
+            print(f"[REMINDERS][WARN] {e}: напоминания для '{frontend}' в этом процессе не срабатывают.")
+            _deferred_deliveries.append((frontend, callback))
+            return False
+
+
+def unregister_delivery(frontend: str, callback):
+    with _scheduler_lock:
+        if _scheduler is None:
+            if (frontend, callback) in _deferred_deliveries:
+                _deferred_deliveries.remove((frontend, callback))
+            return
+        _scheduler.unregister_delivery(frontend, callback)
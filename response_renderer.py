@@ -0,0 +1,361 @@
+# File: response_renderer.py
+# -*- coding: utf-8 -*-
+
+# Шаблонный генератор ответов: превращает структурированный результат обработчика
+# в одну фразу на русском без второго запроса к LLM.
+# Ключ - message_code, значение - список вариантов (выбираются по кругу).
+
+import itertools
+import re
+import threading
+
+RESPONSE_TEMPLATES = {
+    # --- manage_app ---
+    "APP_LAUNCHED_SUCCESSFULLY": [
+        "Запускаю {app_name}.",
+        "{app_name} запущен.",
+        "Готово, открываю {app_name}.",
+    ],
+    "APP_FOCUSED_EXISTING_X11": [
+        "{app_name} уже был запущен, переключил вас на него.",
+        "Окно {app_name} теперь на переднем плане.",
+    ],
+    "APP_FOCUSED_EXISTING_WMCTRL": [
+        "{app_name} уже был запущен, переключил вас на него.",
+        "Окно {app_name} теперь на переднем плане.",
+    ],
+    "APP_FOCUSED_EXISTING_XDOTOOL": [
+        "{app_name} уже работал, развернул его окно.",
+        "Нашел окно {app_name} и активировал его.",
+    ],
+    "APP_FOCUSED_EXISTING_UNKNOWN_METHOD": [
+        "{app_name} уже открыт, активировал окно.",
+        "Переключил вас на {app_name}.",
+    ],
+    "APP_CLOSE_COMMAND_SENT": [
+        "Закрыл {app_name}.",
+        "{app_name} закрыт.",
+        "Готово, {app_name} больше не работает.",
+    ],
+    "ERROR_APP_ACTION_PARAMS_MISSING": [
+        "Не понял, какое приложение и что с ним сделать. Уточните, пожалуйста.",
+    ],
+    "ERROR_UNKNOWN_APP_ACTION": [
+        "Не знаю, как выполнить это действие с {app_name}.",
+    ],
+    "ERROR_APP_ACTIVATE_XDOTOOL_MISSING": [
+        "{app_name} запущен, но я не могу переключиться на него: не установлен xdotool.",
+    ],
+    "ERROR_APP_ACTIVATE_XDOTOOL_NO_WINDOW": [
+        "{app_name} работает, но я не нашел его окно.",
+        "Похоже, {app_name} запущен без окна, переключиться не получилось.",
+    ],
+    "ERROR_APP_ACTIVATE_XDOTOOL_FAILED": [
+        "Не получилось активировать окно {app_name}.",
+    ],
+    "ERROR_APP_ACTIVATE_FAILED_GENERAL": [
+        "{app_name} запущен, но переключиться на его окно не удалось.",
+    ],
+    "ERROR_APP_START_FAILED": [
+        "Не удалось запустить {app_name}.",
+        "Простите, {app_name} не запускается.",
+    ],
+    "ERROR_APP_NOT_FOUND_SYSTEM": [
+        "Простите, не могу найти приложение '{app_name}'. Убедитесь, что оно установлено и имя верное.",
+        "Приложения '{app_name}' в системе нет. Может быть, оно называется иначе?",
+    ],
+    "ERROR_APP_CLOSE_FAILED_ACTIVE": [
+        "Не получилось закрыть {app_name}, возможно, не хватает прав.",
+    ],
+    # --- manage_system ---
+    "SYSTEM_SHUTDOWN_INITIATED": [
+        "Выключаю компьютер. До встречи!",
+        "Хорошо, выключаю систему.",
+    ],
+    "SYSTEM_REBOOT_INITIATED": [
+        "Хорошо, инициирую перезагрузку системы. До скорой встречи!",
+        "Перезагружаюсь, скоро вернусь.",
+    ],
+    "SYSTEM_UPDATE_INITIATED": [
+        "Запустил обновление системы в фоне (задача {job_id}). Спросите «как там обновление», чтобы узнать прогресс.",
+        "Обновление системы пошло в фоне, задача {job_id}. Можно продолжать работать.",
+    ],
+    "SYSTEM_UPDATE_ALREADY_RUNNING": [
+        "Обновление системы уже идет (задача {job_id}, {progress}%).",
+    ],
+    "SYSTEM_UPDATE_COMPLETED": [
+        "Обновление системы завершено.",
+        "Система обновлена.",
+    ],
+    "SYSTEM_UPTIME_PROVIDED": [
+        "Система работает уже {uptime_human}.",
+        "Компьютер включен {uptime_human}.",
+    ],
+    "ERROR_ACTION_MISSING": [
+        "Не понял, что сделать с системой. Уточните, пожалуйста.",
+    ],
+    "ERROR_UNKNOWN_SYSTEM_ACTION": [
+        "Такое системное действие я пока не умею выполнять.",
+    ],
+    "ERROR_SYSTEM_SHUTDOWN_FAILED": [
+        "Не удалось выключить компьютер. Возможно, нужно настроить sudo.",
+    ],
+    "ERROR_SYSTEM_REBOOT_FAILED": [
+        "Не удалось перезагрузить систему. Возможно, нужно настроить sudo.",
+    ],
+    "ERROR_SYSTEM_UPDATE_FAILED": [
+        "Не получилось запустить обновление системы.",
+    ],
+    "ERROR_SYSTEM_UPTIME_FAILED": [
+        "Не получилось узнать, сколько работает система.",
+    ],
+    # --- manage_job (фоновые задачи) ---
+    "JOB_STATUS_RUNNING": [
+        "{job_title_cap}: {progress}%, сейчас {step_title}.",
+        "Задача {job_id} идет: {progress}%, этап - {step_title}.",
+    ],
+    "JOB_STATUS_CANCELLING": [
+        "{job_title_cap} отменяется: дожидаюсь конца текущего этапа ({step_title}).",
+    ],
+    "JOB_STATUS_SUCCEEDED": [
+        "{job_title_cap} успешно завершено.",
+        "Задача {job_id} выполнена: {job_title} завершено.",
+    ],
+    "JOB_STATUS_FAILED": [
+        "{job_title_cap} завершилось с ошибкой на этапе «{step_title}». Подробности в журнале задачи {job_id}.",
+    ],
+    "JOB_STATUS_CANCELLED": [
+        "{job_title_cap} было отменено.",
+    ],
+    "JOB_STATUS_LOST": [
+        "Задача {job_id} ({job_title}) прервалась: ее процесс завершился, не сохранив результат.",
+    ],
+    "JOB_CANCEL_REQUESTED": [
+        "Отменяю задачу {job_id}. Если пакеты уже устанавливаются, остановлюсь после текущего этапа.",
+    ],
+    "JOB_ALREADY_FINISHED": [
+        "Задача {job_id} ({job_title}) уже завершена, отменять нечего.",
+    ],
+    "ERROR_JOB_NOT_FOUND": [
+        "Не нашел такой фоновой задачи.",
+    ],
+    "ERROR_JOB_CANCEL_FAILED": [
+        "Не получилось отменить задачу {job_id}.",
+    ],
+    "ERROR_UNKNOWN_JOB_ACTION": [
+        "Не понял, что сделать с задачей: узнать состояние или отменить?",
+    ],
+    # --- manage_sound ---
+    "VOLUME_UP": [
+        "Сделал громче: {volume}%.",
+        "Громкость {volume}%.",
+    ],
+    "VOLUME_DOWN": [
+        "Сделал тише: {volume}%.",
+        "Громкость {volume}%.",
+    ],
+    "VOLUME_AT_MAX": [
+        "Громкость уже максимальная ({volume}%).",
+    ],
+    "VOLUME_AT_MIN": [
+        "Громкость уже на нуле.",
+    ],
+    "VOLUME_MUTED": [
+        "Звук выключен.",
+        "Выключил звук.",
+    ],
+    "VOLUME_UNMUTED": [
+        "Звук включен.",
+        "Включил звук.",
+    ],
+    "ERROR_VOLUME_AMOUNT_INVALID": [
+        "Не понял, на сколько менять громкость: «{amount}». Скажите, например, «громче на 20 процентов».",
+    ],
+    "ERROR_VOLUME_CHANGE_FAILED": [
+        "Не получилось изменить громкость.",
+    ],
+    "ERROR_VOLUME_MUTE_FAILED": [
+        "Не получилось переключить звук.",
+    ],
+    "ERROR_VOLUME_PREVIOUS_CHANGE_FAILED": [
+        "Прошлое изменение громкости (до {volume}%) не применилось. Повторите команду.",
+    ],
+    "ERROR_UNKNOWN_SOUND_ACTION": [
+        "Не понял, что сделать со звуком: громче, тише, выключить или включить?",
+    ],
+    # --- set_reminder / set_alarm ---
+    "REMINDER_SET": [
+        "Хорошо, напомню {time_human}: {reminder_text}.",
+        "Запомнил, {time_human} напомню: {reminder_text}.",
+    ],
+    "ALARM_SET": [
+        "Будильник поставлен, сработает {time_human}.",
+        "Хорошо, разбужу {time_human}.",
+    ],
+    "REMINDER_SET_ASSUMED": [
+        "Напомню {time_human}: {reminder_text}. Если имелось в виду {alternative_human} - скажите.",
+    ],
+    "ALARM_SET_ASSUMED": [
+        "Будильник поставлен на {time_human}. Если нужно {alternative_human} - скажите.",
+    ],
+    "ERROR_REMINDER_PARAMS_MISSING": [
+        "Не понял, о чем и когда напомнить. Скажите, например: «напомни позвонить маме через час».",
+    ],
+    "ERROR_ALARM_PARAMS_MISSING": [
+        "На какое время поставить будильник?",
+    ],
+    "ERROR_TIME_SPEC_UNRECOGNIZED": [
+        "Не понял, когда это: «{time_spec}». Скажите, например, «через полчаса», «завтра в 10» или «в 7 вечера».",
+    ],
+    "ERROR_TIME_IN_PAST": [
+        "Это время уже прошло.",
+    ],
+    "ERROR_REMINDER_SAVE_FAILED": [
+        "Не получилось сохранить, попробуйте еще раз.",
+    ],
+    "ERROR_REMINDER_STORE_BUSY": [
+        "Напоминания сейчас ведет другой запущенный Фамильяр (консоль или бот). "
+        "Чтобы они работали вместе, запустите демон: python familiar_daemon.py.",
+    ],
+    # --- add_alias ---
+    "ALIAS_ADDED_SUCCESS": [
+        "Хорошо, запомнил: '{alias_name}' теперь означает '{command_name}'.",
+        "Запомнил, '{alias_name}' - это '{command_name}'.",
+    ],
+    "ALIAS_EXISTED_SAME_COMMAND": [
+        "Я уже знаю, что '{alias_name}' - это '{command_name}'.",
+    ],
+    "ERROR_ALIAS_PARAMS_MISSING": [
+        "Для псевдонима нужны два имени: короткое и название команды.",
+    ],
+    "ERROR_ALIAS_BOTH_ARE_COMMANDS": [
+        "И '{entity1}', и '{entity2}' уже являются командами, псевдоним не нужен.",
+    ],
+    "ERROR_ALIAS_NEITHER_IS_COMMAND": [
+        "Ни '{entity1}', ни '{entity2}' не похожи на установленную программу.",
+    ],
+    "ERROR_ALIAS_INVALID_WORD": [
+        "Слово '{alias_name}' не подходит для псевдонима.",
+    ],
+    "ERROR_ALIAS_UTIL_ADD_FAILED": [
+        "Не получилось добавить псевдоним: {user_message_hint}",
+    ],
+    "ERROR_ALIAS_SAVE_FAILED": [
+        "Псевдоним '{alias_name}' запомнил, но сохранить в файл не удалось - после перезапуска он пропадет.",
+    ],
+    # --- части составной команды (command_dispatcher) ---
+    "ERROR_INTENT_NOT_SUPPORTED": [
+        "Эту часть команды я пока не умею выполнять.",
+    ],
+    "ERROR_INTENT_FAILED": [
+        "Одну из команд выполнить не получилось.",
+    ],
+}
+
+# Составная команда: ответ склеивается из ответов на ее части
+MULTI_COMMAND_CODE = "MULTI_COMMAND_RESULT"
+
+_variant_counters = {}
+_counters_lock = threading.Lock()
+
+# "02:45:01 up 1 day,  3:12,  2 users,  load average: ..." -> "1 day,  3:12"
+_UPTIME_RE = re.compile(r"up\s+(?P<span>.+?),\s+\d+\s+users?", re.IGNORECASE)
+_UPTIME_DAYS_RE = re.compile(r"(?P<days>\d+)\s+days?")
+_UPTIME_CLOCK_RE = re.compile(r"(?P<hours>\d+):(?P<minutes>\d{2})")
+_UPTIME_MIN_RE = re.compile(r"(?P<minutes>\d+)\s+min")
+
+
+def _plural(number: int, one: str, few: str, many: str) -> str:
+    """Русское склонение числительных: 1 день, 2 дня, 5 дней."""
+    if number % 10 == 1 and number % 100 != 11:
+        return one
+    if 2 <= number % 10 <= 4 and not 12 <= number % 100 <= 14:
+        return few
+    return many
+
+
+def _humanize_uptime(uptime_string: str) -> str:
+    """Превращает вывод утилиты uptime в "1 день, 3 часа и 12 минут"."""
+    match = _UPTIME_RE.search(uptime_string or "")
+    if not match:
+        return uptime_string
+    span = match.group("span")
+    days = hours = minutes = 0
+    days_match = _UPTIME_DAYS_RE.search(span)
+    if days_match:
+        days = int(days_match.group("days"))
+    clock_match = _UPTIME_CLOCK_RE.search(span)
+    if clock_match:
+        hours, minutes = int(clock_match.group("hours")), int(clock_match.group("minutes"))
+    else:
+        min_match = _UPTIME_MIN_RE.search(span)
+        if min_match:
+            minutes = int(min_match.group("minutes"))
+
+    parts = []
+    if days:
+        parts.append(f"{days} {_plural(days, 'день', 'дня', 'дней')}")
+    if hours:
+        parts.append(f"{hours} {_plural(hours, 'час', 'часа', 'часов')}")
+    if minutes or not parts:
+        parts.append(f"{minutes} {_plural(minutes, 'минуту', 'минуты', 'минут')}")
+    if len(parts) == 1:
+        return parts[0]
+    return ", ".join(parts[:-1]) + " и " + parts[-1]
+
+
+def _template_fields(structured_result: dict) -> dict:
+    """Собирает значения для подстановки: поля data + служебные поля результата."""
+    fields = dict(structured_result.get("data") or {})
+    fields.setdefault("user_message_hint", structured_result.get("user_message_hint", ""))
+    if "uptime_string" in fields:
+        fields["uptime_human"] = _humanize_uptime(fields["uptime_string"])
+    if fields.get("job_title"):
+        fields["job_title_cap"] = fields["job_title"][:1].upper() + fields["job_title"][1:]
+    return fields
+
+
+def has_template(message_code: str) -> bool:
+    """Есть ли для этого кода готовый шаблон."""
+    return message_code in RESPONSE_TEMPLATES or message_code == MULTI_COMMAND_CODE
+
+
+def _render_multi(structured_result: dict) -> str | None:
+    """Ответ на составную команду: фразы частей через пробел; без шаблона хотя бы для одной - None (LLM)."""
+    results = (structured_result.get("data") or {}).get("results") or []
+    parts = [render_response(result) for result in results]
+    if not parts or any(part is None for part in parts):
+        return None
+    return " ".join(parts)
+
+
+def render_response(structured_result: dict) -> str | None:
+    """
+    Формирует ответ по шаблону для message_code.
+
+    Args:
+        structured_result (dict): Структурированный результат от обработчика интента.
+
+    Returns:
+        str | None: Готовая фраза или None, если шаблона нет или не хватает данных
+                    (тогда ответ генерируется через LLM).
+    """
+    if not structured_result or not isinstance(structured_result, dict):
+        return None
+    message_code = structured_result.get("message_code")
+    if message_code == MULTI_COMMAND_CODE:
+        return _render_multi(structured_result)
+    variants = RESPONSE_TEMPLATES.get(message_code)
+    if not variants:
+        print(f"[RENDERER][DEBUG] No template for message_code '{message_code}'.")
+        return None
+
+    with _counters_lock:
+        counter = _variant_counters.setdefault(message_code, itertools.count())
+        variant_index = next(counter) % len(variants)
+
+    try:
+        return variants[variant_index].format(**_template_fields(structured_result))
+    except (KeyError, IndexError, ValueError) as e:
+        print(f"[RENDERER][WARN] Template for '{message_code}' could not be filled ({e}).")
+        return None
@@ -1,10 +1,19 @@
 # File: telegram_bot.py
 # -*- coding: utf-8 -*-
+import asyncio
+import heapq
+import itertools
 import logging
 import os
+import threading
+import time
+from collections import deque
 
-# --- ИМПОРТИРУЕМ НОВОЕ ЯДРО ФАМИЛЬЯРА ---
-import familiar # Наш новый основной модуль с process_text_command
+# --- ЯДРО ФАМИЛЬЯРА ---
+# Команды выполняет демон (familiar_daemon.py) - общий с консольным клиентом;
+# без демона familiar_client выполняет их в процессе бота.
+import familiar_client
+import fast_intent_router
 
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
@@ -22,6 +31,219 @@ if not TELEGRAM_BOT_TOKEN:
     logger.error("Токен Telegram бота не найден! Установите переменную окружения TELEGRAM_BOT_TOKEN.")
     exit()
 
+# --- ПЛАНИРОВЩИК КОМАНД ---
+# Очередь FIFO на каждый чат (команды одного пользователя выполняются по порядку)
+# и общий лимит одновременно выполняемых команд (по возможностям Ollama).
+MAX_CONCURRENT_COMMANDS = int(os.getenv('FAMILIAR_MAX_CONCURRENT', 2))
+MAX_QUEUE_PER_CHAT = int(os.getenv('FAMILIAR_MAX_QUEUE_PER_CHAT', 5))
+MAX_PENDING_TOTAL = int(os.getenv('FAMILIAR_MAX_PENDING', 50))
+BUSY_REPLY = "Сейчас занят, попробуйте чуть позже."
+
+PRIORITY_URGENT = 0 # короткие системные команды (выключение, перезагрузка, отмена задачи) идут вне очереди
+PRIORITY_NORMAL = 1
+URGENT_SYSTEM_ACTIONS = {"shutdown", "reboot"}
+URGENT_INTENTS = {"manage_job"} # Ответ из записи фоновой задачи, без ожидания
+
+
+def classify_priority(command_text: str) -> int:
+    """Предварительно определяет приоритет команды быстрым маршрутизатором (без LLM)."""
+    # Системные команды распознаются без алиасов, поэтому сами алиасы (они у демона) не нужны
+    parsed = fast_intent_router.route_command(command_text, {}, record_stats=False)
+    if parsed and parsed.get("intent") == "manage_system" \
+            and parsed.get("parameters", {}).get("action") in URGENT_SYSTEM_ACTIONS:
+        return PRIORITY_URGENT
+    if parsed and parsed.get("intent") in URGENT_INTENTS:
+        return PRIORITY_URGENT
+    return PRIORITY_NORMAL
+
+
+class _PrioritySlots:
+    """Семафор с приоритетами: освободившийся слот получает ожидающий с наименьшим priority."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = [] # heap: (priority, seq, future)
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: int):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future # слот передается напрямую из release(), active не меняется
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class ChatScheduler:
+    """
+    Планировщик команд Telegram: очередь на чат, общий лимит параллельности,
+    приоритет для срочных системных команд и отказ ("занят") при перегрузке.
+    """
+
+    def __init__(self,
+                 max_concurrent: int = MAX_CONCURRENT_COMMANDS,
+                 max_queue_per_chat: int = MAX_QUEUE_PER_CHAT,
+                 max_pending_total: int = MAX_PENDING_TOTAL):
+        self.max_queue_per_chat = max_queue_per_chat
+        self.max_pending_total = max_pending_total
+        self._slots = _PrioritySlots(max_concurrent)
+        self._queues = {} # chat_id -> deque of items
+        self._workers = {} # chat_id -> asyncio.Task
+        self._pending_total = 0
+        self.metrics = {
+            "accepted": 0, "shed": 0, "completed": 0, "failed": 0,
+            "max_queue_depth": 0, "wait_total_s": 0.0, "wait_max_s": 0.0,
+        }
+
+    def submit(self, chat_id: int, command_text: str, reply, priority: int = PRIORITY_NORMAL) -> bool:
+        """
+        Ставит команду в очередь чата. reply - корутина-функция для отправки ответа.
+        Возвращает False, если команда отклонена из-за перегрузки.
+        """
+        queue = self._queues.setdefault(chat_id, deque())
+        overloaded = len(queue) >= self.max_queue_per_chat or self._pending_total >= self.max_pending_total
+        if overloaded and priority != PRIORITY_URGENT:
+            self.metrics["shed"] += 1
+            logger.warning(f"Перегрузка: команда из чата {chat_id} отклонена (в очереди чата {len(queue)}, всего {self._pending_total}).")
+            return False
+
+        item = {"text": command_text, "reply": reply, "priority": priority, "enqueued_at": time.monotonic()}
+        if priority == PRIORITY_URGENT:
+            # Вперед обычных команд этого чата, но после уже стоящих срочных
+            position = next((i for i, queued in enumerate(queue) if queued["priority"] != PRIORITY_URGENT), len(queue))
+            queue.insert(position, item)
+        else:
+            queue.append(item)
+        self._pending_total += 1
+        self.metrics["accepted"] += 1
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], len(queue))
+
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._chat_worker(chat_id))
+        return True
+
+    async def _chat_worker(self, chat_id: int):
+        """Выполняет команды одного чата строго по очереди, пока она не опустеет."""
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                item = queue.popleft()
+                await self._slots.acquire(item["priority"])
+                wait_s = time.monotonic() - item["enqueued_at"]
+                self.metrics["wait_total_s"] += wait_s
+                self.metrics["wait_max_s"] = max(self.metrics["wait_max_s"], wait_s)
+                logger.info(f"Чат {chat_id}: команда '{item['text']}' ждала {wait_s:.2f} с (приоритет {item['priority']}).")
+                try:
+                    final_response_text = await familiar_client.process_text_command_async(
+                        item["text"], origin={"frontend": "telegram", "chat_id": chat_id})
+                    self.metrics["completed"] += 1
+                except Exception as e:
+                    self.metrics["failed"] += 1
+                    logger.error(f"Ошибка при вызове familiar_client.process_text_command_async: {e}", exc_info=True)
+                    # В случае серьезной ошибки в ядре, отправляем общее сообщение
+                    final_response_text = f"Произошла неожиданная внутренняя ошибка при обработке вашей команды: {e}"
+                finally:
+                    self._slots.release()
+                    self._pending_total -= 1
+
+                logger.info(f"Финальный ответ для пользователя: {final_response_text}")
+                try:
+                    await item["reply"](final_response_text)
+                except Exception as e:
+                    logger.error(f"Не удалось отправить ответ в чат {chat_id}: {e}")
+        finally:
+            self._workers.pop(chat_id, None)
+            if not queue:
+                self._queues.pop(chat_id, None)
+
+    def get_metrics(self) -> dict:
+        """Текущие метрики: глубина очередей, ожидание, отказы."""
+        metrics = dict(self.metrics)
+        started = metrics["completed"] + metrics["failed"]
+        metrics["wait_avg_s"] = round(metrics["wait_total_s"] / started, 3) if started else 0.0
+        metrics["wait_total_s"] = round(metrics["wait_total_s"], 3)
+        metrics["wait_max_s"] = round(metrics["wait_max_s"], 3)
+        metrics["pending_total"] = self._pending_total
+        metrics["active"] = self._slots.active
+        metrics["waiting_for_slot"] = self._slots.waiting
+        metrics["queue_depth_by_chat"] = {chat_id: len(queue) for chat_id, queue in self._queues.items() if queue}
+        return metrics
+
+
+SCHEDULER = ChatScheduler()
+
+
+# --- НАПОМИНАНИЯ ---
+# Срабатывания приходят от демона по подписке (familiar_client.subscribe_async); без демона
+# планировщик напоминаний работает в процессе бота (reminder_scheduler).
+REMINDER_SEND_TIMEOUT = 30.0
+_background_tasks = set()
+
+
+async def _send_reminder(bot, reminder: dict, text: str) -> bool:
+    """Отправляет напоминание в чат, из которого оно было поставлено."""
+    chat_id = (reminder.get("origin") or {}).get("chat_id")
+    if chat_id is None:
+        logger.warning(f"Напоминание {reminder.get('id')} без chat_id, отправить некуда.")
+        return False
+    try:
+        await bot.send_message(chat_id=chat_id, text=text)
+    except Exception as e:
+        logger.error(f"Не удалось отправить напоминание {reminder.get('id')} в чат {chat_id}: {e}")
+        return False
+    return True
+
+
+async def _listen_daemon_reminders(application: Application):
+    """Подписка на напоминания демона; после обрыва (перезапуск демона) - переподключение."""
+    async def on_reminder(message: dict) -> bool:
+        return await _send_reminder(application.bot, message["reminder"], message["text"])
+
+    while True:
+        try:
+            await familiar_client.subscribe_async("telegram", on_reminder)
+        except (OSError, ValueError, asyncio.TimeoutError) as e:
+            logger.warning(f"Подписка на напоминания прервана ({e}), повтор через {familiar_client.RESUBSCRIBE_DELAY} с.")
+        await asyncio.sleep(familiar_client.RESUBSCRIBE_DELAY)
+
+
+def _register_local_reminders(application: Application):
+    """Без демона: напоминания срабатывают в этом процессе, отправка - через event loop бота."""
+    import reminder_scheduler
+    loop = asyncio.get_running_loop()
+
+    def deliver(entry: dict) -> bool: # Вызывается из потока планировщика
+        future = asyncio.run_coroutine_threadsafe(
+            _send_reminder(application.bot, entry, reminder_scheduler.format_reminder(entry)), loop)
+        try:
+            return future.result(REMINDER_SEND_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Напоминание {entry.get('id')} не отправлено: {e}")
+            return False
+
+    if not reminder_scheduler.register_delivery("telegram", deliver):
+        logger.warning("Напоминания ведет другой процесс Фамильяра (консоль без демона); "
+                       "бот их не ставит, пока тот работает. Запустите familiar_daemon.py.")
+
+
 # --- ОБРАБОТЧИКИ КОМАНД TELEGRAM ---
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -35,46 +257,61 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     """Отправляет сообщение с помощью при команде /help."""
     await update.message.reply_text("Просто отправьте мне команду текстом, например: 'открой браузер' или 'закрой telegram'.")
 
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Показывает метрики планировщика и быстрого маршрутизатора при команде /stats."""
+    metrics = SCHEDULER.get_metrics()
+    try:
+        daemon_reply = await familiar_client.request_async({"op": "stats"}, timeout=familiar_client.CONNECT_TIMEOUT)
+        router_stats = daemon_reply["stats"]["router"]
+    except (ConnectionError, TimeoutError, asyncio.TimeoutError, KeyError, ValueError):
+        router_stats = fast_intent_router.get_router_stats() # Демона нет: команды выполнялись в процессе бота
+    await update.message.reply_text(
+        f"Выполняется: {metrics['active']}, в очередях: {metrics['pending_total']}, ждут слота: {metrics['waiting_for_slot']}\n"
+        f"Принято: {metrics['accepted']}, отклонено (занят): {metrics['shed']}, ошибок: {metrics['failed']}\n"
+        f"Ожидание: среднее {metrics['wait_avg_s']} с, максимум {metrics['wait_max_s']} с\n"
+        f"Без LLM распознано: {router_stats['hits']} из {router_stats['total']}"
+    )
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Обрабатывает текстовые сообщения пользователя, передавая их ядру Фамильяра."""
+    """Ставит текстовое сообщение пользователя в очередь его чата; ответ отправит планировщик."""
     command_text = update.message.text
     user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
     logger.info(f"Получена команда от пользователя {user_id}: '{command_text}'")
 
-    # Отправляем предварительное сообщение (можно оставить или убрать)
-    # await update.message.reply_text(f"Получил команду: '{command_text}'. Обрабатываю...")
-
-    try:
-        # --- ИСПОЛЬЗУЕМ НОВОЕ ЯДРО ДЛЯ ОБРАБОТКИ КОМАНДЫ ---
-        # familiar.process_text_command теперь делает всю работу:
-        # 1. NLU для извлечения интента
-        # 2. Диспетчеризация и выполнение команды (которая вернет структурированный результат)
-        # 3. Генерация естественного ответа на основе структурированного результата
-        final_response_text = familiar.process_text_command(command_text)
-        # --- КОНЕЦ ИЗМЕНЕНИЯ ---
-
-        logger.info(f"Финальный ответ для пользователя: {final_response_text}")
-        await update.message.reply_text(final_response_text)
-
-    except Exception as e:
-        logger.error(f"Ошибка при вызове familiar.process_text_command: {e}", exc_info=True)
-        # В случае серьезной ошибки в ядре, отправляем общее сообщение
-        await update.message.reply_text(f"Произошла неожиданная внутренняя ошибка при обработке вашей команды: {e}")
+    priority = classify_priority(command_text)
+    if not SCHEDULER.submit(chat_id, command_text, update.message.reply_text, priority):
+        await update.message.reply_text(BUSY_REPLY)
 
 
 # --- ОСНОВНАЯ ФУНКЦИЯ ЗАПУСКА БОТА ---
 
 def main() -> None:
     """Запускает Telegram бота."""
-    # Инициализация диспетчера и других компонентов ядра происходит при импорте
-    # familiar.py и command_dispatcher.py
-    logger.info("Инициализация ядра Фамильяра (диспетчер и т.д.)...")
-    # command_dispatcher.initialize_dispatcher() # Вызывается при импорте command_dispatcher
+    # Ядро (алиасы, обработчики, Ollama) живет в демоне; бот - его клиент
+    use_daemon = familiar_client.ping()
+    if use_daemon:
+        logger.info(f"Подключение к демону Фамильяра: {familiar_client.SOCKET_PATH}")
+    else:
+        logger.warning("Демон Фамильяра не запущен (python familiar_daemon.py): команды будут выполняться в процессе бота.")
+        import nlu_processor
+        if nlu_processor.NLU_PROMPT_CACHE_ENABLED:
+            threading.Thread(target=nlu_processor.warm_up_nlu_prefix, daemon=True).start()
+
+    async def start_reminders(application: Application):
+        if use_daemon:
+            task = asyncio.create_task(_listen_daemon_reminders(application))
+            _background_tasks.add(task)
+        else:
+            _register_local_reminders(application)
 
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    # concurrent_updates: сообщения из разных чатов обрабатываются одновременно
+    application = (Application.builder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(True)
+                   .post_init(start_reminders).build())
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("stats", stats_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
     logger.info("Запуск Telegram бота...")
@@ -0,0 +1,224 @@
+# File: time_parser.py
+# -*- coding: utf-8 -*-
+
+# Разбор русских выражений времени (параметр time_spec интентов set_reminder / set_alarm)
+# в абсолютное время без обращения к LLM: "через час", "через полтора часа",
+# "завтра в 10", "7 утра", "06:30", "вечером", "в пятницу в 9", "в десять тридцать".
+# Все регулярные выражения скомпилированы при импорте; разбор занимает микросекунды
+# (замер: python benchmarks/bench_time_parser.py).
+#
+# Неоднозначность сообщается явно: "в 7" - это 07:00 или 19:00. Выбирается наиболее
+# вероятный вариант (ближайший, а для "завтра в 7" - утренний), остальные - в "alternatives".
+
+import datetime
+import re
+
+# Время по умолчанию для "утром", "вечером" и для дня без указания времени ("завтра")
+PART_OF_DAY_DEFAULT_HOURS = {"утро": 9, "день": 13, "вечер": 19, "ночь": 23}
+DAY_DEFAULT_HOUR = 9
+
+# --- Нормализация ---
+_PUNCTUATION_RE = re.compile(r"[,;!?()\"«»]+")
+_SPACES_RE = re.compile(r"\s+")
+
+# Числительные словами -> цифры ("в десять тридцать" -> "в 10 30")
+_NUMERAL_WORDS = {
+    "ноль": 0, "одну": 1, "одна": 1, "один": 1, "одного": 1, "одной": 1,
+    "два": 2, "две": 2, "двух": 2, "три": 3, "трех": 3, "четыре": 4, "четырех": 4,
+    "пять": 5, "пяти": 5, "шесть": 6, "шести": 6, "семь": 7, "семи": 7, "восемь": 8, "восьми": 8,
+    "девять": 9, "девяти": 9, "десять": 10, "десяти": 10, "одиннадцать": 11, "одиннадцати": 11,
+    "двенадцать": 12, "двенадцати": 12, "тринадцать": 13, "четырнадцать": 14, "пятнадцать": 15,
+    "пятнадцати": 15, "шестнадцать": 16, "семнадцать": 17, "восемнадцать": 18, "девятнадцать": 19,
+    "двадцать": 20, "двадцати": 20, "тридцать": 30, "тридцати": 30, "сорок": 40, "сорока": 40,
+    "пятьдесят": 50, "пятидесяти": 50,
+}
+_NUMERAL_RE = re.compile(r"\b(" + "|".join(sorted(_NUMERAL_WORDS, key=len, reverse=True)) + r")\b")
+_COMPOUND_NUMERAL_RE = re.compile(r"\b([2-5]0) ([1-9])\b") # "двадцать пять" -> "20 5" -> "25"
+# Дроби: "полчаса", "полтора часа", "четверть часа"
+_FRACTIONS = (
+    (re.compile(r"\bпол ?часа\b"), "30 минут"),
+    (re.compile(r"\bполтора часа\b"), "90 минут"),
+    (re.compile(r"\bполторы минуты\b"), "90 секунд"),
+    (re.compile(r"\bчетверть часа\b"), "15 минут"),
+)
+
+# --- Части выражения ---
+_UNIT_SECONDS = {"с": 1, "м": 60, "ч": 3600, "д": 86400, "н": 604800}
+_UNIT = r"(?:секунд[ауы]?|сек|минут[ауы]?|мин|час(?:а|ов)?|день|дня|дней|сутки|суток|недел[юиь]|недель)"
+_RELATIVE_RE = re.compile(r"\bчерез ((?:\d+ )?" + _UNIT + r"(?: (?:и )?(?:\d+ )?" + _UNIT + r")*)\b")
+_DURATION_PART_RE = re.compile(r"(?:(\d+) )?(" + _UNIT + r")")
+_DAY_RE = re.compile(r"\b(сегодня|завтра|послезавтра)\b")
+_DAY_OFFSETS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+_WEEKDAYS = ("понедельник", "вторник", "среду", "четверг", "пятницу", "субботу", "воскресенье")
+_WEEKDAY_RE = re.compile(r"\b(?:во? )?(следующ(?:ий|ую|ее) )?(" + "|".join(_WEEKDAYS) + r")\b")
+_PART_RE = re.compile(r"\b(утром|днем|вечером|ночью|утра|дня|вечера|ночи)\b")
+_PART_NAMES = {"утром": "утро", "утра": "утро", "днем": "день", "дня": "день",
+               "вечером": "вечер", "вечера": "вечер", "ночью": "ночь", "ночи": "ночь"}
+_CLOCK_RE = re.compile(
+    r"\b(?:(?:в|на|к|около) )?"
+    r"(?:(?P<special>полдень|полночь)"
+    r"|(?P<hour>\d{1,2}|час)(?:(?P<separator>[:.]| )(?P<minute>\d{2}))?(?: час(?:а|ов|ам)?)?"
+    r"(?: (?P<minute_words>\d{1,2}) минут[аы]?)?)\b")
+# Слова, которые могут остаться после разбора, не меняя смысла
+_FILLER_RE = re.compile(r"\b(?:в|во|на|к|около|примерно|где-то|часов|часа|ровно)\b")
+
+
+def normalize_time_text(time_spec: str) -> str:
+    """Нижний регистр, ё -> е, без пунктуации, числительные словами -> цифры."""
+    text = (time_spec or "").lower().replace("ё", "е")
+    text = _SPACES_RE.sub(" ", _PUNCTUATION_RE.sub(" ", text)).strip()
+    for pattern, replacement in _FRACTIONS:
+        text = pattern.sub(replacement, text)
+    text = _NUMERAL_RE.sub(lambda match: str(_NUMERAL_WORDS[match.group(1)]), text)
+    return _COMPOUND_NUMERAL_RE.sub(lambda match: str(int(match.group(1)) + int(match.group(2))), text)
+
+
+def _duration_seconds(spec: str) -> int:
+    return sum(int(count or 1) * _UNIT_SECONDS[unit[0] if unit != "сутки" and unit != "суток" else "д"]
+               for count, unit in _DURATION_PART_RE.findall(spec))
+
+
+def _hour_candidates(hour: int, part: str | None, explicit_24h: bool) -> list[int]:
+    """
+    Варианты часа с учетом части суток; без нее 1..11 - два варианта (утро/вечер).
+    12 - полдень ("в 12", "12:30"); полночь - только "12 ночи" и "полночь".
+    """
+    if part == "ночь":
+        return [0 if hour == 12 else (hour + 12 if hour >= 9 else hour)]
+    if part == "утро" or hour == 12:
+        return [hour]
+    if part in ("день", "вечер"):
+        return [hour + 12 if hour < 12 else hour]
+    if explicit_24h or hour == 0 or hour > 12:
+        return [hour]
+    return [hour, hour + 12]
+
+
+def _preferred_hour(candidates: list[int]) -> int:
+    """Для конкретного дня без части суток: 7-11 - первая половина дня, 1-6 - вторая ("завтра в 3" -> 15:00)."""
+    hour = candidates[0]
+    if len(candidates) == 1 or 7 <= hour <= 11:
+        return hour
+    return candidates[1]
+
+
+def parse_time_spec(time_spec: str, now: datetime.datetime | None = None) -> dict | None:
+    """
+    Разбирает выражение времени относительно now (локальное время без tzinfo).
+
+    Args:
+        time_spec (str): "через час", "завтра в 10", "7 утра", "06:30", "вечером", "в пятницу" ...
+        now (datetime | None): Точка отсчета (по умолчанию - текущее время).
+
+    Returns:
+        dict | None: {"datetime": datetime, "ambiguous": bool, "alternatives": [datetime, ...]}
+                     или None, если выражение не распознано целиком. Время может оказаться
+                     в прошлом ("сегодня в 7" вечером) - это решает вызывающий.
+    """
+    now = now or datetime.datetime.now()
+    text = normalize_time_text(time_spec)
+    if not text:
+        return None
+    rest = text
+    matched = False
+
+    offset_seconds = 0
+    match = _RELATIVE_RE.search(rest)
+    if match:
+        offset_seconds = _duration_seconds(match.group(1))
+        rest = rest[:match.start()] + rest[match.end():]
+        matched = True
+
+    day_offset = None
+    match = _DAY_RE.search(rest)
+    if match:
+        day_offset = _DAY_OFFSETS[match.group(1)]
+        rest = rest[:match.start()] + rest[match.end():]
+        matched = True
+
+    weekday = next_week = None
+    match = _WEEKDAY_RE.search(rest)
+    if match:
+        weekday, next_week = _WEEKDAYS.index(match.group(2)), bool(match.group(1))
+        rest = rest[:match.start()] + rest[match.end():]
+        matched = True
+
+    part = None
+    match = _PART_RE.search(rest)
+    if match:
+        part = _PART_NAMES[match.group(1)]
+        rest = rest[:match.start()] + rest[match.end():]
+        matched = True
+
+    hour_candidates, minute = None, 0
+    match = _CLOCK_RE.search(rest)
+    if match:
+        if match.group("special"):
+            hour_candidates = [12 if match.group("special") == "полдень" else 0]
+        else:
+            hour = 1 if match.group("hour") == "час" else int(match.group("hour"))
+            minute = int(match.group("minute") or match.group("minute_words") or 0)
+            if hour > 23 or minute > 59:
+                return None
+            # "06:30" или "18:30" - 24-часовая запись; "6:30" и "в 6" - неоднозначны
+            explicit_24h = match.group("hour").startswith("0") and len(match.group("hour")) == 2
+            hour_candidates = _hour_candidates(hour, part, explicit_24h)
+            if any(candidate > 23 for candidate in hour_candidates):
+                return None
+        rest = rest[:match.start()] + rest[match.end():]
+        matched = True
+
+    if not matched or _FILLER_RE.sub(" ", rest).strip():
+        return None # Остались неразобранные слова - лучше переспросить, чем угадать
+
+    base = now + datetime.timedelta(seconds=offset_seconds)
+    if hour_candidates is None and day_offset is None and weekday is None and part is None:
+        return {"datetime": base.replace(microsecond=0), "ambiguous": False, "alternatives": []}
+    if hour_candidates is None:
+        hour_candidates = [PART_OF_DAY_DEFAULT_HOURS[part] if part else DAY_DEFAULT_HOUR]
+
+    # День: явный ("завтра", "в пятницу") или ближайший, когда это время еще впереди
+    explicit_day = day_offset is not None or weekday is not None or offset_seconds >= 86400
+    alternatives = []
+    if weekday is not None:
+        days_ahead = (weekday - base.weekday()) % 7
+        upcoming = base.date() + datetime.timedelta(days=days_ahead)
+        if next_week:
+            # "в следующую пятницу" - пятница следующей недели, но многие имеют в виду ближайшую
+            day = base.date() - datetime.timedelta(days=base.weekday()) + datetime.timedelta(days=7 + weekday)
+            if upcoming != day and upcoming > base.date():
+                alternatives.append(upcoming)
+        else:
+            day = upcoming
+        days = [day]
+    elif day_offset is not None:
+        days = [base.date() + datetime.timedelta(days=day_offset)]
+    else:
+        days = [base.date()]
+
+    def at(day, hour):
+        return datetime.datetime.combine(day, datetime.time(hour, minute))
+
+    if explicit_day:
+        hour = _preferred_hour(hour_candidates)
+        upcoming_hours = [other for other in hour_candidates if at(days[0], other) > now]
+        if day_offset == 0 and upcoming_hours and hour not in upcoming_hours:
+            hour = upcoming_hours[0] # "сегодня в 7" в 10 утра - это 19:00
+        chosen = at(days[0], hour)
+        if weekday is not None and not next_week and chosen <= now:
+            chosen += datetime.timedelta(days=7) # "в пятницу в 9" в пятницу в 10 - через неделю
+        candidates = [chosen.replace(hour=other) for other in hour_candidates if other != hour]
+        candidates += [at(day, hour) for day in alternatives]
+    else:
+        # Без дня: ближайший будущий момент среди вариантов (сегодня или завтра)
+        day = days[0]
+        occurrences = []
+        for hour in hour_candidates:
+            moment = at(day, hour)
+            if moment <= base and day_offset is None:
+                moment += datetime.timedelta(days=1)
+            occurrences.append(moment)
+        occurrences.sort()
+        chosen, candidates = occurrences[0], occurrences[1:]
+    candidates = [moment for moment in candidates if moment > now] # Прошедший вариант - не альтернатива
+    return {"datetime": chosen, "ambiguous": bool(candidates), "alternatives": candidates}
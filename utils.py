@@ -1,68 +1,255 @@
 # File: utils.py
 # -*- coding: utf-8 -*-
 
+import contextlib
 import json
 import os
-import shutil # To check if alias name is a command
+import tempfile
+import executable_index # To check if alias name is a command (cached PATH lookup)
+
+try:
+    import fcntl
+except ImportError: # Not POSIX: no cross-process lock, compaction may race with another process
+    fcntl = None
 
 # --- Configuration ---
 CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
 ALIASES_FILE = os.path.join(CONFIG_DIR, 'app_aliases.json') # Use the correct filename
+# Append-only journal of alias changes on top of the ALIASES_FILE snapshot (one JSON object per line)
+ALIASES_JOURNAL_FILE = os.path.join(CONFIG_DIR, 'app_aliases.journal')
+# Held while the journal is folded into the snapshot, so another process cannot append in between
+ALIASES_LOCK_FILE = os.path.join(CONFIG_DIR, 'app_aliases.lock')
+# Fold the journal into the snapshot after this many records
+ALIASES_COMPACT_EVERY = int(os.environ.get('FAMILIAR_ALIAS_COMPACT_EVERY', 50))
+
+_alias_journal_records = 0 # Records in the journal since the last compaction
+
+# --- Crash-safe file helpers ---
+
+def _fsync_directory(directory):
+    """Makes a rename/creation in the directory durable (no-op where unsupported)."""
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+def atomic_write_json(path, data):
+    """
+    Writes data as JSON to a temp file, fsyncs it and renames it over path.
+    A crash leaves either the old or the new file, never a half-written one.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Unique temp file per call: concurrent writers (threads or processes) never share one
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+def append_journal_record(path, record):
+    """Appends one JSON record as a line and fsyncs it."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+    with open(path, 'ab+') as f:
+        # After a crash mid-append the last line may be torn: start the new record on a fresh line
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                line = b"\n" + line
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+def read_journal(path):
+    """
+    Returns the list of records from a journal file.
+    A torn last line (crash during append) and other broken lines are skipped.
+    """
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"[UTILS_JOURNAL][WARN] Skipping broken record at {path}:{line_number}.")
+                    continue
+                if isinstance(record, dict):
+                    records.append(record)
+    except FileNotFoundError:
+        pass
+    return records
+
+def truncate_journal(path):
+    """Empties a journal after its records were folded into a snapshot."""
+    if os.path.exists(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
 
 # --- Alias Management ---
 
+@contextlib.contextmanager
+def _aliases_store_lock():
+    """flock on ALIASES_LOCK_FILE: journal appends, reads and compaction of other processes wait."""
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    with open(ALIASES_LOCK_FILE, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX) # Released when the file is closed
+        yield
+
+def _read_aliases_snapshot(path):
+    """Reads an alias dict in the JSON format ({"alias": "command"}), lowercased."""
+    with open(path, 'r', encoding='utf-8') as f:
+        aliases = json.load(f)
+    if not isinstance(aliases, dict):
+        raise ValueError("alias file content is not a dictionary")
+    return {str(k).lower(): str(v).lower() for k, v in aliases.items()}
+
+def _apply_alias_record(aliases, record):
+    alias = record.get("alias")
+    if not alias:
+        return
+    if record.get("op") == "set" and record.get("command"):
+        aliases[alias] = record["command"]
+    elif record.get("op") == "del":
+        aliases.pop(alias, None)
+
 def load_aliases():
-    """Loads aliases from the JSON file."""
+    """Loads aliases: the JSON snapshot plus the replayed change journal."""
+    global _alias_journal_records
     print(f"[UTILS_ALIASES][INFO] Attempting to load aliases from: {ALIASES_FILE}")
-    os.makedirs(CONFIG_DIR, exist_ok=True)
-    try:
-        if not os.path.exists(ALIASES_FILE):
-            with open(ALIASES_FILE, 'w', encoding='utf-8') as f:
-                json.dump({}, f)
-            print(f"[UTILS_ALIASES][WARN] Alias file not found. Created empty file: {ALIASES_FILE}")
-            return {}
-        with open(ALIASES_FILE, 'r', encoding='utf-8') as f:
-            aliases = json.load(f)
-            if not isinstance(aliases, dict):
-                print(f"[UTILS_ALIASES][ERROR] Alias file content is not a valid dictionary. Returning empty.")
-                return {}
-            print(f"[UTILS_ALIASES][SUCCESS] Aliases loaded ({len(aliases)} found).")
-            return {k.lower(): v.lower() for k, v in aliases.items()}
-    except json.JSONDecodeError:
-        print(f"[UTILS_ALIASES][ERROR] Error decoding JSON from {ALIASES_FILE}. Returning empty.")
-        return {}
-    except Exception as e:
-        print(f"[UTILS_ALIASES][ERROR] Failed to load aliases: {e}")
-        return {}
-
-# --- MODIFIED FUNCTION with more DEBUG ---
-def save_aliases(aliases):
-    """Saves the aliases dictionary to the JSON file."""
-    print(f"[UTILS_SAVE][DEBUG] Attempting to save aliases to: {ALIASES_FILE}")
-    print(f"[UTILS_SAVE][DEBUG] Aliases to save: {aliases}") # Print the dict being saved
-    os.makedirs(CONFIG_DIR, exist_ok=True) # Ensure directory exists
-    try:
-        print(f"[UTILS_SAVE][DEBUG] Opening file {ALIASES_FILE} for writing...")
-        with open(ALIASES_FILE, 'w', encoding='utf-8') as f:
-            json.dump(aliases, f, ensure_ascii=False, indent=4, sort_keys=True)
-        print(f"[UTILS_SAVE][SUCCESS] Aliases supposedly saved successfully to {ALIASES_FILE}.")
-        # Verify file content after saving (for debugging)
+    aliases = {}
+    with _aliases_store_lock(): # The snapshot and the journal from the same moment, not mid-compaction
         try:
-            with open(ALIASES_FILE, 'r', encoding='utf-8') as f_check:
-                saved_data = json.load(f_check)
-                print(f"[UTILS_SAVE][DEBUG] Verification - Data read back from file: {saved_data}")
-        except Exception as e_check:
-            print(f"[UTILS_SAVE][ERROR] Verification failed - Could not read back data: {e_check}")
+            if not os.path.exists(ALIASES_FILE):
+                atomic_write_json(ALIASES_FILE, {})
+                print(f"[UTILS_ALIASES][WARN] Alias file not found. Created empty file: {ALIASES_FILE}")
+            else:
+                aliases = _read_aliases_snapshot(ALIASES_FILE)
+        except json.JSONDecodeError:
+            print(f"[UTILS_ALIASES][ERROR] Error decoding JSON from {ALIASES_FILE}. Using journal only.")
+        except Exception as e:
+            print(f"[UTILS_ALIASES][ERROR] Failed to load alias snapshot: {e}")
+
+        records = read_journal(ALIASES_JOURNAL_FILE)
+        for record in records:
+            _apply_alias_record(aliases, record)
+    _alias_journal_records = len(records)
+    print(f"[UTILS_ALIASES][SUCCESS] Aliases loaded ({len(aliases)} found, {len(records)} journal records replayed).")
 
-        return True, "Алиасы сохранены."
+    if _alias_journal_records >= ALIASES_COMPACT_EVERY:
+        compact_aliases(aliases)
+    return aliases
+
+def compact_aliases(aliases, overrides=None):
+    """
+    Writes the full snapshot atomically and empties the journal.
+    Runs under an flock on ALIASES_LOCK_FILE (taken by appends too) and rebuilds the state from the
+    snapshot and journal on disk, so changes made by another process are folded in, not lost.
+    overrides (dict) are applied last: changes that are not journaled (an import).
+    aliases is updated in place to the saved state.
+    """
+    global _alias_journal_records
+    try:
+        with _aliases_store_lock():
+            try:
+                merged = _read_aliases_snapshot(ALIASES_FILE)
+            except (OSError, ValueError): # Missing or broken snapshot: ours is the best we have
+                merged = dict(aliases)
+            for record in read_journal(ALIASES_JOURNAL_FILE):
+                _apply_alias_record(merged, record)
+            if overrides:
+                merged.update(overrides)
+            atomic_write_json(ALIASES_FILE, merged)
+            # A crash here only leaves journal records that are already in the snapshot: replaying them is harmless
+            truncate_journal(ALIASES_JOURNAL_FILE)
+    except OSError as e:
+        print(f"[UTILS_SAVE][ERROR] Alias compaction failed: {e}")
+        return False, f"Ошибка при сохранении алиасов: {e}"
+    aliases.clear()
+    aliases.update(merged)
+    _alias_journal_records = 0
+    print(f"[UTILS_SAVE][INFO] Aliases compacted into {ALIASES_FILE} ({len(aliases)} entries).")
+    return True, "Алиасы сохранены."
+
+def _append_alias_record(record, aliases):
+    global _alias_journal_records
+    try:
+        with _aliases_store_lock(): # Not in the middle of another process's compaction
+            append_journal_record(ALIASES_JOURNAL_FILE, record)
     except PermissionError as e_perm:
-         print(f"[UTILS_SAVE][ERROR] Permission denied when trying to save aliases: {e_perm}")
-         return False, f"Ошибка прав доступа при сохранении алиасов: {e_perm}"
-    except Exception as e:
-        print(f"[UTILS_SAVE][ERROR] Failed to save aliases due to other error: {e}")
-        import traceback
-        traceback.print_exc() # Print full traceback for unexpected errors
+        print(f"[UTILS_SAVE][ERROR] Permission denied when trying to save alias: {e_perm}")
+        return False, f"Ошибка прав доступа при сохранении алиасов: {e_perm}"
+    except OSError as e:
+        print(f"[UTILS_SAVE][ERROR] Failed to append alias record: {e}")
         return False, f"Ошибка при сохранении алиасов: {e}"
+    _alias_journal_records += 1
+    print(f"[UTILS_SAVE][SUCCESS] Alias change journaled: {record}")
+    if aliases is not None:
+        _apply_alias_record(aliases, record) # Keep the dict consistent with the journal before compaction
+        if _alias_journal_records >= ALIASES_COMPACT_EVERY:
+            compact_aliases(aliases) # The record is already durable, a failed compaction is not an error
+    return True, "Алиасы сохранены."
+
+def save_alias_entry(alias_name, app_name_command, aliases=None):
+    """
+    Durably records one added/changed alias (a single journal line, not a full rewrite).
+    aliases (the full dict) is used for periodic compaction.
+    """
+    record = {"op": "set", "alias": alias_name.lower(), "command": app_name_command.lower()}
+    return _append_alias_record(record, aliases)
+
+def remove_alias_entry(alias_name, aliases=None):
+    """Durably records removal of an alias."""
+    return _append_alias_record({"op": "del", "alias": alias_name.lower()}, aliases)
+
+def save_aliases(aliases):
+    """Saves the whole aliases dictionary (full snapshot, used for compaction)."""
+    return compact_aliases(aliases, overrides=dict(aliases))
+
+def import_aliases_json(path, aliases):
+    """
+    Merges aliases from a JSON file in the app_aliases.json format into aliases and saves them.
+    Returns (bool, str).
+    """
+    try:
+        imported = _read_aliases_snapshot(path)
+    except (OSError, ValueError) as e: # json.JSONDecodeError is a ValueError
+        print(f"[UTILS_ALIASES][ERROR] Failed to import aliases from {path}: {e}")
+        return False, f"Не удалось импортировать алиасы: {e}"
+    success, message = compact_aliases(aliases, overrides=imported)
+    if success:
+        message = f"Импортировано алиасов: {len(imported)}."
+    return success, message
+
+def export_aliases_json(path, aliases):
+    """Writes aliases to a JSON file in the app_aliases.json format. Returns (bool, str)."""
+    try:
+        atomic_write_json(path, aliases)
+    except OSError as e:
+        print(f"[UTILS_ALIASES][ERROR] Failed to export aliases to {path}: {e}")
+        return False, f"Не удалось экспортировать алиасы: {e}"
+    return True, f"Экспортировано алиасов: {len(aliases)}."
 
 # --- REVISED FUNCTION ---
 def add_alias(app_name_command, alias_name, aliases_dict):
@@ -85,7 +272,7 @@ def add_alias(app_name_command, alias_name, aliases_dict):
     print(f"[UTILS_ALIASES][INFO] Attempting to add alias '{alias_name_lower}' for command '{app_name_lower}'.")
     print(f"[UTILS_ALIASES][DEBUG] Current aliases_dict before check: {aliases_dict}")
 
-    is_alias_a_command = shutil.which(alias_name_lower) is not None
+    is_alias_a_command = executable_index.get_executable_index().exists(alias_name_lower)
     if is_alias_a_command and alias_name_lower != app_name_lower:
         msg = f"Имя '{alias_name}' не может быть псевдонимом, так как это существующая команда в системе."
         print(f"[UTILS_ALIASES][ERROR] {msg}")